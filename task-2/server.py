@@ -4,7 +4,13 @@ import threading
 import logging
 from datetime import datetime
 
+# detik tanpa data dari client (atau tanpa kemajuan mengirim) sebelum koneksi ditutup
+CLIENT_TIMEOUT = 60
+
 class ProcessTheClient(threading.Thread):
+    timed_out = 0
+    lock = threading.Lock()
+
     def __init__(self, connection, address):
         self.connection = connection
         self.address = address
@@ -12,6 +18,9 @@ class ProcessTheClient(threading.Thread):
 
     def run(self):
         logging.warning(f"Client connected: {self.address}")
+        # satu thread per client, jadi timeout socket cukup sebagai deadline
+        # baca/tulis tanpa thread tambahan
+        self.connection.settimeout(CLIENT_TIMEOUT)
         try:
             while True:
                 data = self.connection.recv(32)
@@ -31,6 +40,11 @@ class ProcessTheClient(threading.Thread):
                 else:
                     # Bisa abaikan request yang tidak dikenal
                     pass
+        except socket.timeout:
+            with ProcessTheClient.lock:
+                ProcessTheClient.timed_out += 1
+                count = ProcessTheClient.timed_out
+            logging.warning(f"Client {self.address} timed out after {CLIENT_TIMEOUT}s ({count} timed out so far)")
         except Exception as e:
             logging.error(f"Error handling client {self.address}: {e}")
         finally:
@@ -0,0 +1,465 @@
+import os
+import json
+import socket
+import base64
+import asyncio
+import threading
+import itertools
+from contextlib import contextmanager, asynccontextmanager
+
+import framing
+
+"""
+* file_client adalah library client untuk protokol file server (lihat
+PROTOKOL.txt), dalam versi sinkron (FileClient) dan asyncio
+(AsyncFileClient), dipakai oleh CLI
+
+* hanya request yang dilayani server task-3: LIST, GET, UPLOAD, DELETE
+dan BATCH
+
+* koneksi diambil dari pool berukuran terbatas: jika semua koneksi sedang
+dipakai, request menunggu sampai ada yang dikembalikan. Secara default
+(keep_alive=False) setiap request, termasuk satu pipeline, memakai koneksi
+baru yang langsung ditutup. Dengan keep_alive=True koneksi disimpan di pool
+untuk request berikutnya; pada server dengan executor thread/process setiap
+koneksi yang disimpan menahan satu worker sampai ditutup client atau
+diputus --idle-timeout server, sehingga client lain bisa ikut menunggu
+
+* setiap request diberi @id, respons dengan id berbeda dianggap koneksi
+rusak. Koneksi dari pool yang ternyata sudah ditutup server (gagal saat
+mengirim, atau ditutup sebelum ada byte respons) dicoba ulang sekali
+dengan koneksi baru. Error setelah itu hanya dicoba ulang untuk request
+yang aman diulang (IDEMPOTENT_REQUESTS), sehingga misalnya DELETE yang
+sudah dijalankan server tidak dikirim dua kali
+
+* pipeline mengirim banyak request di satu koneksi tanpa menunggu respons
+satu per satu (paling banyak PIPELINE_WINDOW request di depan respons).
+Koneksinya selalu ditutup setelah pipeline selesai, juga dengan
+keep_alive=True, karena pipeline biasanya dipakai untuk sekumpulan request
+sekali jalan dan koneksi yang disimpan hanya menahan worker server
+
+* upload_file membaca dan meng-encode file per chunk sehingga file tidak
+pernah dimuat utuh ke memori client
+
+* semua method mengembalikan dict result seperti yang dikirim server
+(status OK/ERROR); error jaringan dan timeout juga dikembalikan sebagai
+status ERROR. timeout berlaku per request (sinkron: per operasi socket,
+asyncio: batas waktu seluruh request)
+"""
+
+DEFAULT_ADDRESS = ('localhost', 6667)
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 600
+PIPELINE_WINDOW = 32
+IDEMPOTENT_REQUESTS = ('LIST', 'GET')
+# kelipatan 3, sehingga base64 setiap chunk bisa langsung disambung
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+ASYNC_READ_LIMIT = 1024 * 1024 * 1024
+
+
+def error(message):
+    return dict(status='ERROR', data=message)
+
+
+def idempotent(command):
+    # opsi "@nama=nilai" di depan request dilewati
+    while command.startswith('@'):
+        command = command.partition(' ')[2]
+    return command.partition(' ')[0].upper() in IDEMPOTENT_REQUESTS
+
+
+class StaleConnection(ConnectionError):
+    """
+    koneksi sudah ditutup server sebelum request diproses: gagal saat
+    mengirim, atau ditutup sebelum ada byte respons
+    """
+
+
+def decode_result(result):
+    if result.get('status') == 'OK' and 'data_file' in result:
+        result['data_file'] = base64.b64decode(result['data_file'])
+    return result
+
+
+class Connection:
+    def __init__(self, address, timeout=DEFAULT_TIMEOUT):
+        self.sock = socket.create_connection(address, timeout=timeout)
+        # request kecil yang di-pipeline tidak perlu menunggu algoritma Nagle
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = framing.RecvBuffer()
+        self.used = False
+        self.reusable = True
+        self.responded = False
+
+    def send(self, data):
+        try:
+            self.sock.sendall(data)
+        except socket.timeout:
+            raise
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    def read_response(self):
+        response = self.buffer.read_until(self.sock)
+        if response is None:
+            if not self.responded and not len(self.buffer):
+                raise StaleConnection('Connection closed by server')
+            raise ConnectionError('Connection closed by server')
+        self.responded = True
+        return json.loads(response)
+
+    def close(self):
+        self.sock.close()
+
+
+class ConnectionPool:
+    def __init__(self, address=DEFAULT_ADDRESS, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.address = address
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        meminjam satu koneksi; koneksi ditutup (tidak dikembalikan ke pool)
+        jika terjadi exception di dalam blok with
+        """
+        timeout = timeout or self.timeout
+        if not self.slots.acquire(timeout=timeout):
+            raise socket.timeout('Timed out waiting for a pooled connection')
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = Connection(self.address, timeout)
+            conn.sock.settimeout(timeout)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            conn.used = True
+            if self.keep_alive and conn.reusable:
+                with self.lock:
+                    self.idle.append(conn)
+            else:
+                conn.close()
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class FileClient:
+    def __init__(self, address=DEFAULT_ADDRESS, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.pool = ConnectionPool(address, pool_size, timeout, keep_alive)
+        self.request_ids = itertools.count()
+
+    def __getstate__(self):
+        # socket di pool tidak bisa dipindah ke proses lain, proses tujuan
+        # membuat pool sendiri
+        state = self.__dict__.copy()
+        del state['pool']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pool = ConnectionPool(self.address, self.pool_size, self.timeout, self.keep_alive)
+
+    def close(self):
+        self.pool.close()
+
+    def next_id(self):
+        return str(next(self.request_ids))
+
+    def exchange(self, func, timeout=None, retry=False):
+        """
+        menjalankan func(conn) dengan koneksi dari pool dan mengembalikan
+        hasilnya; error jaringan menjadi result status ERROR. Dengan
+        retry=True error pada koneksi dari pool selalu dicoba ulang sekali,
+        selain itu hanya jika koneksi ternyata sudah ditutup server
+        """
+        for attempt in range(2):
+            reused = False
+            try:
+                with self.pool.connection(timeout) as conn:
+                    reused = conn.used
+                    conn.responded = False
+                    return func(conn)
+            except socket.timeout:
+                return error('Socket timeout')
+            except ConnectionRefusedError:
+                return error('Connection refused')
+            except StaleConnection as e:
+                if reused and attempt == 0:
+                    continue
+                return error(str(e))
+            except (ConnectionError, OSError) as e:
+                if reused and attempt == 0 and retry:
+                    continue
+                return error(str(e))
+            except Exception as e:
+                return error(str(e))
+
+    def read_response(self, conn, request_id):
+        result = conn.read_response()
+        if result.get('id') != request_id:
+            raise ConnectionError(f"Response id {result.get('id')} does not match request {request_id}")
+        del result['id']
+        return result
+
+    def request(self, command, timeout=None):
+        request_id = self.next_id()
+
+        def send(conn):
+            conn.send(f"@id={request_id} {command}\r\n\r\n".encode())
+            return self.read_response(conn, request_id)
+        return self.exchange(send, timeout, idempotent(command))
+
+    def pipeline(self, commands, timeout=None):
+        """
+        mengirim semua commands di satu koneksi, mengembalikan list result
+        dengan urutan yang sama
+        """
+        ids = [self.next_id() for _ in commands]
+
+        def send(conn):
+            results = []
+            sent = 0
+            while len(results) < len(commands):
+                window = min(len(results) + PIPELINE_WINDOW, len(commands))
+                if sent < window:
+                    conn.send(b"".join(f"@id={ids[i]} {commands[i]}\r\n\r\n".encode() for i in range(sent, window)))
+                    sent = window
+                results.append(self.read_response(conn, ids[len(results)]))
+            conn.reusable = False
+            return results
+
+        results = self.exchange(send, timeout, all(idempotent(command) for command in commands))
+        return results if isinstance(results, list) else [results] * len(commands)
+
+    def list(self, timeout=None):
+        return self.request("LIST", timeout)
+
+    def get(self, filename, timeout=None):
+        """
+        GET dengan base64; data_file pada result sudah berupa bytes
+        """
+        return decode_result(self.request(f"GET {filename}", timeout))
+
+    def delete(self, filename, timeout=None):
+        return self.request(f"DELETE {filename}", timeout)
+
+    def batch(self, commands, timeout=None):
+        result = self.request(f"BATCH {json.dumps(commands)}", timeout)
+        if result['status'] == 'OK':
+            result['data'] = [decode_result(item) for item in result['data']]
+        return result
+
+    def upload(self, filename, data, timeout=None):
+        return self.request(f"UPLOAD {filename} {base64.b64encode(data).decode()}", timeout)
+
+    def upload_file(self, path, filename=None, timeout=None):
+        """
+        UPLOAD biasa (base64) yang di-encode dan dikirim per chunk dari
+        file, berlaku untuk semua versi server
+        """
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+
+        def send(conn):
+            conn.send(f"@id={request_id} UPLOAD {filename} ".encode())
+            with open(path, 'rb') as f:
+                while chunk := f.read(BASE64_CHUNK_SIZE):
+                    conn.send(base64.b64encode(chunk))
+            conn.send(framing.DELIMITER)
+            return self.read_response(conn, request_id)
+        return self.exchange(send, timeout)
+
+
+class AsyncConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.used = False
+        self.reusable = True
+        self.responded = False
+
+    @classmethod
+    async def open(cls, address):
+        reader, writer = await asyncio.open_connection(*address, limit=ASYNC_READ_LIMIT)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    async def send(self, data):
+        try:
+            self.writer.write(data)
+            await self.writer.drain()
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    async def read_response(self):
+        try:
+            response = await self.reader.readuntil(framing.DELIMITER)
+        except asyncio.IncompleteReadError as e:
+            if not self.responded and not e.partial:
+                raise StaleConnection('Connection closed by server')
+            raise ConnectionError('Connection closed by server')
+        self.responded = True
+        return json.loads(response[:-len(framing.DELIMITER)])
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    def __init__(self, address=DEFAULT_ADDRESS, size=DEFAULT_POOL_SIZE, keep_alive=False):
+        self.address = address
+        self.keep_alive = keep_alive
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else await AsyncConnection.open(self.address)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            conn.used = True
+            if self.keep_alive and conn.reusable:
+                self.idle.append(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class AsyncFileClient:
+    """
+    versi asyncio dari FileClient dengan method yang sama (di-await);
+    timeout berlaku untuk seluruh request termasuk menunggu koneksi dari
+    pool
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.timeout = timeout
+        self.pool = AsyncConnectionPool(address, pool_size, keep_alive)
+        self.request_ids = itertools.count()
+
+    async def close(self):
+        self.pool.close()
+
+    def next_id(self):
+        return str(next(self.request_ids))
+
+    async def exchange(self, func, timeout=None, retry=False):
+        for attempt in range(2):
+            reused = False
+
+            async def attempt_exchange():
+                nonlocal reused
+                async with self.pool.connection() as conn:
+                    reused = conn.used
+                    conn.responded = False
+                    return await func(conn)
+            try:
+                return await asyncio.wait_for(attempt_exchange(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                return error('Socket timeout')
+            except ConnectionRefusedError:
+                return error('Connection refused')
+            except StaleConnection as e:
+                if reused and attempt == 0:
+                    continue
+                return error(str(e))
+            except (ConnectionError, OSError) as e:
+                if reused and attempt == 0 and retry:
+                    continue
+                return error(str(e))
+            except Exception as e:
+                return error(str(e))
+
+    async def read_response(self, conn, request_id):
+        result = await conn.read_response()
+        if result.get('id') != request_id:
+            raise ConnectionError(f"Response id {result.get('id')} does not match request {request_id}")
+        del result['id']
+        return result
+
+    async def request(self, command, timeout=None):
+        request_id = self.next_id()
+
+        async def send(conn):
+            await conn.send(f"@id={request_id} {command}\r\n\r\n".encode())
+            return await self.read_response(conn, request_id)
+        return await self.exchange(send, timeout, idempotent(command))
+
+    async def pipeline(self, commands, timeout=None):
+        ids = [self.next_id() for _ in commands]
+
+        async def send(conn):
+            results = []
+            sent = 0
+            while len(results) < len(commands):
+                window = min(len(results) + PIPELINE_WINDOW, len(commands))
+                if sent < window:
+                    await conn.send(b"".join(f"@id={ids[i]} {commands[i]}\r\n\r\n".encode() for i in range(sent, window)))
+                    sent = window
+                results.append(await self.read_response(conn, ids[len(results)]))
+            conn.reusable = False
+            return results
+
+        results = await self.exchange(send, timeout, all(idempotent(command) for command in commands))
+        return results if isinstance(results, list) else [results] * len(commands)
+
+    async def list(self, timeout=None):
+        return await self.request("LIST", timeout)
+
+    async def get(self, filename, timeout=None):
+        return decode_result(await self.request(f"GET {filename}", timeout))
+
+    async def delete(self, filename, timeout=None):
+        return await self.request(f"DELETE {filename}", timeout)
+
+    async def batch(self, commands, timeout=None):
+        result = await self.request(f"BATCH {json.dumps(commands)}", timeout)
+        if result['status'] == 'OK':
+            result['data'] = [decode_result(item) for item in result['data']]
+        return result
+
+    async def upload(self, filename, data, timeout=None):
+        return await self.request(f"UPLOAD {filename} {base64.b64encode(data).decode()}", timeout)
+
+    async def upload_file(self, path, filename=None, timeout=None):
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+        loop = asyncio.get_running_loop()
+
+        async def send(conn):
+            await conn.send(f"@id={request_id} UPLOAD {filename} ".encode())
+            with open(path, 'rb') as f:
+                while chunk := await loop.run_in_executor(None, f.read, BASE64_CHUNK_SIZE):
+                    await conn.send(base64.b64encode(chunk))
+            await conn.send(framing.DELIMITER)
+            return await self.read_response(conn, request_id)
+        return await self.exchange(send, timeout)
@@ -1,45 +1,29 @@
-import socket
-import json
-import base64
 import logging
 import os
 
+from file_client import FileClient
+
 server_address=('0.0.0.0',7777)
+# every command opens its own connection (FileClient default), so an idle
+# CLI never holds a connection open on the server
+client = None
 
-def send_command(command_str=""):
-    global server_address
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect(server_address)
-    logging.warning(f"connecting to {server_address}")
-    try:
-        logging.warning(f"sending message ")
-        sock.sendall((command_str + "\r\n\r\n").encode())
-        # Look for the response, waiting until socket is done (no more data)
-        data_received="" #empty string
-        while True:
-            #socket does not receive all data at once, data comes in part, need to be concatenated at the end of process
-            data = sock.recv(4096)
-            if data:
-                #data is not empty, concat with previous content
-                data_received += data.decode()
-                if "\r\n\r\n" in data_received:
-                    break
-            else:
-                # no more data, stop the process by break
-                break
-        # at this point, data_received (string) will contain all data coming from the socket
-        # to be able to use the data_received as a dict, need to load it using json.loads()
-        hasil = json.loads(data_received)
-        logging.warning("data received from server:")
-        return hasil
-    except:
-        logging.warning("error during data receiving")
-        return False
+def connect():
+    global client
+    if client is None:
+        logging.warning(f"connecting to {server_address}")
+        client = FileClient(server_address, pool_size=1)
+    return client
+
+def disconnect():
+    global client
+    if client is not None:
+        client.close()
+        client = None
 
 
 def remote_list():
-    command_str=f"LIST"
-    hasil = send_command(command_str)
+    hasil = connect().list()
     if (hasil['status']=='OK'):
         print("daftar file : ")
         for nmfile in hasil['data']:
@@ -49,28 +33,44 @@ def remote_list():
         print("Gagal")
         return False
 
+def save_file(hasil):
+    #data_file sudah di-decode dari base64 ke bytes oleh FileClient
+    namafile= hasil['data_namafile']
+    fp = open(namafile,'wb+')
+    fp.write(hasil['data_file'])
+    fp.close()
+
 def remote_get(filename=""):
-    command_str=f"GET {filename}"
-    hasil = send_command(command_str)
+    hasil = connect().get(filename)
     if (hasil['status']=='OK'):
-        #proses file dalam bentuk base64 ke bentuk bytes
-        namafile= hasil['data_namafile']
-        isifile = base64.b64decode(hasil['data_file'])
-        fp = open(namafile,'wb+')
-        fp.write(isifile)
-        fp.close()
+        save_file(hasil)
         return True
     else:
         print("Gagal")
         return False
 
+def remote_batch(request, filenames):
+    # several GET/DELETE in one round trip
+    hasil = connect().batch([f'{request} {filename}' for filename in filenames])
+    if hasil['status'] != 'OK':
+        print(f"Batch failed: {hasil['data']}")
+        return False
+    for filename, item in zip(filenames, hasil['data']):
+        if item['status'] != 'OK':
+            print(f"{request} {filename} failed: {item['data']}")
+        elif request == 'GET':
+            save_file(item)
+            print(f"GET {filename} success")
+        else:
+            print(f"Delete success: {item['data']}")
+    return True
+
 def remote_upload(filepath=""):
     try:
-        with open(filepath, 'rb') as f:
-            filedata = base64.b64encode(f.read()).decode()
-        filename = os.path.basename(filepath)
-        command_str = f"UPLOAD {filename} {filedata}"
-        hasil = send_command(command_str)
+        if not os.path.isfile(filepath):
+            raise FileNotFoundError(filepath)
+        # file dibaca dan di-encode per chunk, tidak dimuat utuh ke memori
+        hasil = connect().upload_file(filepath)
         if hasil['status'] == 'OK':
             print(f"Upload success: {hasil['data']}")
         else:
@@ -82,8 +82,7 @@ def remote_upload(filepath=""):
 
 
 def remote_delete(filename=""):
-    command_str = f"DELETE {filename}"
-    hasil = send_command(command_str)
+    hasil = connect().delete(filename)
     if hasil['status'] == 'OK':
         print(f"Delete success: {hasil['data']}")
     else:
@@ -94,9 +93,9 @@ if __name__=='__main__':
     server_address=('0.0.0.0',6677)
     print("Enter command:")
     print("- LIST")
-    print("- GET <filename>")
+    print("- GET <filename> [<filename> ...]")
     print("- UPLOAD <filename>")
-    print("- DELETE <filename>")
+    print("- DELETE <filename> [<filename> ...]")
     print("- QUIT")
     
     while True:
@@ -105,15 +104,22 @@ if __name__=='__main__':
         if command == "LIST":
             remote_list()
         elif command.startswith("GET "):
-            filename = command[4:].strip()
-            remote_get(filename)
+            filenames = command[4:].split()
+            if len(filenames) > 1:
+                remote_batch("GET", filenames)
+            else:
+                remote_get(filenames[0])
         elif command.startswith("UPLOAD "):
             filename = command[7:].strip()
             remote_upload(filename)
         elif command.startswith("DELETE "):
-            filename = command[7:].strip()
-            remote_delete(filename)
+            filenames = command[7:].split()
+            if len(filenames) > 1:
+                remote_batch("DELETE", filenames)
+            else:
+                remote_delete(filenames[0])
         elif command == "QUIT":
+            disconnect()
             break
         else:
             print("Invalid command")
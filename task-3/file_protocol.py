@@ -14,8 +14,17 @@ pada akhirnya akan diproses dalam bentuk string
 
 * class FileProtocol akan memproses data yang masuk dalam bentuk
 string
+
+* request boleh diawali "@id=nilai", respons akan memuat field id yang
+sama sehingga client yang mengirim beberapa request di satu koneksi
+dapat mencocokkan respons
+
+* BATCH menjalankan banyak request LIST/GET/DELETE sekaligus dalam satu
+round trip
 """
 
+BATCH_REQUESTS = ('list', 'get', 'delete')
+MAX_BATCH = 1000
 
 
 class FileProtocol:
@@ -23,7 +32,18 @@ class FileProtocol:
         self.file = FileInterface()
     def proses_string(self,string_datamasuk=''):
         logging.warning(f"string diproses: {string_datamasuk}")
-        c = string_datamasuk.strip().split(" ", 2)
+        request_id, string_datamasuk = self.parse_id(string_datamasuk)
+        c = string_datamasuk.split(" ", 2)
+        if c[0].strip().lower() == 'batch':
+            cl = self.proses_batch(string_datamasuk[len('batch'):])
+        else:
+            cl = self.proses_request(string_datamasuk)
+        if request_id is not None:
+            cl = dict(id=request_id, **(cl or {}))
+        return json.dumps(cl)
+
+    def proses_request(self, string_datamasuk=''):
+        c = string_datamasuk.split(" ", 2)
         try:
             c_request = c[0].strip().lower()
             logging.warning(f"memproses request: {c_request}")
@@ -31,9 +51,41 @@ class FileProtocol:
             cl = getattr(self.file,c_request)(params)
 
             logging.warning("\n")
-            return json.dumps(cl)
+            return cl
         except Exception:
-            return json.dumps(dict(status='ERROR',data='request tidak dikenali'))
+            return dict(status='ERROR',data='request tidak dikenali')
+
+    def proses_batch(self, string_params=''):
+        """
+        BATCH ["GET a.txt", "DELETE b.txt", ...]: data berisi list hasil
+        setiap request dengan urutan yang sama
+        """
+        try:
+            commands = json.loads(string_params)
+        except ValueError:
+            commands = None
+        if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+            return dict(status='ERROR', data='parameter BATCH harus list JSON berisi request')
+        if len(commands) > MAX_BATCH:
+            return dict(status='ERROR', data=f"BATCH maksimal {MAX_BATCH} request")
+        hasil = []
+        for command in commands:
+            if command.strip().split(" ", 1)[0].lower() in BATCH_REQUESTS:
+                hasil.append(self.proses_request(command.strip()))
+            else:
+                hasil.append(dict(status='ERROR', data=f"request tidak didukung dalam BATCH: {command[:50]}"))
+        return dict(status='OK', data=hasil)
+
+    def parse_id(self, string_datamasuk=''):
+        """
+        memisahkan "@id=nilai" di awal request, mengembalikan (id atau
+        None, sisa request)
+        """
+        string_datamasuk = string_datamasuk.strip()
+        if not string_datamasuk.startswith('@id='):
+            return None, string_datamasuk
+        option, _, rest = string_datamasuk.partition(' ')
+        return option[len('@id='):], rest.strip()
 
 
 if __name__=='__main__':
@@ -6,6 +6,7 @@ import time
 import sys
 
 
+import framing
 from file_protocol import  FileProtocol
 fp = FileProtocol()
 
@@ -17,20 +18,25 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
-        buffer = ""
-        while True:
-            data = self.connection.recv(4096)
-            if not data:
-                break
-            buffer += data.decode()
-            if "\r\n\r\n" in buffer:
-                break
-        if buffer:
-            request = buffer.strip()
+        buffer = framing.RecvBuffer()
+        # koneksi tetap dibuka untuk request berikutnya sampai client menutupnya
+        try:
+            while (message := buffer.read_until(self.connection)) is not None:
+                self.reply(message)
+            # tanpa delimiter, pakai sisa data yang diterima sampai koneksi ditutup
+            if len(buffer):
+                self.reply(bytes(buffer.view()))
+        except OSError as e:
+            logging.warning(f"koneksi {self.address} error: {e}")
+        finally:
+            self.connection.close()
+
+    def reply(self, message):
+        request = message.decode().strip()
+        if request:
             hasil = fp.proses_string(request)
             hasil = hasil + "\r\n\r\n"
             self.connection.sendall(hasil.encode())
-        self.connection.close()
 
 
 
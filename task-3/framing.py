@@ -0,0 +1,114 @@
+"""
+* framing berisi buffer penerimaan yang dipakai bersama oleh server dan
+client untuk memotong pesan berdasarkan delimiter "\r\n\r\n"
+
+* data diterima dengan recv_into langsung ke bytearray yang sudah
+dialokasikan, tanpa membuat bytes/str baru setiap recv
+
+* pencarian delimiter dimulai dari posisi scan terakhir, sehingga pesan
+besar (misalnya UPLOAD 100MB dalam base64) hanya dipindai satu kali
+
+* data yang sudah dikonsumsi tidak langsung dihapus; ruang di depan buffer
+baru dipakai ulang (compact) saat ruang kosong di belakang tidak cukup,
+dan buffer diperbesar dua kali lipat jika memang penuh
+"""
+
+DELIMITER = b"\r\n\r\n"
+DEFAULT_BUFFER_SIZE = 256 * 1024
+MIN_RECV_SIZE = 64 * 1024
+
+
+class RecvBuffer:
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        self.data = bytearray(size)
+        self.memory = memoryview(self.data)
+        self.start = 0
+        self.end = 0
+        self.scanned = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def view(self):
+        return self.memory[self.start:self.end]
+
+    def recv_into(self, sock, size=MIN_RECV_SIZE):
+        self.reserve(size)
+        received = sock.recv_into(self.memory[self.end:])
+        self.end += received
+        return received
+
+    def reserve(self, size):
+        if len(self.data) - self.end >= size:
+            return
+        length = len(self)
+        if len(self.data) - length >= size and self.start >= length:
+            # ruang kosong di depan cukup dan tidak tumpang tindih dengan data
+            self.memory[:length] = self.memory[self.start:self.end]
+        else:
+            capacity = len(self.data)
+            while capacity - length < size:
+                capacity *= 2
+            data = bytearray(capacity)
+            data[:length] = self.memory[self.start:self.end]
+            self.data = data
+            self.memory = memoryview(data)
+        self.start, self.end = 0, length
+
+    def find(self, delimiter=DELIMITER):
+        index = self.data.find(delimiter, self.start + self.scanned, self.end)
+        if index < 0:
+            self.scanned = max(0, len(self) - len(delimiter) + 1)
+            return -1
+        return index - self.start
+
+    def consume(self, size):
+        self.start = min(self.start + size, self.end)
+        self.scanned = 0
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def take(self, size):
+        size = min(size, len(self))
+        chunk = bytes(self.memory[self.start:self.start + size])
+        self.consume(size)
+        return chunk
+
+    def split(self, delimiter=DELIMITER):
+        """
+        mengembalikan pesan sebelum delimiter (tanpa delimiter) atau None
+        jika delimiter belum diterima
+        """
+        index = self.find(delimiter)
+        if index < 0:
+            return None
+        message = self.take(index)
+        self.consume(len(delimiter))
+        return message
+
+    def read_until(self, sock, delimiter=DELIMITER):
+        """
+        menerima dari socket sampai satu pesan lengkap, mengembalikan None
+        jika koneksi ditutup sebelum delimiter diterima
+        """
+        while (message := self.split(delimiter)) is None:
+            if not self.recv_into(sock):
+                return None
+        return message
+
+    def read_exact(self, sock, size):
+        """
+        menghasilkan (generator) tepat size byte: sisa data di buffer dulu,
+        lalu langsung dari socket
+        """
+        remaining = size
+        if len(self):
+            chunk = self.take(remaining)
+            remaining -= len(chunk)
+            yield chunk
+        while remaining > 0:
+            data = sock.recv(min(MIN_RECV_SIZE, remaining))
+            if not data:
+                raise ConnectionError("koneksi ditutup di tengah pesan")
+            remaining -= len(data)
+            yield data
@@ -1,8 +1,22 @@
 import requests
 import os
+import hashlib
+import time
+import statistics
+import threading
+import concurrent.futures
 from html.parser import HTMLParser
 
 SERVER_ADDRESS = "http://127.0.0.1:9977"
+BENCHMARK_REQUESTS = 200
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_SEGMENTS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_RETRIES = 2
+
+# one pooled keep-alive connection is reused by every request below
+session = requests.Session()
 
 class FileListingParser(HTMLParser):
     def handle_data(self, data):
@@ -12,7 +26,7 @@ class FileListingParser(HTMLParser):
 def list_files():
     try:
         print(":: Retrieving file listing...")
-        resp = requests.get(f"{SERVER_ADDRESS}/list")
+        resp = session.get(f"{SERVER_ADDRESS}/list")
         
         if resp.headers.get('Content-Type') == 'text/html':
             p = FileListingParser()
@@ -34,17 +48,28 @@ def upload_file():
         return
 
     try:
-        with open(local_file, 'rb') as f:
-            data = f.read()
+        connections = int(input(f"Parallel connections (1 = single request) [{DEFAULT_SEGMENTS}]: ") or DEFAULT_SEGMENTS)
+    except ValueError:
+        print("!! Connections must be a number")
+        return
 
+    try:
         headers = {'X-File-Name': local_file}
-        
+        if already_stored(local_file, headers):
+            print("++ Server already had the content, nothing sent")
+            return
+
         print(f":: Sending {local_file}...")
-        resp = requests.post(
-            f"{SERVER_ADDRESS}/upload",
-            data=data,
-            headers=headers
-        )
+        if connections > 1:
+            resp = upload_multipart(local_file, local_file, connections)
+        else:
+            with open(local_file, 'rb') as f:
+                data = f.read()
+            resp = session.post(
+                f"{SERVER_ADDRESS}/upload",
+                data=data,
+                headers=headers
+            )
 
         print(f"Server response ({resp.status_code}):")
         print(resp.text)
@@ -54,12 +79,83 @@ def upload_file():
     except requests.exceptions.RequestException as err:
         print(f"!! Upload error: {err}")
 
+class ThreadSessions:
+    """One requests.Session per worker thread, so the parts a thread sends
+    reuse its keep-alive connection. close() ends them all, so no idle
+    connection keeps holding a server worker after the upload."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            with self.lock:
+                self.sessions.append(self.local.session)
+        return self.local.session
+
+    def close(self):
+        for part_session in self.sessions:
+            part_session.close()
+
+def send_part(sessions, upload_id, local_file, number, part_size):
+    with open(local_file, 'rb') as f:
+        f.seek(number * part_size)
+        data = f.read(part_size)
+    headers = {'X-Checksum-Sha256': hashlib.sha256(data).hexdigest()}
+    resp = sessions.get().put(f"{SERVER_ADDRESS}/uploads/{upload_id}/{number}", data=data, headers=headers)
+    resp.raise_for_status()
+
+def upload_multipart(local_file, name, connections=DEFAULT_SEGMENTS, part_size=DEFAULT_PART_SIZE):
+    size = os.path.getsize(local_file)
+    resp = session.post(f"{SERVER_ADDRESS}/uploads",
+                        headers={'X-File-Name': name, 'X-File-Size': str(size), 'X-Part-Size': str(part_size)})
+    resp.raise_for_status()
+    upload = resp.json()
+    missing = list(range(upload['parts']))
+
+    # parts that failed show up in the upload's status and are sent again
+    for _ in range(MULTIPART_RETRIES + 1):
+        sessions = ThreadSessions()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=connections) as pool:
+                jobs = [pool.submit(send_part, sessions, upload['id'], local_file, number, upload['part_size'])
+                        for number in missing]
+                for job in jobs:
+                    try:
+                        job.result()
+                    except requests.exceptions.RequestException as err:
+                        print(f"!! Part failed: {err}")
+        finally:
+            sessions.close()
+
+        resp = session.get(f"{SERVER_ADDRESS}/uploads/{upload['id']}")
+        resp.raise_for_status()
+        missing = resp.json()['missing']
+        if not missing:
+            return session.post(f"{SERVER_ADDRESS}/uploads/{upload['id']}/complete")
+        print(f":: Resending {len(missing)} parts")
+
+    session.delete(f"{SERVER_ADDRESS}/uploads/{upload['id']}")
+    raise requests.exceptions.RequestException(f"parts still missing: {missing}")
+
+def already_stored(local_file, headers):
+    # servers running with dedup link the name to content they already hold
+    digest = hashlib.sha256()
+    with open(local_file, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    resp = session.post(f"{SERVER_ADDRESS}/have/{digest.hexdigest()}", headers=headers)
+    return resp.status_code == 201
+
 def delete_file():
     filename = input("Enter filename to delete from server: ")
     
     try:
         print(f":: Removing {filename}...")
-        resp = requests.delete(f"{SERVER_ADDRESS}/{filename}")
+        resp = session.delete(f"{SERVER_ADDRESS}/{filename}")
 
         print(f"Server response ({resp.status_code}):")
         print(resp.text)
@@ -69,16 +165,119 @@ def delete_file():
     except requests.exceptions.RequestException as err:
         print(f"!! Delete failed: {err}")
 
+def download_single(filename, target):
+    with session.get(f"{SERVER_ADDRESS}/{filename}", stream=True) as resp:
+        resp.raise_for_status()
+        with open(target, 'wb') as f:
+            for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    return os.path.getsize(target)
+
+def fetch_segment(filename, target, start, end):
+    with requests.get(f"{SERVER_ADDRESS}/{filename}", headers={'Range': f"bytes={start}-{end}"}, stream=True) as resp:
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            raise requests.exceptions.RequestException("server ignored the Range header")
+        with open(target, 'r+b') as f:
+            f.seek(start)
+            for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+def download_segmented(filename, target, segments=DEFAULT_SEGMENTS):
+    # a one-byte range tells us the total size from Content-Range; the
+    # connection is closed so it does not hold a server worker while the
+    # segments are fetched
+    resp = session.get(f"{SERVER_ADDRESS}/{filename}", headers={'Range': 'bytes=0-0', 'Connection': 'close'})
+    resp.raise_for_status()
+    size = int(resp.headers['Content-Range'].rsplit('/', 1)[1])
+
+    with open(target, 'wb') as f:
+        f.truncate(size)
+
+    step = -(-size // segments)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=segments) as pool:
+        jobs = [pool.submit(fetch_segment, filename, target, start, min(start + step, size) - 1)
+                for start in range(0, size, step)]
+        for job in jobs:
+            job.result()
+    return size
+
+def download_file():
+    filename = input("Enter filename to download from server: ")
+    try:
+        segments = int(input(f"Parallel segments (1 = single stream) [{DEFAULT_SEGMENTS}]: ") or DEFAULT_SEGMENTS)
+    except ValueError:
+        print("!! Segments must be a number")
+        return
+
+    try:
+        print(f":: Downloading {filename}...")
+        start = time.perf_counter()
+        if segments > 1:
+            size = download_segmented(filename, filename, segments)
+        else:
+            size = download_single(filename, filename)
+        elapsed = time.perf_counter() - start
+        print(f"++ Saved {filename}: {size} bytes in {elapsed:.3f}s ({size / elapsed / 1e6:.2f} MB/s)")
+    except requests.exceptions.RequestException as err:
+        print(f"!! Download failed: {err}")
+
+def benchmark_download():
+    filename = input("Enter filename on server to benchmark: ")
+    try:
+        results = []
+        for segments in (1, 2, 4, 8):
+            target = f"bench_{segments}_{filename}"
+            start = time.perf_counter()
+            if segments == 1:
+                size = download_single(filename, target)
+            else:
+                size = download_segmented(filename, target, segments)
+            elapsed = time.perf_counter() - start
+            results.append((segments, size / elapsed / 1e6))
+            os.remove(target)
+
+        for segments, throughput in results:
+            label = "single stream" if segments == 1 else f"{segments} segments"
+            print(f"{label:>15}: {throughput:.2f} MB/s")
+    except requests.exceptions.RequestException as err:
+        print(f"!! Benchmark failed: {err}")
+
+def measure_latency(get, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        get(f"{SERVER_ADDRESS}/").raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def benchmark_keepalive():
+    try:
+        print(f":: Sending {BENCHMARK_REQUESTS} requests per mode...")
+        fresh = measure_latency(lambda url: requests.get(url, headers={'Connection': 'close'}), BENCHMARK_REQUESTS)
+        with requests.Session() as bench_session:
+            reused = measure_latency(bench_session.get, BENCHMARK_REQUESTS)
+
+        for label, latencies in (("New connection", fresh), ("Keep-alive", reused)):
+            print(f"{label:>15}: mean {statistics.mean(latencies) * 1000:.3f} ms, "
+                  f"median {statistics.median(latencies) * 1000:.3f} ms")
+        print(f"++ Keep-alive speedup: {statistics.mean(fresh) / statistics.mean(reused):.2f}x")
+    except requests.exceptions.RequestException as err:
+        print(f"!! Benchmark failed: {err}")
+
 def main():
     print("\nHTTP Client Menu:")
     print("1. List files on server")
     print("2. Upload file to server")
     print("3. Delete file from server")
-    print("4. Exit")
+    print("4. Download file from server")
+    print("5. Benchmark segmented vs single-stream download")
+    print("6. Benchmark keep-alive vs new connections")
+    print("7. Exit")
 
     try:
         while True:
-            choice = input("\nEnter your choice (1-4): ")
+            choice = input("\nEnter your choice (1-7): ")
             
             if choice == '1':
                 list_files()
@@ -87,10 +286,16 @@ def main():
             elif choice == '3':
                 delete_file()
             elif choice == '4':
+                download_file()
+            elif choice == '5':
+                benchmark_download()
+            elif choice == '6':
+                benchmark_keepalive()
+            elif choice == '7':
                 print('Good bye ;D')
                 break
             else:
-                print("!! Invalid choice - please enter 1-4")
+                print("!! Invalid choice - please enter 1-7")
     except KeyboardInterrupt:
         print('\nGood bye ;D')
 
@@ -0,0 +1,61 @@
+import threading
+
+REASONS = {
+    'connections': 'Too many connections',
+    'client': 'Too many connections from this client',
+    'memory': 'Request memory budget exhausted',
+}
+
+
+class AdmissionControl:
+    """Limits on the work the server takes on, so overload shows up as
+    503 responses and longer waits instead of unbounded threads and memory.
+
+    max_connections caps connections being served, max_per_client caps them
+    per client IP, and memory_budget caps the request bytes held in memory
+    by all connections together (bodies that are kept in memory; uploads
+    stream to disk and do not count). 0 means no limit. With the process
+    server every worker has its own AdmissionControl."""
+
+    def __init__(self, max_connections=0, max_per_client=0, memory_budget=0, retry_after=1):
+        self.max_connections = max_connections
+        self.max_per_client = max_per_client
+        self.memory_budget = memory_budget
+        self.retry_after = retry_after
+        self.connections = 0
+        self.per_client = {}
+        self.memory = 0
+        self.lock = threading.Lock()
+
+    def admit(self, client):
+        """Return why a connection from `client` is refused (a REASONS key),
+        or None if it is admitted; an admitted one must end in release()."""
+        with self.lock:
+            if self.max_connections and self.connections >= self.max_connections:
+                return 'connections'
+            count = self.per_client.get(client, 0)
+            if self.max_per_client and count >= self.max_per_client:
+                return 'client'
+            self.connections += 1
+            self.per_client[client] = count + 1
+        return None
+
+    def release(self, client):
+        with self.lock:
+            self.connections -= 1
+            count = self.per_client.pop(client) - 1
+            if count:
+                self.per_client[client] = count
+
+    def reserve(self, size):
+        """Count `size` more bytes as held, or return False (counting
+        nothing) if that would exceed the budget."""
+        with self.lock:
+            if self.memory_budget and size > 0 and self.memory + size > self.memory_budget:
+                return False
+            self.memory += size
+            return True
+
+    def free(self, size):
+        with self.lock:
+            self.memory -= size
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values in bytes.
+
+    Keys are tuples starting with the file path, e.g. (path, mtime_ns, size),
+    so a changed file naturally misses and invalidate(path) drops every
+    variant of that file."""
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self.entries = OrderedDict()
+        self.by_path = {}
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        size = len(value) if size is None else size
+        if size > self.max_entry_bytes:
+            return False
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (value, size)
+            self.by_path.setdefault(key[0], set()).add(key)
+            self.used += size
+            while self.used > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, path):
+        with self.lock:
+            for key in list(self.by_path.get(path, ())):
+                self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        entries=len(self.entries), bytes=self.used, max_bytes=self.max_bytes)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.used -= entry[1]
+        keys = self.by_path.get(key[0])
+        keys.discard(key)
+        if not keys:
+            del self.by_path[key[0]]
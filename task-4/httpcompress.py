@@ -0,0 +1,50 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# server preference when the client accepts several codings equally
+ENCODINGS = ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+COMPRESSIBLE_TYPES = {'text/plain', 'text/html', 'application/json'}
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def negotiate(accept_encoding):
+    """Pick a content coding from an Accept-Encoding header value.
+
+    Returns None when the client sent no header, accepts nothing we
+    support, or only identity. q=0 rules a coding out (RFC 9110 12.5.3)."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compressible(content_type, size):
+    return content_type.split(';')[0] in COMPRESSIBLE_TYPES and size >= MIN_SIZE
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd' and zstandard is not None:
+        # compressor objects are not thread-safe, so make one per call
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding {encoding}")
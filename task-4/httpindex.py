@@ -0,0 +1,148 @@
+import os
+import time
+import uuid
+import bisect
+import fnmatch
+import threading
+
+POLL_INTERVAL = 1.0
+RESCAN_INTERVAL = 10.0
+MAX_CHANGES = 10000
+
+def default_include(name):
+    return not name.startswith('.')
+
+class DirectoryIndex:
+    """In-memory listing of a directory: sorted names plus size and mtime.
+
+    _store/_erase keep it current through put()/remove(). Changes made by
+    other processes are picked up by polling: a changed directory mtime or
+    a full rescan every RESCAN_INTERVAL seconds stand in for inotify, which
+    the standard library does not offer.
+
+    Every change gets a sequence number; cursors look like "epoch-seq" and
+    query(since=cursor) returns only what changed after it. Each instance
+    has its own epoch, so a cursor from another worker or before a restart,
+    or one older than the kept change log, comes back with reset=True and
+    the client has to fetch the full listing again."""
+
+    def __init__(self, path='.', include=default_include):
+        self.path = path
+        self.include = include
+        self.epoch = uuid.uuid4().hex[:8]
+        self.names = []
+        self.entries = {}
+        self.changes = []
+        self.seq = 0
+        self.dir_mtime = None
+        self.polled = 0
+        self.scanned = 0
+        self.lock = threading.Lock()
+        self.rescan()
+
+    def cursor(self):
+        return f"{self.epoch}-{self.seq}"
+
+    def put(self, name):
+        if not self.include(name):
+            return
+        try:
+            st = os.stat(os.path.join(self.path, name))
+        except OSError:
+            self.remove(name)
+            return
+        with self.lock:
+            self._put(name, st.st_size, st.st_mtime)
+
+    def remove(self, name):
+        with self.lock:
+            self._remove(name)
+
+    def rescan(self):
+        # stat the directory first so changes made during the scan still
+        # show up on the next poll
+        dir_mtime = os.stat(self.path).st_mtime_ns
+        found = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if self.include(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    found[entry.name] = (st.st_size, st.st_mtime)
+        with self.lock:
+            for name in [n for n in self.entries if n not in found]:
+                self._remove(name)
+            for name, (size, mtime) in found.items():
+                if self.entries.get(name) != (size, mtime):
+                    self._put(name, size, mtime)
+            self.dir_mtime = dir_mtime
+            self.scanned = time.monotonic()
+
+    def poll(self):
+        now = time.monotonic()
+        if now - self.polled < POLL_INTERVAL:
+            return
+        self.polled = now
+        if os.stat(self.path).st_mtime_ns != self.dir_mtime or now - self.scanned >= RESCAN_INTERVAL:
+            self.rescan()
+
+    def query(self, offset=0, limit=None, prefix='', pattern=None, since=None):
+        """Without since: dict(files, total, cursor) with (name, size, mtime)
+        tuples after prefix/pattern filtering and pagination. With since:
+        dict(changes, cursor, reset) with (name, 'put'|'delete', size, mtime)."""
+        self.poll()
+        with self.lock:
+            if since is not None:
+                return self._changes_since(since, prefix, pattern)
+
+            # names sharing a prefix sit in one run of the sorted list
+            start = bisect.bisect_left(self.names, prefix)
+            end = bisect.bisect_right(self.names, prefix + '\U0010ffff') if prefix else len(self.names)
+            if pattern is None:
+                matches = self.names
+                total = end - start
+                offset += start
+                stop = end if limit is None else min(end, offset + limit)
+            else:
+                matches = [name for name in self.names[start:end] if fnmatch.fnmatchcase(name, pattern)]
+                total = len(matches)
+                stop = total if limit is None else offset + limit
+            page = matches[offset:stop]
+            files = [(name,) + self.entries[name] for name in page]
+            return dict(files=files, total=total, cursor=self.cursor())
+
+    def _changes_since(self, since, prefix, pattern):
+        epoch, _, seq = since.partition('-')
+        oldest = self.changes[0][0] if self.changes else self.seq + 1
+        if epoch != self.epoch or not seq.isdigit() or not oldest - 1 <= int(seq) <= self.seq:
+            return dict(changes=[], cursor=self.cursor(), reset=True)
+
+        # sequence numbers in the log have no gaps; only the latest change
+        # per name is reported
+        latest = {}
+        for _, name, change in self.changes[int(seq) - oldest + 1:]:
+            latest[name] = change
+        changes = []
+        for name, change in latest.items():
+            if not name.startswith(prefix) or (pattern is not None and not fnmatch.fnmatchcase(name, pattern)):
+                continue
+            size, mtime = self.entries.get(name, (None, None))
+            changes.append((name, change, size, mtime))
+        return dict(changes=changes, cursor=self.cursor(), reset=False)
+
+    def _put(self, name, size, mtime):
+        if name not in self.entries:
+            bisect.insort(self.names, name)
+        self.entries[name] = (size, mtime)
+        self._record(name, 'put')
+
+    def _remove(self, name):
+        if self.entries.pop(name, None) is None:
+            return
+        del self.names[bisect.bisect_left(self.names, name)]
+        self._record(name, 'delete')
+
+    def _record(self, name, change):
+        self.seq += 1
+        self.changes.append((self.seq, name, change))
+        if len(self.changes) > MAX_CHANGES:
+            del self.changes[:len(self.changes) - MAX_CHANGES]
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+ACCESS_LOGGER = 'httpserver.access'
+LOG_LEVELS = ['debug', 'info', 'warning', 'error']
+LOG_FORMATS = ['text', 'json']
+MAX_FIELD = 200
+QUEUE_SIZE = 10000
+TEXT_FORMAT = '%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s'
+RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+listener = None
+
+
+def clip(value, limit=MAX_FIELD):
+    if isinstance(value, (str, bytes, bytearray)) and len(value) > limit:
+        return f"{value[:limit]!s}...(+{len(value) - limit})"
+    return value
+
+
+class TruncateFilter(logging.Filter):
+    """Clip long str/bytes arguments before a record is queued, so a large
+    request line or body never ends up formatted or held in the queue."""
+
+    def __init__(self, limit=MAX_FIELD):
+        super().__init__()
+        self.limit = limit
+
+    def filter(self, record):
+        if isinstance(record.args, tuple):
+            record.args = tuple(clip(arg, self.limit) for arg in record.args)
+        elif not record.args:
+            record.msg = clip(record.msg, self.limit)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Pass only `rate` of the records below WARNING (access log sampling)."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the `extra` fields of a record."""
+
+    def format(self, record):
+        data = dict(time=self.formatTime(record), level=record.levelname, logger=record.name,
+                    pid=record.process, message=record.getMessage())
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_FIELDS)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: records are formatted by
+    the listener thread and dropped (counted in `dropped`) when the bounded
+    queue is full."""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the listener formats the message; only the traceback has to be
+        # turned into text while it still exists
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level='info', log_file=None, log_format='text', access_sample=1.0, max_field=MAX_FIELD):
+    """Route the root logger through a bounded queue and start the listener
+    thread that writes to stderr and, optionally, `log_file`."""
+    global listener
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    outputs = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        outputs.append(logging.FileHandler(log_file))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    handler = NonBlockingHandler()
+    handler.addFilter(TruncateFilter(max_field))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    logging.getLogger(ACCESS_LOGGER).addFilter(SampleFilter(access_sample))
+
+    listener = logging.handlers.QueueListener(handler.queue, *outputs)
+    listener.start()
+    atexit.register(stop_logging)
+    return listener
+
+
+def stop_logging():
+    """Write out whatever is still queued; forked workers must call this
+    themselves because they exit without running atexit handlers."""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def restart_after_fork():
+    global listener
+    if listener is None:
+        return
+    # the parent's listener thread does not exist in a forked child
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingHandler):
+            handler.queue = queue.Queue(QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(handler.queue, *listener.handlers)
+            listener.start()
+
+
+os.register_at_fork(after_in_child=restart_after_fork)
@@ -0,0 +1,151 @@
+import os
+import time
+import bisect
+import threading
+
+PREFIX = 'httpserver_'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS = {
+    'connections_total': ('counter', 'Connections accepted'),
+    'active_connections': ('gauge', 'Connections being served'),
+    'rejected_total': ('counter', 'Connections or requests answered 503 by admission control, by reason'),
+    'request_memory_bytes': ('gauge', 'Request body bytes held in memory by all connections'),
+    'blocked_workers': ('gauge', 'Connections waiting on their client, by phase; each holds a thread'),
+    'timeouts_total': ('counter', 'Connections closed because a deadline expired, by phase'),
+    'first_byte_seconds': ('histogram', 'Time from accept until the first request byte is read'),
+    'request_seconds': ('histogram', 'Time from the request head to the end of the response, by route and status'),
+    'bytes_received_total': ('counter', 'Request bytes received'),
+    'bytes_sent_total': ('counter', 'Response bytes sent'),
+    'cache_hits_total': ('counter', 'File cache hits'),
+    'cache_misses_total': ('counter', 'File cache misses'),
+    'cache_evictions_total': ('counter', 'File cache evictions'),
+    'cache_bytes': ('gauge', 'Bytes held by the file cache'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], the last bound is +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def label_string(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class Metrics:
+    """Counters, gauges and fixed-bucket histograms for /metrics.
+
+    Labels are keyword arguments and must come from small fixed sets.
+    Recording is one bisect and an addition under a single lock, cheap
+    enough to leave on. Values computed elsewhere (cache statistics) are
+    registered as functions and only read when rendered. Every process
+    has its own Metrics, so with the process server each worker reports
+    what it served itself (see the pid in snapshot())."""
+
+    def __init__(self, prefix=PREFIX, metrics=METRICS):
+        self.prefix = prefix
+        self.metrics = metrics
+        self.values = {}
+        self.histograms = {}
+        self.callbacks = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def dec(self, name, value=1, **labels):
+        self.inc(name, -value, **labels)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register(self, name, func, label=None):
+        """Read the value of `name` from func() whenever metrics are collected;
+        with `label`, func() returns {label value: metric value}."""
+        self.callbacks[name] = (func, label)
+
+    def collect(self):
+        """{name: [(labels, value or Histogram)]} for every metric."""
+        collected = {}
+        with self.lock:
+            for (name, labels), value in self.values.items():
+                collected.setdefault(name, []).append((labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+                collected.setdefault(name, []).append((labels, copy))
+        for name, (func, label) in self.callbacks.items():
+            try:
+                value = func()
+            except Exception:
+                continue
+            if label is None:
+                collected[name] = [((), value)]
+            else:
+                collected[name] = [(((label, key),), count) for key, count in value.items()]
+        return collected
+
+    def snapshot(self):
+        """All metrics as a JSON-friendly dict; histograms become count,
+        sum and cumulative buckets."""
+        data = dict(pid=os.getpid(), uptime=time.time() - self.started)
+        for name, samples in sorted(self.collect().items()):
+            for labels, value in samples:
+                if isinstance(value, Histogram):
+                    value = dict(count=value.count, sum=value.sum,
+                                 buckets={format_bound(bound): count for bound, count in value.cumulative()})
+                data[name + label_string(labels)] = value
+        return data
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for name, samples in sorted(self.collect().items()):
+            kind, text = self.metrics.get(name, ('untyped', name))
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(samples, key=lambda sample: sample[0]):
+                if not isinstance(value, Histogram):
+                    lines.append(f"{full_name}{label_string(labels)} {value}")
+                    continue
+                for bound, count in value.cumulative():
+                    lines.append(f"{full_name}_bucket{label_string(labels + (('le', format_bound(bound)),))} {count}")
+                lines.append(f"{full_name}_sum{label_string(labels)} {value.sum}")
+                lines.append(f"{full_name}_count{label_string(labels)} {value.count}")
+        lines.append(f"# HELP {self.prefix}uptime_seconds Seconds since the metrics were created")
+        lines.append(f"# TYPE {self.prefix}uptime_seconds gauge")
+        lines.append(f"{self.prefix}uptime_seconds {time.time() - self.started}")
+        return '\n'.join(lines) + '\n'
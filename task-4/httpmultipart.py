@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+
+UPLOAD_DIR = '.multipart'
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_PARTS = 10000
+READ_CHUNK_SIZE = 1024 * 1024
+EXPIRY = 3600
+SWEEP_INTERVAL = 60
+UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+
+class MultipartUploads:
+    """Multipart uploads: a large file is sent as numbered parts, possibly
+    in parallel over several connections, and reassembled on completion.
+
+    Each upload is a directory UPLOAD_DIR/<id> holding meta.json (name,
+    size, part size) and one <n>.part file per received part. All state is
+    on disk, so parts of one upload may land on different worker
+    processes. Parts are renamed into place only once complete, so an
+    interrupted part simply shows up as missing and can be sent again.
+    Uploads that receive nothing for `expiry` seconds are removed, checked
+    at most every SWEEP_INTERVAL seconds when a multipart request arrives.
+
+    Unknown or expired uploads raise KeyError, bad input ValueError."""
+
+    def __init__(self, directory='.', expiry=EXPIRY):
+        self.root = os.path.join(directory, UPLOAD_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.expiry = expiry
+        self.swept = 0
+
+    def create(self, name, size, part_size=DEFAULT_PART_SIZE):
+        if size < 0 or part_size <= 0:
+            raise ValueError("Bad size")
+        parts = max(1, -(-size // part_size))
+        if parts > MAX_PARTS:
+            raise ValueError(f"More than {MAX_PARTS} parts, use a larger part size")
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.root, upload_id)
+        os.mkdir(path)
+        meta = dict(name=name, size=size, part_size=part_size, parts=parts)
+        temp_path = os.path.join(path, 'meta.json.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, os.path.join(path, 'meta.json'))
+        return dict(meta, id=upload_id, expires=self.expiry)
+
+    def status(self, upload_id):
+        """Upload metadata plus `missing`, the part numbers still to send."""
+        self.sweep()
+        meta = self.meta(upload_id)
+        received = {}
+        with os.scandir(self.path(upload_id)) as it:
+            for entry in it:
+                number, _, ext = entry.name.partition('.')
+                if ext == 'part' and number.isdigit():
+                    received[int(number)] = entry.stat().st_size
+        missing = [n for n in range(meta['parts']) if received.get(n) != self.part_size(meta, n)]
+        return dict(meta, id=upload_id, missing=missing)
+
+    def part_size(self, meta, number):
+        if not 0 <= number < meta['parts']:
+            raise ValueError(f"Part number must be 0 to {meta['parts'] - 1}")
+        return min(meta['part_size'], meta['size'] - number * meta['part_size'])
+
+    def part_path(self, upload_id, number):
+        return os.path.join(self.path(upload_id), f"{number}.part")
+
+    def read_parts(self, upload_id, parts):
+        """Yield the content of parts 0..parts-1 in order; check status()
+        for missing parts first."""
+        for number in range(parts):
+            with open(self.part_path(upload_id, number), 'rb') as f:
+                while chunk := f.read(READ_CHUNK_SIZE):
+                    yield chunk
+
+    def remove(self, upload_id):
+        shutil.rmtree(self.path(upload_id), ignore_errors=True)
+
+    def sweep(self):
+        now = time.monotonic()
+        if now - self.swept < SWEEP_INTERVAL:
+            return
+        self.swept = now
+        # a directory's mtime moves whenever a part is renamed into it
+        deadline = time.time() - self.expiry
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_dir() and entry.stat().st_mtime < deadline:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def path(self, upload_id):
+        if not UPLOAD_ID.fullmatch(upload_id):
+            raise KeyError(upload_id)
+        return os.path.join(self.root, upload_id)
+
+    def meta(self, upload_id):
+        try:
+            with open(os.path.join(self.path(upload_id), 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
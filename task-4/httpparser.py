@@ -0,0 +1,181 @@
+from http import HTTPStatus
+
+HEAD = 'head'
+BODY = 'body'
+END = 'end'
+
+LENGTH_BODY = 'length_body'
+CHUNK_SIZE = 'chunk_size'
+CHUNK_DATA = 'chunk_data'
+CHUNK_END = 'chunk_end'
+TRAILER = 'trailer'
+
+class ParseError(Exception):
+    def __init__(self, status, msg):
+        super().__init__(msg)
+        self.status = status
+
+class Request:
+    def __init__(self, method, path, version, headers):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+class RequestParser:
+    """Incremental HTTP/1.x request parser.
+
+    Bytes go in through feed() as they arrive; next_event() hands back
+    (HEAD, Request), (BODY, chunk) and (END, None) events, or None when it
+    needs more data. Bodies are never buffered whole, so the caller decides
+    where each chunk goes. Pipelined requests are parsed one after another.
+    """
+
+    def __init__(self, max_header_size=64 * 1024, max_body_size=None):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.buffer = bytearray()
+        self._reset()
+
+    def _reset(self):
+        self.state = HEAD
+        self.scan_from = 0
+        self.remaining = 0
+        self.body_size = 0
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_event(self):
+        if self.state == HEAD:
+            return self._parse_head()
+        if self.state == LENGTH_BODY:
+            return self._parse_length_body()
+        if self.state == CHUNK_SIZE:
+            return self._parse_chunk_size()
+        if self.state == CHUNK_DATA:
+            return self._parse_chunk_data()
+        if self.state == CHUNK_END:
+            return self._parse_chunk_end()
+        if self.state == TRAILER:
+            return self._parse_trailer()
+        self._reset()
+        return END, None
+
+    def _parse_head(self):
+        # blank lines between pipelined requests are allowed (RFC 7230 3.5)
+        while self.buffer.startswith(b'\r\n'):
+            del self.buffer[:2]
+
+        end = self.buffer.find(b'\r\n\r\n', self.scan_from)
+        if end < 0:
+            if len(self.buffer) > self.max_header_size:
+                raise ParseError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header too large")
+            self.scan_from = max(0, len(self.buffer) - 3)
+            return None
+
+        lines = bytes(self.buffer[:end]).decode('latin-1').split('\r\n')
+        del self.buffer[:end + 4]
+        self.scan_from = 0
+
+        try:
+            method, path, version = lines[0].split()
+        except ValueError:
+            raise ParseError(HTTPStatus.BAD_REQUEST, "Bad request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        request = Request(method.upper(), path, version.upper(), headers)
+
+        encoding = headers.get('transfer-encoding', '').lower()
+        length = headers.get('content-length', '0')
+        if encoding:
+            if encoding != 'chunked':
+                raise ParseError(HTTPStatus.NOT_IMPLEMENTED, "Unsupported transfer encoding")
+            self.state = CHUNK_SIZE
+        else:
+            if not length.isdigit():
+                raise ParseError(HTTPStatus.BAD_REQUEST, "Bad content length")
+            self._count_body(int(length))
+            self.remaining = int(length)
+            self.state = LENGTH_BODY if self.remaining else END
+        return HEAD, request
+
+    def _count_body(self, size):
+        self.body_size += size
+        if self.max_body_size is not None and self.body_size > self.max_body_size:
+            raise ParseError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+
+    def _take(self, size):
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.remaining -= len(chunk)
+        return chunk
+
+    def _parse_length_body(self):
+        if not self.buffer:
+            return None
+        chunk = self._take(self.remaining)
+        if not self.remaining:
+            self.state = END
+        return BODY, chunk
+
+    def _read_line(self):
+        end = self.buffer.find(b'\r\n')
+        if end < 0:
+            if len(self.buffer) > self.max_header_size:
+                raise ParseError(HTTPStatus.BAD_REQUEST, "Chunk line too long")
+            return None
+        line = bytes(self.buffer[:end])
+        del self.buffer[:end + 2]
+        return line
+
+    def _parse_chunk_size(self):
+        line = self._read_line()
+        if line is None:
+            return None
+        try:
+            size = int(line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise ParseError(HTTPStatus.BAD_REQUEST, "Bad chunk size")
+        if size == 0:
+            self.state = TRAILER
+            return self.next_event()
+        self._count_body(size)
+        self.remaining = size
+        self.state = CHUNK_DATA
+        return self.next_event()
+
+    def _parse_chunk_data(self):
+        if not self.buffer:
+            return None
+        chunk = self._take(self.remaining)
+        if not self.remaining:
+            self.state = CHUNK_END
+        return BODY, chunk
+
+    def _parse_chunk_end(self):
+        if len(self.buffer) < 2:
+            return None
+        if self.buffer[:2] != b'\r\n':
+            raise ParseError(HTTPStatus.BAD_REQUEST, "Bad chunk terminator")
+        del self.buffer[:2]
+        self.state = CHUNK_SIZE
+        return self.next_event()
+
+    def _parse_trailer(self):
+        while (line := self._read_line()) is not None:
+            if not line:
+                self.state = END
+                return self.next_event()
+        return None
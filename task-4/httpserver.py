@@ -1,12 +1,188 @@
 import os
+import json
+import stat
+import socket
+import tempfile
+import threading
+import time
+import hashlib
+import logging
+import uuid
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 import urllib.parse
 from http import HTTPStatus
+from httpparser import RequestParser, ParseError, HEAD, BODY
+from httpcache import LRUCache
+import httpcompress
+from httpindex import DirectoryIndex
+from httpstore import BlobStore, BLOB_DIR, fsync_dir, valid_digest
+from httpmultipart import MultipartUploads, UPLOAD_DIR, DEFAULT_PART_SIZE
+from httpmetrics import Metrics
+from httplogging import ACCESS_LOGGER
+from httpadmission import AdmissionControl, REASONS
+from httptimeouts import ConnectionTimeouts
+
+SEND_CHUNK_SIZE = 64 * 1024
+RECV_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 64 * 1024
+KEEPALIVE_TIMEOUT = 15
+HEADER_TIMEOUT = 10
+BODY_TIMEOUT = 30
+RESPONSE_TIMEOUT = 30
+REQUEST_TIMEOUT = 3600
+MIN_RATE = 16384
+MAX_BODY_SIZE = 8 * 1024 ** 3
+MAX_MEMORY_BODY = 1024 * 1024
+UPLOAD_PREFIX = '.upload-'
+MAX_RANGES = 16
+METADATA_TTL = 5
+CACHE_BYTES = 256 * 1024 * 1024
+FSYNC_POLICIES = ['none', 'file', 'dir']
+FILE_MODE = 0o644
+
+log = logging.getLogger('httpserver')
+access_log = logging.getLogger(ACCESS_LOGGER)
+
+class FileResponse:
+    """Response whose body is streamed from an open file after the head.
+
+    parts lists what follows the head in order: bytes are sent as they are,
+    (offset, length) pairs are sent straight from the file. file may also be
+    the file's cached content as bytes."""
+
+    def __init__(self, head, file, parts):
+        self.head = head
+        self.file = file
+        self.parts = parts
+
+class UploadFile:
+    """Upload body written to a hidden temp file in the storage directory
+    as it arrives; commit() renames it into place in one step, so readers
+    see the old or the new content, never a torn file, and concurrent
+    uploads of one name resolve to the last rename.
+
+    With hashed=True the SHA-256 of the body is computed on the way, so
+    commit() can hand the file to a BlobStore instead. fsync picks the
+    durability: 'none', 'file' (the data before the rename) or 'dir' (the
+    data, then the directory after the rename)."""
+
+    def __init__(self, directory, hashed=False, fsync='none'):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix=UPLOAD_PREFIX)
+        os.fchmod(fd, FILE_MODE)
+        self.file = os.fdopen(fd, 'wb')
+        self.fsync = fsync
+        self.size = 0
+        self.digest = hashlib.sha256() if hashed else None
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.size += len(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+
+    def commit(self, path, store=None):
+        if self.fsync != 'none':
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.file.close()
+        if store is None:
+            os.replace(self.path, path)
+            if self.fsync == 'dir':
+                fsync_dir(os.path.dirname(path))
+        else:
+            store.adopt(self.path, self.digest.hexdigest(), os.path.basename(path))
+        self.path = None
+
+    def discard(self):
+        if self.path is None:
+            return
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.path = None
+
+class FileMeta:
+    def __init__(self, st, etag):
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = etag
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.checked = time.monotonic()
+
+class MetadataCache:
+    """Stat results and validators per file, so repeat and conditional GETs
+    can be answered without touching the disk.
+
+    _store and _erase invalidate entries right away; entries also expire
+    after ttl seconds to pick up changes made by other worker processes.
+    With hash_etags the ETag is a SHA-256 of the content instead of
+    size+mtime, computed once per cache fill."""
+
+    def __init__(self, ttl=METADATA_TTL, hash_etags=False):
+        self.ttl = ttl
+        self.hash_etags = hash_etags
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            info = self.entries.get(path)
+        if info is not None and time.monotonic() - info.checked < self.ttl:
+            return info
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return self.refresh(path, st)
+
+    def refresh(self, path, st):
+        info = FileMeta(st, self._etag(path, st))
+        with self.lock:
+            self.entries[path] = info
+        return info
+
+    def invalidate(self, path):
+        with self.lock:
+            self.entries.pop(path, None)
+
+    def _etag(self, path, st):
+        if not self.hash_etags:
+            return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(SEND_CHUNK_SIZE):
+                digest.update(chunk)
+        return f'"{digest.hexdigest()}"'
 
 class FileHandler:
-    def __init__(self, storage_dir='./storage'):
+    def __init__(self, storage_dir='./storage', max_body_size=MAX_BODY_SIZE, hash_etags=False,
+                 cache_bytes=CACHE_BYTES, dedup=False, fsync='none', admission=None, timeouts=None):
         self.storage = storage_dir
+        self.max_body_size = max_body_size
+        self.metadata = MetadataCache(hash_etags=hash_etags)
+        self.cache = LRUCache(cache_bytes)
         self._make_storage()
+        self.index = DirectoryIndex(self.storage, self._listed)
+        self.store = BlobStore(self.storage, fsync) if dedup else None
+        self.uploads = MultipartUploads(self.storage)
+        self.fsync = fsync
+        self.metrics = Metrics()
+        self.admission = admission or AdmissionControl()
+        self.metrics.register('request_memory_bytes', lambda: self.admission.memory)
+        self.timeouts = timeouts or ConnectionTimeouts(KEEPALIVE_TIMEOUT, HEADER_TIMEOUT, BODY_TIMEOUT, RESPONSE_TIMEOUT,
+                                                       REQUEST_TIMEOUT, MIN_RATE)
+        self.metrics.register('blocked_workers', self.timeouts.blocked, label='phase')
+        self.metrics.register('timeouts_total', self.timeouts.expired_counts, label='phase')
+        for name, field in [('cache_hits_total', 'hits'), ('cache_misses_total', 'misses'),
+                            ('cache_evictions_total', 'evictions'), ('cache_bytes', 'bytes')]:
+            self.metrics.register(name, lambda field=field: self.cache.stats()[field])
         self.file_types = {
             '.pdf': 'application/pdf',
             '.jpg': 'image/jpeg',
@@ -19,24 +195,181 @@ class FileHandler:
     def _make_storage(self):
         os.makedirs(self.storage, exist_ok=True)
 
+    def _listed(self, name):
+        return not name.startswith(UPLOAD_PREFIX)
+
+    def serve(self, conn):
+        """Answer requests on one connection until the client closes it,
+        asks for Connection: close, or misses a deadline: idle keep-alive,
+        request head, body and response each have their own (see
+        ConnectionTimeouts)."""
+        conn = self.timeouts.wrap(conn)
+        deadline = conn.deadline
+        parser = RequestParser(MAX_HEADER_SIZE, self.max_body_size)
+        request = body = None
+        # in-memory body bytes counted in the admission memory budget
+        held = 0
+        accepted = time.perf_counter()
+        first_byte = True
+        self.metrics.inc('connections_total')
+        self.metrics.inc('active_connections')
+        try:
+            while True:
+                try:
+                    event = parser.next_event()
+                    if event is None:
+                        data = conn.recv(RECV_SIZE)
+                        if not data:
+                            return
+                        if deadline.phase == 'idle':
+                            deadline.start('header', new_request=True)
+                        if first_byte:
+                            self.metrics.observe('first_byte_seconds', time.perf_counter() - accepted)
+                            first_byte = False
+                        self.metrics.inc('bytes_received_total', len(data))
+                        parser.feed(data)
+                        continue
+
+                    kind, value = event
+                    if kind == HEAD:
+                        request = value
+                        started = time.perf_counter()
+                        # a pipelined request parsed from bytes that were
+                        # already buffered never went through the recv
+                        # above, so its request deadline starts here
+                        deadline.start('body', new_request=deadline.phase == 'idle')
+                        body = self._body_sink(request)
+                        if request.headers.get('expect', '').lower() == '100-continue':
+                            conn.sendall(b'HTTP/1.1 100 Continue\r\n\r\n')
+                        continue
+                    if kind == BODY:
+                        if isinstance(body, UploadFile):
+                            body.write(value)
+                        elif len(body) + len(value) > MAX_MEMORY_BODY:
+                            raise ParseError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+                        elif not self.admission.reserve(len(value)):
+                            self.send(conn, self.busy('memory'))
+                            return
+                        else:
+                            held += len(value)
+                            body += value
+                        continue
+                except ParseError as e:
+                    log.warning("Bad request: %s", e)
+                    self.send(conn, self._mark_close(self._fail(e.status, e)))
+                    return
+
+                response = self.handle(request.method, request.path, request.headers, body)
+                self.admission.free(held)
+                held = 0
+                if isinstance(body, UploadFile):
+                    body.discard()
+                if not request.keep_alive:
+                    response = self._mark_close(response)
+                deadline.start('response')
+                sent = self.send(conn, response)
+                self._record(request, response, started, sent)
+                if not request.keep_alive:
+                    return
+                deadline.start('idle')
+        except OSError:
+            # a deadline shut the socket down under a blocked send
+            if deadline.expired is None:
+                raise
+        finally:
+            deadline.close()
+            if deadline.expired is not None:
+                log.debug("Connection timed out in phase %s", deadline.expired)
+            self.admission.free(held)
+            self.metrics.dec('active_connections')
+            if isinstance(body, UploadFile):
+                body.discard()
+
+    def busy(self, reason):
+        """503 with Retry-After for work refused by admission control; the
+        connection is closed after it."""
+        self.metrics.inc('rejected_total', reason=reason)
+        log.debug("Rejected: %s", REASONS[reason])
+        headers = {'Retry-After': str(self.admission.retry_after)}
+        return self._mark_close(self._build(HTTPStatus.SERVICE_UNAVAILABLE, REASONS[reason].encode(), headers))
+
+    def reject(self, conn, reason):
+        """Answer a connection refused at accept time without blocking on it."""
+        try:
+            conn.send(self.busy(reason), socket.MSG_DONTWAIT)
+        except OSError:
+            pass
+
+    def _record(self, request, response, started, sent):
+        head = response.head if isinstance(response, FileResponse) else response
+        duration = time.perf_counter() - started
+        status = head[9:12].decode()
+        self.metrics.observe('request_seconds', duration, route=self._route(request.method, request.path), status=status)
+        self.metrics.inc('bytes_sent_total', sent)
+        access_log.info("%s %s %s %d %.3fms", request.method, request.path, status, sent, duration * 1000,
+                        extra=dict(method=request.method, path=request.path, status=int(status),
+                                   bytes_out=sent, duration=duration))
+
+    def _route(self, method, path):
+        # a small fixed set of label values, never the file name itself
+        path = path.partition('?')[0]
+        if path in ('/metrics', '/list'):
+            return path[1:]
+        if path == '/uploads' or path.startswith('/uploads/'):
+            return 'multipart'
+        if path.startswith('/have/'):
+            return 'have'
+        return {'GET': 'get', 'HEAD': 'get', 'POST': 'upload', 'DELETE': 'delete'}.get(method, 'other')
+
+    def _body_sink(self, request):
+        # uploads stream to disk, anything else is small enough to keep in memory
+        path = urllib.parse.unquote(request.path)
+        if request.method == 'POST' and path == '/upload':
+            return self._upload_file()
+        if request.method == 'PUT' and path.startswith('/uploads/'):
+            # parts go straight into their upload's directory; an unknown
+            # upload falls through and is answered 404 by _multipart
+            try:
+                directory = self.uploads.path(path.split('/')[2])
+                if os.path.isdir(directory):
+                    return UploadFile(directory, hashed=True, fsync=self.fsync)
+            except KeyError:
+                pass
+        return bytearray()
+
+    def _upload_file(self):
+        return UploadFile(self.storage, hashed=self.store is not None, fsync=self.fsync)
+
+    def _mark_close(self, response):
+        if isinstance(response, FileResponse):
+            response.head = self._mark_close(response.head)
+            return response
+        return response.replace(b'\r\n', b'\r\nConnection: close\r\n', 1)
+
     def process(self, raw_data):
         cmd, path, meta, content = self._breakdown(raw_data)
         if not cmd:
             return self._fail(HTTPStatus.BAD_REQUEST, "Bad request")
-        
+        return self.handle(cmd, path, meta, content)
+
+    def handle(self, cmd, path, meta, content):
+        path, _, query = path.partition('?')
         path = urllib.parse.unquote(path)
-        print(f":: {cmd} {path}")
 
         try:
+            if path == '/uploads' or path.startswith('/uploads/'):
+                return self._multipart(cmd, path, meta, content)
             if cmd == 'GET':
-                return self._get(path)
+                return self._get(path, meta, query)
+            elif cmd == 'POST' and path.startswith('/have/'):
+                return self._have(path, meta)
             elif cmd == 'POST':
                 return self._store(path, meta, content)
             elif cmd == 'DELETE':
                 return self._erase(path)
             return self._fail(HTTPStatus.METHOD_NOT_ALLOWED, "Not allowed")
         except Exception as e:
-            print(f"!! Server error: {e}")
+            log.exception("Server error: %s", e)
             return self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, "Server broke")
 
     def _breakdown(self, raw):
@@ -47,42 +380,159 @@ class FileHandler:
         try:
             method, path, _ = head[0].split()
             headers = dict(
-                line.split(':', 1) 
-                for line in head[1:] 
-                if ':' in line
+                (name.strip().lower(), value.strip())
+                for name, value in (line.split(':', 1) for line in head[1:] if ':' in line)
             )
             return method.upper(), path, headers, body
         except:
             return None, None, None, None
 
-    def _get(self, path):
+    def _get(self, path, meta, query=''):
         if path == '/':
             return self._ok("Ready")
         elif path == '/list':
-            return self._show_files()
-        return self._send_file(path)
+            return self._show_files(meta, query)
+        elif path == '/metrics':
+            return self._show_metrics(query)
+        return self._send_file(path, meta)
+
+    def _show_metrics(self, query=''):
+        if urllib.parse.parse_qs(query).get('format') == ['json']:
+            return self._json(self.metrics.snapshot())
+        return self._ok(self.metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
 
     def _store(self, path, meta, content):
         if path != '/upload':
             return self._fail(HTTPStatus.BAD_REQUEST, "Wrong path")
         
-        fname = meta.get('X-File-Name', '').strip()
+        fname = meta.get('x-file-name', '').strip()
         if not fname:
             return self._fail(HTTPStatus.BAD_REQUEST, "No filename")
 
         if not self._valid_name(fname):
             return self._fail(HTTPStatus.BAD_REQUEST, "Bad filename")
 
+        if not isinstance(content, UploadFile):
+            upload = self._upload_file()
+            upload.write(content)
+            content = upload
+
         try:
             full_path = os.path.join(self.storage, fname)
-            with open(full_path, 'wb') as f:
-                f.write(content)
-            print(f"++ Stored {fname}")
+            content.commit(full_path, self.store)
+            self._stored(fname)
+            log.debug("Stored %s", fname)
             return self._ok(f"Saved {fname}", HTTPStatus.CREATED)
         except Exception as e:
-            print(f"!! Store failed: {e}")
+            content.discard()
+            log.error("Store failed: %s", e)
             return self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, f"Failed: {e}")
 
+    def _have(self, path, meta):
+        """POST /have/<sha256>: 200 if the content is already stored, 404 if
+        not. With X-File-Name the name is linked to it right away (201), so
+        the client can skip sending the bytes."""
+        digest = path[len('/have/'):].lower()
+        if not valid_digest(digest):
+            return self._fail(HTTPStatus.BAD_REQUEST, "Bad digest")
+        if self.store is None or not self.store.has(digest):
+            return self._fail(HTTPStatus.NOT_FOUND, "Not stored")
+
+        fname = meta.get('x-file-name', '').strip()
+        if not fname:
+            return self._ok("Stored")
+        if not self._valid_name(fname):
+            return self._fail(HTTPStatus.BAD_REQUEST, "Bad filename")
+        self.store.link(fname, digest)
+        self._stored(fname)
+        log.debug("Linked %s to %s", fname, digest[:12])
+        return self._ok(f"Saved {fname}", HTTPStatus.CREATED)
+
+    def _multipart(self, cmd, path, meta, content):
+        """Multipart upload API:
+
+        POST /uploads                 start; X-File-Name, X-File-Size and
+                                      optional X-Part-Size headers
+        PUT /uploads/<id>/<n>         part n (0-based), optional
+                                      X-Checksum-Sha256 of the part
+        GET /uploads/<id>             status with the missing part numbers
+        POST /uploads/<id>/complete   assemble the parts into the file
+        DELETE /uploads/<id>          abort"""
+        parts = path.strip('/').split('/')
+        try:
+            if cmd == 'POST' and len(parts) == 1:
+                return self._start_upload(meta)
+            if len(parts) == 1:
+                return self._fail(HTTPStatus.METHOD_NOT_ALLOWED, "Not allowed")
+            upload_id = parts[1]
+            if cmd == 'PUT' and len(parts) == 3:
+                return self._put_part(upload_id, int(parts[2]), meta, content)
+            if cmd == 'GET' and len(parts) == 2:
+                return self._json(self.uploads.status(upload_id))
+            if cmd == 'POST' and parts[2:] == ['complete']:
+                return self._complete_upload(upload_id)
+            if cmd == 'DELETE' and len(parts) == 2:
+                self.uploads.meta(upload_id)
+                self.uploads.remove(upload_id)
+                log.info("Aborted upload %s", upload_id)
+                return self._ok(f"Aborted {upload_id}")
+            return self._fail(HTTPStatus.NOT_FOUND, "Not found")
+        except KeyError:
+            return self._fail(HTTPStatus.NOT_FOUND, "No such upload")
+        except ValueError as e:
+            return self._fail(HTTPStatus.BAD_REQUEST, e)
+
+    def _start_upload(self, meta):
+        fname = meta.get('x-file-name', '').strip()
+        if not self._valid_name(fname):
+            return self._fail(HTTPStatus.BAD_REQUEST, "Bad filename")
+        size = int(meta.get('x-file-size', ''))
+        part_size = int(meta.get('x-part-size', DEFAULT_PART_SIZE))
+        upload = self.uploads.create(fname, size, part_size)
+        log.info("Started upload %s for %s (%d parts)", upload['id'], fname, upload['parts'])
+        return self._json(upload, HTTPStatus.CREATED)
+
+    def _put_part(self, upload_id, number, meta, content):
+        info = self.uploads.meta(upload_id)
+        expected = self.uploads.part_size(info, number)
+        if not isinstance(content, UploadFile):
+            raise KeyError(upload_id)
+        if content.size != expected:
+            return self._fail(HTTPStatus.BAD_REQUEST, f"Part {number} must be {expected} bytes")
+        digest = content.digest.hexdigest()
+        checksum = meta.get('x-checksum-sha256', '').strip().lower()
+        if checksum and checksum != digest:
+            return self._fail(HTTPStatus.BAD_REQUEST, f"Checksum mismatch for part {number}")
+        content.commit(self.uploads.part_path(upload_id, number))
+        return self._json(dict(part=number, sha256=digest), HTTPStatus.CREATED)
+
+    def _complete_upload(self, upload_id):
+        info = self.uploads.status(upload_id)
+        if info['missing']:
+            return self._fail(HTTPStatus.BAD_REQUEST, f"Missing parts: {info['missing'][:20]}")
+
+        upload = self._upload_file()
+        try:
+            for chunk in self.uploads.read_parts(upload_id, info['parts']):
+                upload.write(chunk)
+            upload.commit(os.path.join(self.storage, info['name']), self.store)
+        except Exception:
+            upload.discard()
+            raise
+        self.uploads.remove(upload_id)
+        self._stored(info['name'])
+        log.info("Stored %s from %d parts", info['name'], info['parts'])
+        return self._ok(f"Saved {info['name']}", HTTPStatus.CREATED)
+
+    def _json(self, data, status=HTTPStatus.OK):
+        return self._ok(json.dumps(data), status, {'Content-Type': 'application/json'})
+
+    def _stored(self, fname):
+        full_path = os.path.abspath(os.path.join(self.storage, fname))
+        self.metadata.invalidate(full_path)
+        self.cache.invalidate(full_path)
+        self.index.put(fname)
+
     def _erase(self, path):
         fname = path.lstrip('/')
         if not fname or not self._valid_name(fname):
@@ -93,44 +543,235 @@ class FileHandler:
             return self._fail(HTTPStatus.NOT_FOUND, "Not found")
 
         try:
-            os.remove(full_path)
-            print(f"++ Erased {fname}")
+            if self.store is not None:
+                self.store.remove(fname)
+            else:
+                os.remove(full_path)
+            self.metadata.invalidate(os.path.abspath(full_path))
+            self.cache.invalidate(os.path.abspath(full_path))
+            self.index.remove(fname)
+            log.debug("Erased %s", fname)
             return self._ok(f"Gone {fname}")
         except Exception as e:
-            print(f"!! Erase failed: {e}")
+            log.error("Erase failed: %s", e)
             return self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, f"Failed: {e}")
 
-    def _show_files(self):
+    def _show_files(self, meta, query=''):
+        """List stored files from the directory index.
+
+        Query parameters: offset, limit, prefix, glob (e.g. *.txt), since
+        (a cursor from X-Cursor, returns only changes) and format=json for
+        names with size and mtime instead of the HTML page."""
+        params = dict(urllib.parse.parse_qsl(query))
+        try:
+            offset = int(params.get('offset', 0))
+            limit = int(params['limit']) if 'limit' in params else None
+        except ValueError:
+            return self._fail(HTTPStatus.BAD_REQUEST, "Bad offset or limit")
+        if offset < 0 or (limit is not None and limit < 0):
+            return self._fail(HTTPStatus.BAD_REQUEST, "Bad offset or limit")
+
         try:
-            files = os.listdir(self.storage)
-            page = "<html><body><h1>Files:</h1><ul>"
-            page += "".join(f"<li>{f}</li>" for f in files)
-            page += "</ul></body></html>"
-            print(f":: Listed {len(files)} files")
-            return self._ok(page, headers={'Content-Type': 'text/html'})
+            result = self.index.query(offset, limit, params.get('prefix', ''), params.get('glob'), params.get('since'))
+            headers = {'X-Cursor': result['cursor']}
+            if 'since' in params:
+                changes = [dict(name=n, change=c, size=s, mtime=m) for n, c, s, m in result['changes']]
+                log.debug("Listed %d changes", len(changes))
+                body = json.dumps(dict(changes=changes, cursor=result['cursor'], reset=result['reset']))
+                headers['Content-Type'] = 'application/json'
+            else:
+                files = result['files']
+                headers['X-Total-Count'] = str(result['total'])
+                log.debug("Listed %d of %d files", len(files), result['total'])
+                if params.get('format') == 'json':
+                    body = json.dumps(dict(files=[dict(name=n, size=s, mtime=m) for n, s, m in files],
+                                           total=result['total'], cursor=result['cursor']))
+                    headers['Content-Type'] = 'application/json'
+                else:
+                    body = "<html><body><h1>Files:</h1><ul>"
+                    body += "".join(f"<li>{name}</li>" for name, _, _ in files)
+                    body += "</ul></body></html>"
+                    headers['Content-Type'] = 'text/html'
+            return self._ok(self._compress_body(body.encode('utf-8'), meta, headers), headers=headers)
         except Exception as e:
-            print(f"!! List failed: {e}")
+            log.error("List failed: %s", e)
             return self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, f"Failed: {e}")
 
-    def _send_file(self, path):
+    def _send_file(self, path, meta):
         safe_path = self._clean_path(path)
-        if not safe_path or not os.path.isfile(safe_path):
+        info = self.metadata.get(safe_path) if safe_path else None
+        if info is None:
             return self._fail(HTTPStatus.NOT_FOUND, "Not found")
 
+        ext = os.path.splitext(safe_path)[1].lower()
+        content_type = self.file_types.get(ext, 'application/octet-stream')
+        encoding = self._choose_encoding(meta, content_type, info)
+        if self._not_modified(meta, info):
+            log.debug("Not modified %s", safe_path)
+            return self._build_head(HTTPStatus.NOT_MODIFIED, None, self._validators(info, content_type, encoding))
+
         try:
-            with open(safe_path, 'rb') as f:
-                data = f.read()
-            ext = os.path.splitext(safe_path)[1].lower()
-            content_type = self.file_types.get(ext, 'application/octet-stream')
-            print(f":: Sent {safe_path}")
-            return self._ok(data, headers={'Content-Type': content_type})
+            f = self.cache.get((safe_path, info.mtime_ns, info.size))
+            if f is None:
+                f = open(safe_path, 'rb')
+                st = os.fstat(f.fileno())
+                if (st.st_size, st.st_mtime_ns) != (info.size, info.mtime_ns):
+                    info = self.metadata.refresh(safe_path, st)
+                if info.size <= self.cache.max_entry_bytes:
+                    with f:
+                        f = f.read()
+                    self.cache.put((safe_path, info.mtime_ns, info.size), f)
+            size = info.size
+            if not isinstance(f, bytes):
+                encoding = None
+            headers = self._validators(info, content_type, encoding)
+            headers['Accept-Ranges'] = 'bytes'
+
+            if encoding is not None:
+                body = self._compressed(safe_path, info, f, encoding)
+                headers['Content-Encoding'] = encoding
+                log.debug("Sent %s (%s)", safe_path, encoding)
+                return FileResponse(self._build_head(HTTPStatus.OK, len(body), headers), body, [(0, len(body))])
+
+            ranges = None
+            if 'range' in meta and self._if_range_matches(meta.get('if-range'), info):
+                ranges = self._parse_ranges(meta['range'], size)
+
+            if ranges == []:
+                if not isinstance(f, bytes):
+                    f.close()
+                return self._build(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, b"Range not satisfiable",
+                                   {'Content-Range': f"bytes */{size}"})
+            if ranges is None:
+                log.debug("Sent %s", safe_path)
+                return FileResponse(self._build_head(HTTPStatus.OK, size, headers), f, [(0, size)])
+
+            log.debug("Sent %s %s", safe_path, meta['range'])
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+                head = self._build_head(HTTPStatus.PARTIAL_CONTENT, end - start + 1, headers)
+                return FileResponse(head, f, [(start, end - start + 1)])
+            return self._multipart_ranges(f, ranges, size, headers)
         except Exception as e:
-            print(f"!! Send failed: {e}")
+            log.error("Send failed: %s", e)
             return self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, f"Failed: {e}")
 
+    def _validators(self, info, content_type, encoding=None):
+        headers = {
+            'Content-Type': content_type,
+            'ETag': info.etag if encoding is None else self._variant_etag(info.etag, encoding),
+            'Last-Modified': info.last_modified,
+        }
+        if httpcompress.compressible(content_type, info.size):
+            headers['Vary'] = 'Accept-Encoding'
+        return headers
+
+    def _choose_encoding(self, meta, content_type, info):
+        # ranges always refer to the identity body, and only files small
+        # enough for the content cache are compressed (in memory)
+        if 'range' in meta or info.size > self.cache.max_entry_bytes:
+            return None
+        if not httpcompress.compressible(content_type, info.size):
+            return None
+        return httpcompress.negotiate(meta.get('accept-encoding'))
+
+    def _compressed(self, path, info, content, encoding):
+        key = (path, info.mtime_ns, info.size, encoding)
+        body = self.cache.get(key)
+        if body is None:
+            body = httpcompress.compress(content, encoding)
+            self.cache.put(key, body)
+        return body
+
+    def _compress_body(self, data, meta, headers):
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = httpcompress.negotiate(meta.get('accept-encoding'))
+        if encoding is None or not httpcompress.compressible(headers['Content-Type'], len(data)):
+            return data
+        headers['Content-Encoding'] = encoding
+        return httpcompress.compress(data, encoding)
+
+    def _variant_etag(self, etag, encoding):
+        # each content coding is a different representation, so it gets its own tag
+        return f'{etag[:-1]}-{encoding}"'
+
+    def _strip_coding(self, tag):
+        for encoding in httpcompress.ENCODINGS:
+            suffix = f'-{encoding}"'
+            if tag.endswith(suffix):
+                return tag[:-len(suffix)] + '"'
+        return tag
+
+    def _not_modified(self, meta, info):
+        # If-None-Match wins over If-Modified-Since (RFC 7232 section 6)
+        if 'if-none-match' in meta:
+            tags = [t.strip() for t in meta['if-none-match'].split(',')]
+            return '*' in tags or any(self._strip_coding(t.removeprefix('W/')) == info.etag for t in tags)
+        if 'if-modified-since' in meta:
+            try:
+                since = parsedate_to_datetime(meta['if-modified-since']).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(info.mtime) <= since
+        return False
+
+    def _if_range_matches(self, value, info):
+        if value is None:
+            return True
+        if value.startswith('W/'):
+            return False
+        return value in (info.etag, info.last_modified)
+
+    def _parse_ranges(self, value, size):
+        """Turn a Range header into inclusive (start, end) pairs.
+
+        Returns None when the header should be ignored and the whole file
+        sent, and [] when none of the ranges fall inside the file."""
+        unit, _, specs = value.partition('=')
+        if unit.strip().lower() != 'bytes':
+            return None
+        specs = specs.split(',')
+        if len(specs) > MAX_RANGES:
+            return None
+
+        ranges = []
+        for spec in specs:
+            first, dash, last = spec.strip().partition('-')
+            if not dash or not (first.isdigit() or last.isdigit()):
+                return None
+            if not first:
+                start, end = max(size - int(last), 0), size - 1
+            elif not last:
+                start, end = int(first), size - 1
+            elif last.isdigit() and first.isdigit() and int(first) <= int(last):
+                start, end = int(first), min(int(last), size - 1)
+            else:
+                return None
+            if start <= end and start < size:
+                ranges.append((start, end))
+        return ranges
+
+    def _multipart_ranges(self, f, ranges, size, headers):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for start, end in ranges:
+            parts.append((
+                f"--{boundary}\r\n"
+                f"Content-Type: {headers['Content-Type']}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode('utf-8'))
+            parts.append((start, end - start + 1))
+            parts.append(b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode('utf-8'))
+
+        length = sum(len(p) if isinstance(p, bytes) else p[1] for p in parts)
+        headers['Content-Type'] = f"multipart/byteranges; boundary={boundary}"
+        return FileResponse(self._build_head(HTTPStatus.PARTIAL_CONTENT, length, headers), f, parts)
+
     def _clean_path(self, path):
         rel_path = path.lstrip('/')
-        if not rel_path or '..' in rel_path:
+        if not rel_path or '..' in rel_path or rel_path.split('/')[0] in (BLOB_DIR, UPLOAD_DIR):
             return None
         abs_path = os.path.abspath(os.path.join(self.storage, rel_path))
         return abs_path if abs_path.startswith(os.path.abspath(self.storage)) else None
@@ -147,6 +788,9 @@ class FileHandler:
         return self._build(status, str(msg).encode('utf-8'))
 
     def _build(self, status, data, headers=None):
+        return self._build_head(status, len(data), headers) + data
+
+    def _build_head(self, status, length, headers=None):
         if headers is None:
             headers = {}
         headers.setdefault('Content-Type', 'text/plain')
@@ -155,8 +799,51 @@ class FileHandler:
             f"HTTP/1.1 {status.value} {status.phrase}\r\n",
             f"Date: {datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')}\r\n",
             "Server: PyServ/1.0\r\n",
-            f"Content-Length: {len(data)}\r\n"
         ]
+        if length is not None:
+            response.append(f"Content-Length: {length}\r\n")
         response.extend(f"{k}: {v}\r\n" for k, v in headers.items())
         response.append("\r\n")
-        return b"".join(line.encode('utf-8') for line in response) + data
+        return b"".join(line.encode('utf-8') for line in response)
+
+    def send(self, conn, response):
+        """Send a response, returning the number of bytes sent."""
+        if not isinstance(response, FileResponse):
+            conn.sendall(response)
+            return len(response)
+
+        sent = len(response.head) + sum(len(part) if isinstance(part, bytes) else part[1] for part in response.parts)
+        if isinstance(response.file, bytes):
+            body = memoryview(response.file)
+            conn.sendall(response.head)
+            for part in response.parts:
+                if isinstance(part, bytes):
+                    conn.sendall(part)
+                else:
+                    offset, count = part
+                    conn.sendall(body[offset:offset + count])
+            return sent
+
+        with response.file as f:
+            conn.sendall(response.head)
+            for part in response.parts:
+                if isinstance(part, bytes):
+                    conn.sendall(part)
+                else:
+                    self._send_body(conn, f, *part)
+        return sent
+
+    def _send_body(self, conn, f, offset, count):
+        # socket.sendfile uses os.sendfile where the platform has it,
+        # so the payload goes from the page cache to the socket directly
+        if hasattr(conn, 'sendfile'):
+            conn.sendfile(f, offset, count)
+            return
+
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(SEND_CHUNK_SIZE, count))
+            if not chunk:
+                break
+            conn.sendall(chunk)
+            count -= len(chunk)
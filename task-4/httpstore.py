@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+
+BLOB_DIR = '.blobs'
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+def fsync_dir(directory):
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def valid_digest(digest):
+    return DIGEST_RE.fullmatch(digest) is not None
+
+class BlobStore:
+    """Optional content-addressed storage: file content is kept once per
+    SHA-256 hash, so identical uploads share one copy on disk.
+
+    Blobs live in BLOB_DIR/<first 2 hex chars>/<hash>; each stored name is a
+    hard link to its blob, so GET, the caches and the directory index keep
+    reading plain files. The name -> hash manifest is BLOB_DIR/manifest.json
+    and a blob's reference count is its link count, so it is removed with
+    the last name using it. Manifest updates hold an flock, which makes the
+    store safe to share between worker processes. With fsync='dir' the
+    directories are synced after every rename."""
+
+    def __init__(self, directory='.', fsync='none'):
+        self.directory = directory
+        self.fsync = fsync
+        self.root = os.path.join(directory, BLOB_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.lock_path = os.path.join(self.root, 'manifest.lock')
+        self.manifest = {}
+        self.manifest_mtime = None
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        # the digest becomes a path, so anything but hex would escape root
+        if not valid_digest(digest):
+            raise ValueError(f"Bad digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return valid_digest(digest) and os.path.exists(self.blob_path(digest))
+
+    def digest_of(self, name):
+        with self._locked():
+            return self.manifest.get(name)
+
+    def adopt(self, temp_path, digest, name):
+        """Turn temp_path, whose content hashes to digest, into the blob (or
+        drop it if the blob exists) and link name to it."""
+        with self._locked():
+            path = self.blob_path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                if self.fsync == 'dir':
+                    fsync_dir(os.path.dirname(path))
+            self._link(name, digest)
+
+    def link(self, name, digest):
+        """Link name to an existing blob; False if there is no such blob."""
+        with self._locked():
+            if not self.has(digest):
+                return False
+            self._link(name, digest)
+            return True
+
+    def remove(self, name):
+        with self._locked():
+            os.remove(os.path.join(self.directory, name))
+            digest = self.manifest.pop(name, None)
+            if digest is not None:
+                self._save()
+                self._release(digest)
+
+    def _link(self, name, digest):
+        # link under a temp name and rename over the old one, so readers never
+        # see a missing or half-written file (rename between two links to the
+        # same inode is a no-op, hence the samefile check)
+        target = os.path.join(self.directory, name)
+        blob = self.blob_path(digest)
+        if not (os.path.exists(target) and os.path.samefile(target, blob)):
+            temp_link = os.path.join(self.root, f".link-{os.getpid()}-{threading.get_ident()}")
+            os.link(blob, temp_link)
+            os.replace(temp_link, target)
+        if self.fsync == 'dir':
+            fsync_dir(self.directory)
+        old = self.manifest.get(name)
+        self.manifest[name] = digest
+        self._save()
+        if old is not None and old != digest:
+            self._release(old)
+
+    def _release(self, digest):
+        # a manifest written before digests were checked may hold a path
+        if not valid_digest(digest):
+            return
+        path = self.blob_path(digest)
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                # drop the prefix directory too; failing means other blobs
+                # still live in it
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _locked(self):
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        # only re-read the manifest when another process changed it
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.manifest_mtime:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self.manifest_mtime = mtime
+
+    def _save(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+        self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
@@ -0,0 +1,235 @@
+import os
+import time
+import socket
+import threading
+
+TICK = 0.25
+SLOTS = 512
+PHASES = ['idle', 'header', 'body', 'response']
+SENDALL_CHUNK = 1024 * 1024
+SENDFILE_CHUNK = 1024 * 1024
+
+
+class TimerWheel:
+    """Hashed timer wheel run by one thread per process: deadlines are
+    appended to the slot of their tick, and every tick the thread checks
+    the slots that came due. Stale entries (rescheduled since) are skipped,
+    ones whose connection made progress are moved to their new slot."""
+
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(time.monotonic() / tick)
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def schedule(self, deadline, at):
+        """Schedule `deadline` at monotonic time `at`; self.lock must be held."""
+        if self.pid != os.getpid():
+            # the wheel thread does not survive fork, a worker starts its own
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, daemon=True).start()
+        deadline.scheduled = at
+        tick = max(int(at / self.tick), self.current)
+        self.slots[tick % len(self.slots)].append((deadline, at))
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                last = int(now / self.tick)
+                for tick in range(max(self.current, last - len(self.slots) + 1), last + 1):
+                    index = tick % len(self.slots)
+                    keep = []
+                    for deadline, at in self.slots[index]:
+                        if at != deadline.scheduled:
+                            continue
+                        if at > now:
+                            keep.append((deadline, at))
+                        else:
+                            deadline.scheduled = None
+                            due.append(deadline)
+                    self.slots[index] = keep
+                self.current = last
+                expired = [deadline for deadline in due if deadline.check(now)]
+            for deadline in expired:
+                deadline.expire()
+
+
+class Deadline:
+    """The current deadline of one connection.
+
+    A phase allows `limit` seconds plus 1/min_rate seconds for every byte
+    moved in it, capped by the deadline of the whole request."""
+
+    def __init__(self, timeouts, on_expire):
+        self.timeouts = timeouts
+        self.on_expire = on_expire
+        self.phase = None
+        self.limit = 0
+        self.started = 0
+        self.transferred = 0
+        self.request_deadline = None
+        self.scheduled = None
+        self.expired = None
+        self.closed = False
+
+    def start(self, phase, new_request=False, limit=None):
+        """Enter `phase`; new_request starts the whole-request deadline and
+        idle ends it. `limit` overrides the configured phase limit."""
+        now = time.monotonic()
+        self.phase = phase
+        self.limit = self.timeouts.limits[phase] if limit is None else limit
+        self.started = now
+        self.transferred = 0
+        if new_request:
+            self.request_deadline = now + self.timeouts.request if self.timeouts.request else None
+        elif phase == 'idle':
+            self.request_deadline = None
+        self.timeouts.schedule(self)
+
+    def progress(self, size):
+        self.transferred += size
+
+    def expires(self):
+        expires = None
+        if self.limit:
+            expires = self.started + self.limit
+            if self.timeouts.min_rate:
+                expires += self.transferred / self.timeouts.min_rate
+        if self.request_deadline is not None and (expires is None or self.request_deadline < expires):
+            expires = self.request_deadline
+        return expires
+
+    def check(self, now):
+        """Called by the wheel when the entry comes due: True if the deadline
+        really passed, otherwise it is rescheduled at its current value."""
+        if self.closed or self.expired is not None:
+            return False
+        expires = self.expires()
+        if expires is None:
+            return False
+        if expires > now:
+            self.timeouts.wheel.schedule(self, expires)
+            return False
+        self.expired = self.phase
+        return True
+
+    def expire(self):
+        self.timeouts.timed_out[self.expired] += 1
+        self.on_expire()
+
+    def close(self):
+        self.timeouts.forget(self)
+
+
+class TimedSocket:
+    """Socket wrapper that counts every byte received or sent as progress
+    of its deadline; everything else goes to the real socket."""
+
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def recv(self, size, *flags):
+        data = self.sock.recv(size, *flags)
+        self.deadline.progress(len(data))
+        return data
+
+    def recv_into(self, buffer, *args):
+        received = self.sock.recv_into(buffer, *args)
+        self.deadline.progress(received)
+        return received
+
+    def send(self, data, *flags):
+        sent = self.sock.send(data, *flags)
+        self.deadline.progress(sent)
+        return sent
+
+    def sendall(self, data, *flags):
+        # in slices, so a large cached body counts as progress while it drains
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), SENDALL_CHUNK):
+            piece = view[start:start + SENDALL_CHUNK]
+            self.sock.sendall(piece, *flags)
+            self.deadline.progress(len(piece))
+
+    def sendmsg(self, buffers, *args):
+        sent = self.sock.sendmsg(buffers, *args)
+        self.deadline.progress(sent)
+        return sent
+
+    def sendfile(self, file, offset=0, count=None):
+        # in pieces, so a slow reader's progress is counted as it goes
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+        total = 0
+        while total < count:
+            sent = self.sock.sendfile(file, offset + total, min(SENDFILE_CHUNK, count - total))
+            if not sent:
+                break
+            total += sent
+            self.deadline.progress(sent)
+        return total
+
+
+def shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ConnectionTimeouts:
+    """Per-phase deadlines for connections (idle keep-alive, request head,
+    body, response) plus a whole-request deadline and a minimum transfer
+    rate, enforced by one TimerWheel thread instead of a timer or socket
+    timeout per connection. 0 disables a limit. When a deadline passes the
+    socket is shut down, so a thread blocked in recv/send returns."""
+
+    def __init__(self, idle=15, header=10, body=30, response=30, request=3600, min_rate=16384, tick=TICK):
+        self.limits = dict(idle=idle, header=header, body=body, response=response)
+        self.request = request
+        self.min_rate = min_rate
+        self.wheel = TimerWheel(tick)
+        self.deadlines = set()
+        self.timed_out = dict.fromkeys(PHASES, 0)
+
+    def watch(self, on_expire):
+        """A new Deadline in the idle phase; it must end in close()."""
+        deadline = Deadline(self, on_expire)
+        with self.wheel.lock:
+            self.deadlines.add(deadline)
+        deadline.start('idle')
+        return deadline
+
+    def wrap(self, sock):
+        """TimedSocket for `sock`, shut down when its deadline passes."""
+        return TimedSocket(sock, self.watch(lambda: shutdown(sock)))
+
+    def schedule(self, deadline):
+        expires = deadline.expires()
+        if expires is None or (deadline.scheduled is not None and deadline.scheduled <= expires):
+            return
+        with self.wheel.lock:
+            if not deadline.closed and (deadline.scheduled is None or expires < deadline.scheduled):
+                self.wheel.schedule(deadline, expires)
+
+    def forget(self, deadline):
+        with self.wheel.lock:
+            deadline.closed = True
+            self.deadlines.discard(deadline)
+
+    def expired_counts(self):
+        return dict(self.timed_out)
+
+    def blocked(self):
+        """Connections waiting on their client, by phase; each holds a thread."""
+        with self.wheel.lock:
+            phases = [deadline.phase for deadline in self.deadlines]
+        return {phase: phases.count(phase) for phase in PHASES}
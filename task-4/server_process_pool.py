@@ -1,46 +1,151 @@
 import os
+import signal
+import argparse
+import logging
 import socket
-from multiprocessing import Pool
-from httpserver import FileHandler
+import multiprocessing
+import multiprocessing.connection
+from httpserver import (FileHandler, FSYNC_POLICIES, KEEPALIVE_TIMEOUT, HEADER_TIMEOUT, BODY_TIMEOUT,
+                        RESPONSE_TIMEOUT, REQUEST_TIMEOUT, MIN_RATE)
+from httpadmission import AdmissionControl
+from httptimeouts import ConnectionTimeouts
+import httplogging
 
 HOST = "127.0.0.1"
 PORT = 9977
 WORKERS = 4
-file_handler = FileHandler()
+POLL_INTERVAL = 1.0
+SHUTDOWN_TIMEOUT = 30
+DEDUP = False
+FSYNC = 'none'
+STORAGE_DIR = './storage'
+MEMORY_BUDGET = 1024
+RETRY_AFTER = 1
+# created in run_server, before the workers fork and inherit it
+file_handler = None
+stopping = False
+log = logging.getLogger('httpserver')
 
 def process_request(connection):
+    pid = os.getpid()
     try:
-        raw = connection.recv(65535).strip()
-        if not raw:
-            return
-            
-        pid = os.getpid()
-        print(f":: Process-{pid}: Handling request")
-        response = file_handler.process(raw)
-        connection.sendall(response)
+        log.debug("Process-%d: Handling connection", pid)
+        file_handler.serve(connection)
     except Exception as e:
-        print(f"!! Process-{pid} error: {e}")
+        log.error("Process-%d error: %s", pid, e)
     finally:
         connection.close()
 
-def run_server():
-    print(f":: Starting on {HOST}:{PORT} with {WORKERS} workers")
-    
+def stop(signum=None, frame=None):
+    global stopping
+    stopping = True
+
+def worker_loop(sock):
+    # workers leave Ctrl+C to the parent and finish the request in hand on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop)
+    sock.settimeout(POLL_INTERVAL)
+
+    while not stopping:
+        try:
+            conn, _ = sock.accept()
+        except socket.timeout:
+            continue
+        process_request(conn)
+    # workers exit without running atexit, flush queued log records now
+    httplogging.stop_logging()
+
+def spawn_worker(context, sock):
+    worker = context.Process(target=worker_loop, args=(sock,), daemon=True)
+    worker.start()
+    log.info("Worker %d started", worker.pid)
+    return worker
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pre-forked HTTP file server')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT, help='0 picks a free port')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Worker processes (default: %(default)s)')
+    parser.add_argument('--storage', default=STORAGE_DIR, help='Directory the files are kept in')
+    parser.add_argument('--dedup', action='store_true', default=DEDUP,
+                        help='Store uploads as content-addressed SHA-256 blobs')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC,
+                        help='Durability of uploads (default: %(default)s)')
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET,
+                        help='MB of request bodies held in memory per worker; a body that would exceed it '
+                             'is answered 503, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--retry-after', type=int, default=RETRY_AFTER,
+                        help='Retry-After seconds sent with 503 (default: %(default)s)')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='Seconds a connection may wait between requests (default: %(default)s)')
+    parser.add_argument('--header-timeout', type=float, default=HEADER_TIMEOUT,
+                        help='Seconds to receive a request head (default: %(default)s)')
+    parser.add_argument('--body-timeout', type=float, default=BODY_TIMEOUT,
+                        help='Seconds to receive a request body (default: %(default)s)')
+    parser.add_argument('--response-timeout', type=float, default=RESPONSE_TIMEOUT,
+                        help='Seconds to send a response (default: %(default)s)')
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT,
+                        help='Seconds for a whole request, from its first byte to the end of the response '
+                             '(default: %(default)s)')
+    parser.add_argument('--min-rate', type=int, default=MIN_RATE,
+                        help='Bytes per second a transfer must keep up: every byte moved extends the phase '
+                             'deadline by 1/min-rate seconds (default: %(default)s). 0 in any timeout or '
+                             'here disables it')
+    parser.add_argument('--log-level', choices=httplogging.LOG_LEVELS, default='info',
+                        help='Minimum log level; per-connection and per-request detail is debug (default: %(default)s)')
+    parser.add_argument('--log-file', default=None, help='Also write the log to this file')
+    parser.add_argument('--log-format', choices=httplogging.LOG_FORMATS, default='text',
+                        help='text lines or one JSON object per line (default: %(default)s)')
+    parser.add_argument('--access-log-sample', type=float, default=0.01,
+                        help='Fraction of requests written to the access log, 0 disables it (default: %(default)s)')
+    parser.add_argument('--log-max-field', type=int, default=httplogging.MAX_FIELD,
+                        help='Longer logged values are truncated to this many characters (default: %(default)s)')
+    return parser.parse_args()
+
+def make_timeouts(args):
+    return ConnectionTimeouts(args.keepalive_timeout, args.header_timeout, args.body_timeout, args.response_timeout,
+                              args.request_timeout, args.min_rate)
+
+def run_server(host=HOST, port=PORT, workers=WORKERS, storage=STORAGE_DIR, dedup=DEDUP, fsync=FSYNC,
+               memory_budget=MEMORY_BUDGET, retry_after=RETRY_AFTER, timeouts=None):
+    global file_handler
+    # a worker serves one connection at a time, so only the memory budget
+    # applies; the kernel accept backlog bounds the rest
+    admission = AdmissionControl(memory_budget=memory_budget * 1024 * 1024, retry_after=retry_after)
+    file_handler = FileHandler(storage, dedup=dedup, fsync=fsync, admission=admission, timeouts=timeouts)
+
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind((HOST, PORT))
-        sock.listen(5)
-        
-        with Pool(processes=WORKERS) as workers:
-            print(f"++ Server ready")
-            try:
-                while True:
-                    conn, _ = sock.accept()
-                    workers.apply_async(process_request, (conn,))
-            except KeyboardInterrupt:
-                print("\n!! Shutting down workers...")
-            finally:
-                sock.close()
+        sock.bind((host, port))
+        sock.listen(socket.SOMAXCONN)
+        log.info("Starting on %s:%d with %d workers", host, sock.getsockname()[1], workers)
+
+        # every worker accepts on the inherited listening socket itself,
+        # so nothing is pickled per connection
+        context = multiprocessing.get_context('fork')
+        signal.signal(signal.SIGTERM, stop)
+        workers = [spawn_worker(context, sock) for _ in range(workers)]
+        log.info("Server ready")
+        try:
+            while not stopping:
+                multiprocessing.connection.wait([w.sentinel for w in workers], timeout=POLL_INTERVAL)
+                for i, worker in enumerate(workers):
+                    if not worker.is_alive() and not stopping:
+                        log.warning("Worker %d exited with code %s, respawning", worker.pid, worker.exitcode)
+                        workers[i] = spawn_worker(context, sock)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            log.info("Shutting down workers...")
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join(SHUTDOWN_TIMEOUT)
+                if worker.is_alive():
+                    worker.kill()
 
 if __name__ == "__main__":
-    run_server()
+    args = parse_args()
+    httplogging.setup_logging(args.log_level, args.log_file, args.log_format, args.access_log_sample, args.log_max_field)
+    run_server(args.host, args.port, args.workers, args.storage, args.dedup, args.fsync, args.memory_budget,
+               args.retry_after, make_timeouts(args))
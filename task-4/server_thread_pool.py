@@ -1,34 +1,110 @@
+import argparse
+import logging
 import socketserver
-from httpserver import FileHandler
+import httplogging
+from httpserver import (FileHandler, FSYNC_POLICIES, KEEPALIVE_TIMEOUT, HEADER_TIMEOUT, BODY_TIMEOUT,
+                        RESPONSE_TIMEOUT, REQUEST_TIMEOUT, MIN_RATE)
+from httpadmission import AdmissionControl
+from httptimeouts import ConnectionTimeouts
 
 HOST = "127.0.0.1"
 PORT = 9977
-file_handler = FileHandler()
+DEDUP = False
+FSYNC = 'none'
+STORAGE_DIR = './storage'
+MAX_CONNECTIONS = 1024
+MAX_PER_CLIENT = 0
+MEMORY_BUDGET = 1024
+RETRY_AFTER = 1
+file_handler = None
+log = logging.getLogger('httpserver')
 
 class ConnectionHandler(socketserver.BaseRequestHandler):
     def handle(self):
         try:
-            raw = self.request.recv(65535).strip()
-            if not raw:
-                return
-            
-            print(f":: Thread-{self.request.fileno()}: New request")
-            response = file_handler.process(raw)
-            self.request.sendall(response)
+            log.debug("Thread-%d: New connection", self.request.fileno())
+            file_handler.serve(self.request)
         except Exception as e:
-            print(f"!! Thread error: {e}")
+            log.error("Thread error: %s", e)
+        finally:
+            file_handler.admission.release(self.client_address[0])
 
 class ThreadedServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     daemon_threads = True
     allow_reuse_address = True
 
-def run():
-    print(f":: Starting on {HOST}:{PORT}")
-    with ThreadedServer((HOST, PORT), ConnectionHandler) as s:
+    def process_request(self, request, client_address):
+        # refuse before a thread is started for the connection
+        reason = file_handler.admission.admit(client_address[0])
+        if reason is not None:
+            file_handler.reject(request, reason)
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Thread-per-connection HTTP file server')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT, help='0 picks a free port')
+    parser.add_argument('--storage', default=STORAGE_DIR, help='Directory the files are kept in')
+    parser.add_argument('--dedup', action='store_true', default=DEDUP,
+                        help='Store uploads as content-addressed SHA-256 blobs')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC,
+                        help='Durability of uploads (default: %(default)s)')
+    parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS,
+                        help='Connections served at once, each by its own thread; more are answered 503, '
+                             '0 means no limit (default: %(default)s)')
+    parser.add_argument('--max-per-client', type=int, default=MAX_PER_CLIENT,
+                        help='Connections from one client IP, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET,
+                        help='MB of request bodies held in memory; a body that would exceed it '
+                             'is answered 503, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--retry-after', type=int, default=RETRY_AFTER,
+                        help='Retry-After seconds sent with 503 (default: %(default)s)')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='Seconds a connection may wait between requests (default: %(default)s)')
+    parser.add_argument('--header-timeout', type=float, default=HEADER_TIMEOUT,
+                        help='Seconds to receive a request head (default: %(default)s)')
+    parser.add_argument('--body-timeout', type=float, default=BODY_TIMEOUT,
+                        help='Seconds to receive a request body (default: %(default)s)')
+    parser.add_argument('--response-timeout', type=float, default=RESPONSE_TIMEOUT,
+                        help='Seconds to send a response (default: %(default)s)')
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT,
+                        help='Seconds for a whole request, from its first byte to the end of the response '
+                             '(default: %(default)s)')
+    parser.add_argument('--min-rate', type=int, default=MIN_RATE,
+                        help='Bytes per second a transfer must keep up: every byte moved extends the phase '
+                             'deadline by 1/min-rate seconds (default: %(default)s). 0 in any timeout or '
+                             'here disables it')
+    parser.add_argument('--log-level', choices=httplogging.LOG_LEVELS, default='info',
+                        help='Minimum log level; per-connection and per-request detail is debug (default: %(default)s)')
+    parser.add_argument('--log-file', default=None, help='Also write the log to this file')
+    parser.add_argument('--log-format', choices=httplogging.LOG_FORMATS, default='text',
+                        help='text lines or one JSON object per line (default: %(default)s)')
+    parser.add_argument('--access-log-sample', type=float, default=0.01,
+                        help='Fraction of requests written to the access log, 0 disables it (default: %(default)s)')
+    parser.add_argument('--log-max-field', type=int, default=httplogging.MAX_FIELD,
+                        help='Longer logged values are truncated to this many characters (default: %(default)s)')
+    return parser.parse_args()
+
+def make_timeouts(args):
+    return ConnectionTimeouts(args.keepalive_timeout, args.header_timeout, args.body_timeout, args.response_timeout,
+                              args.request_timeout, args.min_rate)
+
+def run(host=HOST, port=PORT, storage=STORAGE_DIR, dedup=DEDUP, fsync=FSYNC, max_connections=MAX_CONNECTIONS,
+        max_per_client=MAX_PER_CLIENT, memory_budget=MEMORY_BUDGET, retry_after=RETRY_AFTER, timeouts=None):
+    global file_handler
+    admission = AdmissionControl(max_connections, max_per_client, memory_budget * 1024 * 1024, retry_after)
+    file_handler = FileHandler(storage, dedup=dedup, fsync=fsync, admission=admission, timeouts=timeouts)
+    with ThreadedServer((host, port), ConnectionHandler) as s:
+        log.info("Starting on %s:%d", host, s.server_address[1])
         try:
             s.serve_forever()
         except KeyboardInterrupt:
-            print("\n!! Shutting down")
+            log.info("Shutting down")
 
 if __name__ == "__main__":
-    run()
+    args = parse_args()
+    httplogging.setup_logging(args.log_level, args.log_file, args.log_format, args.access_log_sample, args.log_max_field)
+    run(args.host, args.port, args.storage, args.dedup, args.fsync, args.max_connections, args.max_per_client,
+        args.memory_budget, args.retry_after, make_timeouts(args))
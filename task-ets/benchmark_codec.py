@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import base64
+import socket
+import argparse
+import threading
+
+import file_codec
+
+"""
+* benchmark_codec membandingkan dua cara menyusun respon GET:
+- lama: json.dumps dict berisi string base64, lalu ditambah "\r\n\r\n"
+  dan di-encode (tiga kali menyalin isi file)
+- baru: header + bytes base64 + penutup dikirim sebagai daftar buffer
+  lewat sendmsg, tanpa menggabungkan ulang isinya
+
+* kedua cara dikirim lewat socketpair ke thread pembaca agar biaya
+  syscall ikut terukur
+"""
+
+DELIMITER = b"\r\n\r\n"
+
+
+def drain(sock):
+    # base64 dan JSON tidak pernah memuat \r\n, jadi delimiter hanya ada di akhir
+    tail = b""
+    buffer = bytearray(1024 * 1024)
+    while not tail.endswith(DELIMITER):
+        n = sock.recv_into(buffer)
+        if not n:
+            break
+        tail = (tail + bytes(buffer[max(0, n - len(DELIMITER)):n]))[-len(DELIMITER):]
+
+
+def send_old(sock, filename, data):
+    response = dict(status='OK', data_namafile=filename, data_file=base64.b64encode(data).decode())
+    payload = (json.dumps(response) + "\r\n\r\n").encode()
+    sock.sendall(payload)
+    return len(payload)
+
+
+def send_new(sock, filename, data):
+    header = file_codec.dumps(dict(status='OK', data_namafile=filename, data_file=''))[:-2]
+    buffers = [memoryview(header), memoryview(base64.b64encode(data)), memoryview(b'"}' + DELIMITER)]
+    total = sum(len(buffer) for buffer in buffers)
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while sent:
+            if sent < len(buffers[0]):
+                buffers[0] = buffers[0][sent:]
+                break
+            sent -= len(buffers.pop(0))
+    return total
+
+
+def measure(method, data, rounds):
+    writer, reader = socket.socketpair()
+    try:
+        elapsed = []
+        for _ in range(rounds):
+            thread = threading.Thread(target=drain, args=(reader,))
+            thread.start()
+            start = time.perf_counter()
+            method(writer, 'bench.bin', data)
+            thread.join()
+            elapsed.append(time.perf_counter() - start)
+        return min(elapsed), sum(elapsed) / len(elapsed)
+    finally:
+        writer.close()
+        reader.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark penyusunan respon JSON')
+    parser.add_argument('--sizes', default='1,10,50', help='Ukuran file dalam MB, dipisah koma')
+    parser.add_argument('--rounds', type=int, default=5, help='Jumlah pengulangan per ukuran')
+    args = parser.parse_args()
+
+    print(f"codec: {file_codec.NAME}")
+    print(f"{'size(MB)':>9} {'old best(s)':>12} {'new best(s)':>12} {'old avg(s)':>11} {'new avg(s)':>11} {'speedup':>8}")
+    for size_mb in [int(s) for s in args.sizes.split(',')]:
+        data = os.urandom(size_mb * 1024 * 1024)
+        old_best, old_avg = measure(send_old, data, args.rounds)
+        new_best, new_avg = measure(send_new, data, args.rounds)
+        print(f"{size_mb:>9} {old_best:>12.4f} {new_best:>12.4f} {old_avg:>11.4f} {new_avg:>11.4f} {old_avg / new_avg:>7.2f}x")
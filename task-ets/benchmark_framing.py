@@ -0,0 +1,73 @@
+import time
+import base64
+import socket
+import argparse
+import threading
+
+import framing
+
+"""
+* benchmark_framing mengukur waktu menerima satu pesan besar yang diakhiri
+"\r\n\r\n" lewat socketpair, dengan dua cara:
+- lama: data.decode() ditambahkan ke string lalu seluruh string dicari
+  ulang delimiter-nya setiap recv
+- baru: framing.RecvBuffer (recv_into + pencarian dari posisi terakhir)
+
+* isi pesan berupa base64, sama seperti perintah UPLOAD
+"""
+
+
+def send_message(sock, message):
+    sock.sendall(message)
+
+
+def receive_old(sock, recv_size):
+    data_received = ""
+    while True:
+        data = sock.recv(recv_size)
+        if not data:
+            break
+        data_received += data.decode()
+        if "\r\n\r\n" in data_received:
+            break
+    return len(data_received.split("\r\n\r\n")[0])
+
+
+def receive_new(sock, recv_size):
+    return len(framing.RecvBuffer().read_until(sock))
+
+
+def measure(receive, message, recv_size, rounds):
+    elapsed = []
+    for _ in range(rounds):
+        writer, reader = socket.socketpair()
+        try:
+            thread = threading.Thread(target=send_message, args=(writer, message))
+            thread.start()
+            start = time.perf_counter()
+            size = receive(reader, recv_size)
+            elapsed.append(time.perf_counter() - start)
+            thread.join()
+            assert size == len(message) - len(framing.DELIMITER)
+        finally:
+            writer.close()
+            reader.close()
+    return min(elapsed), sum(elapsed) / len(elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark framing penerimaan pesan')
+    parser.add_argument('--size', type=int, default=100, help='Ukuran pesan dalam MB')
+    parser.add_argument('--recv-size', type=int, default=64 * 1024, help='Ukuran recv cara lama (byte)')
+    parser.add_argument('--rounds', type=int, default=3, help='Jumlah pengulangan')
+    args = parser.parse_args()
+
+    raw = bytes(range(256)) * (args.size * 1024 * 1024 * 3 // 4 // 256)
+    message = base64.b64encode(raw) + framing.DELIMITER
+    print(f"pesan: {len(message) / 1024 / 1024:.1f} MB, recv lama: {args.recv_size} byte")
+
+    old_best, old_avg = measure(receive_old, message, args.recv_size, args.rounds)
+    new_best, new_avg = measure(receive_new, message, args.recv_size, args.rounds)
+    print(f"{'cara':>6} {'best(s)':>9} {'avg(s)':>9} {'MB/s':>9}")
+    print(f"{'lama':>6} {old_best:>9.3f} {old_avg:>9.3f} {len(message) / 1024 / 1024 / old_avg:>9.1f}")
+    print(f"{'baru':>6} {new_best:>9.3f} {new_avg:>9.3f} {len(message) / 1024 / 1024 / new_avg:>9.1f}")
@@ -0,0 +1,62 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from file_write import atomic_write, FSYNC_POLICIES
+
+"""
+* benchmark_fsync mengukur biaya penulisan file yang atomik dibandingkan
+cara lama (open(nama, 'wb') langsung ke file tujuan), untuk setiap
+kebijakan fsync (none/file/dir)
+
+* setiap putaran menulis N file berukuran sama ke direktori sementara,
+hasilnya dalam file/detik dan MB/detik
+"""
+
+CHUNK_SIZE = 64 * 1024
+
+
+def chunks_of(data):
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield view[start:start + CHUNK_SIZE]
+
+
+def write_direct(path, data, fsync):
+    with open(path, 'wb') as f:
+        for chunk in chunks_of(data):
+            f.write(chunk)
+
+
+def write_atomic(path, data, fsync):
+    atomic_write(path, chunks_of(data), fsync)
+
+
+def measure(write, directory, data, count, fsync):
+    start = time.perf_counter()
+    for i in range(count):
+        write(os.path.join(directory, f"file_{i % 16}.bin"), data, fsync)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark penulisan file atomik dan fsync')
+    parser.add_argument('--size', type=int, default=64, help='Ukuran setiap file dalam KB')
+    parser.add_argument('--count', type=int, default=500, help='Jumlah file per cara')
+    parser.add_argument('--dir', default=None, help='Direktori uji (default: direktori sementara)')
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * 1024)
+    directory = tempfile.mkdtemp(prefix='bench-fsync-', dir=args.dir)
+    print(f"{args.count} file x {args.size} KB di {directory}")
+    try:
+        cases = [('lama', write_direct, 'none')] + [(f"atomik/{policy}", write_atomic, policy) for policy in FSYNC_POLICIES]
+        print(f"{'cara':>12} {'waktu(s)':>9} {'file/s':>9} {'MB/s':>9}")
+        for label, write, policy in cases:
+            elapsed = measure(write, directory, data, args.count, policy)
+            mb = args.count * len(data) / 1024 / 1024
+            print(f"{label:>12} {elapsed:>9.3f} {args.count / elapsed:>9.0f} {mb / elapsed:>9.1f}")
+    finally:
+        shutil.rmtree(directory)
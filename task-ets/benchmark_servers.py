@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import math
+import time
+import signal
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.client
+
+from file_client import FileClient
+from histogram import LatencyHistogram
+
+"""
+* benchmark_servers menjalankan sendiri server yang dibandingkan sebagai
+subprocess di port bebas (ephemeral), sehingga seluruh matriks konfigurasi
+bisa diukur tanpa ada yang me-restart server dengan tangan:
+  - ets-thread/ets-process/ets-asyncio: task-ets/file_server.py dengan
+    --executor yang sesuai, protokol file (stream) lewat file_client
+  - http-thread: task-4/server_thread_pool.py (satu thread per koneksi,
+    tidak punya ukuran pool)
+  - http-process: task-4/server_process_pool.py dengan --workers
+
+* setiap server dijalankan di direktori sementara yang kosong dan
+dihentikan (SIGTERM ke seluruh process group, lalu SIGKILL) setelah semua
+sel matriksnya selesai
+
+* satu sel = server x ukuran pool x konkurensi client x ukuran file x
+operasi. Setiap sel dipanaskan dulu (--warmup detik, hasilnya dibuang),
+lalu diukur --repeats kali selama --duration detik dengan beban
+closed-loop: setiap thread client langsung mengirim request berikutnya
+setelah respons diterima
+
+* hasil ditulis ke satu file JSON: untuk setiap sel, angka tiap
+pengulangan serta rata-rata, simpangan baku dan selang kepercayaan 95%
+(distribusi t) dari throughput (request/detik, MB/detik) dan latensi
+p50/p99
+"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TASK4 = os.path.join(os.path.dirname(ROOT), 'task-4')
+SERVER_TYPES = ['ets-thread', 'ets-process', 'ets-asyncio', 'http-thread', 'http-process']
+OPERATION_TYPES = ['upload', 'download', 'list']
+STARTUP_TIMEOUT = 15
+SHUTDOWN_TIMEOUT = 10
+REQUEST_TIMEOUT = 60
+HTTP_CHUNK_SIZE = 64 * 1024
+# nilai kritis t dua sisi 95% untuk derajat bebas 1..30, di atasnya ~normal
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, pool_size, port, directory):
+    if server.startswith('ets-'):
+        executor = server[len('ets-'):]
+        return [sys.executable, os.path.join(ROOT, 'file_server.py'), '--port', str(port),
+                '--executor', executor, '--pool-size', str(pool_size)]
+    if server == 'http-thread':
+        return [sys.executable, os.path.join(TASK4, 'server_thread_pool.py'), '--port', str(port),
+                '--storage', os.path.join(directory, 'storage')]
+    return [sys.executable, os.path.join(TASK4, 'server_process_pool.py'), '--port', str(port),
+            '--workers', str(pool_size), '--storage', os.path.join(directory, 'storage')]
+
+
+def confidence_interval(values):
+    """
+    (rata-rata, simpangan baku, setengah lebar selang kepercayaan 95%);
+    selang tidak ada (None) untuk kurang dari dua pengulangan
+    """
+    mean = statistics.mean(values)
+    if len(values) < 2:
+        return mean, None, None
+    stdev = statistics.stdev(values)
+    degrees = len(values) - 1
+    t = T_95[degrees - 1] if degrees <= len(T_95) else statistics.NormalDist().inv_cdf(0.975)
+    return mean, stdev, t * stdev / math.sqrt(len(values))
+
+
+def summarize(values):
+    mean, stdev, half_width = confidence_interval(values)
+    return dict(mean=mean, stdev=stdev, ci95=half_width,
+                low=None if half_width is None else mean - half_width,
+                high=None if half_width is None else mean + half_width)
+
+
+class ServerProcess:
+    """
+    satu server sebagai subprocess di direktori sementara, dipakai dengan
+    with; port tersedia di .port setelah server menerima koneksi
+    """
+    def __init__(self, server, pool_size):
+        self.server = server
+        self.pool_size = pool_size
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix=f"bench-{self.server}-")
+        # file_server.py bekerja di dalam files/ dari direktori kerjanya
+        os.mkdir(os.path.join(self.directory, 'files'))
+        self.port = free_port()
+        self.log = open(os.path.join(self.directory, 'server.log'), 'wb')
+        self.process = subprocess.Popen(server_command(self.server, self.pool_size, self.port, self.directory),
+                                        cwd=self.directory, stdout=self.log, stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+        try:
+            self.wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def wait_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.server} exited with code {self.process.returncode}: {self.log_tail()}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"{self.server} did not start within {STARTUP_TIMEOUT}s: {self.log_tail()}")
+
+    def log_tail(self):
+        self.log.flush()
+        with open(self.log.name, 'rb') as f:
+            return f.read()[-1000:].decode(errors='replace')
+
+    def __exit__(self, *exc):
+        # worker proses ada di process group yang sama dengan servernya
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(self.process.pid, sig)
+                self.process.wait(SHUTDOWN_TIMEOUT)
+                break
+            except ProcessLookupError:
+                break
+            except subprocess.TimeoutExpired:
+                continue
+        self.log.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class FileWorkload:
+    """
+    request protokol file task-ets lewat file_client (UPLOAD_STREAM,
+    GET_STREAM, LIST); satu FileClient dipakai bersama semua thread
+    """
+    def __init__(self, port, concurrency, keep_alive):
+        self.client = FileClient(('127.0.0.1', port), concurrency, REQUEST_TIMEOUT, keep_alive)
+
+    def connection(self):
+        return None
+
+    def upload(self, conn, path, filename):
+        return self.client.upload_stream(path, filename)['status'] == 'OK'
+
+    def download(self, conn, filename):
+        return self.client.get_stream(filename, os.devnull)['status'] == 'OK'
+
+    def list(self, conn):
+        return self.client.list()['status'] == 'OK'
+
+    def close(self):
+        self.client.close()
+
+
+class HttpWorkload:
+    """
+    request HTTP ke server task-4; setiap thread memakai koneksinya
+    sendiri, tanpa keep-alive setiap request membuka koneksi baru
+    """
+    def __init__(self, port, concurrency, keep_alive):
+        self.port = port
+        self.keep_alive = keep_alive
+        self.headers = {} if keep_alive else {'Connection': 'close'}
+
+    def connection(self):
+        return http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+
+    def request(self, conn, method, path, body=None, headers={}):
+        try:
+            conn.request(method, path, body, dict(self.headers, **headers))
+            response = conn.getresponse()
+            while response.read(HTTP_CHUNK_SIZE):
+                pass
+            return response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return False
+        finally:
+            if not self.keep_alive:
+                conn.close()
+
+    def upload(self, conn, path, filename):
+        with open(path, 'rb') as f:
+            return self.request(conn, 'POST', '/upload', f, {'X-File-Name': filename,
+                                                             'Content-Length': str(os.path.getsize(path))})
+
+    def download(self, conn, filename):
+        return self.request(conn, 'GET', f"/{filename}")
+
+    def list(self, conn):
+        return self.request(conn, 'GET', '/list')
+
+    def close(self):
+        pass
+
+
+def run_load(workload, operation, concurrency, seconds, path=None):
+    """
+    beban closed-loop selama seconds detik, mengembalikan hasil satu
+    pengulangan: jumlah request, error, request/detik, MB/detik, latensi
+    """
+    latencies = LatencyHistogram()
+    counts = [0, 0]
+    lock = threading.Lock()
+    size = os.path.getsize(path) if path else 0
+    deadline = time.perf_counter() + seconds
+
+    def worker(number):
+        conn = workload.connection()
+        # setiap thread meng-upload ke namanya sendiri agar tidak antre di lock nama yang sama
+        filename = os.path.basename(path) if path else None
+        upload_name = f"w{number}_{filename}"
+        ok = errors = 0
+        while (start := time.perf_counter()) < deadline:
+            if operation == 'upload':
+                succeeded = workload.upload(conn, path, upload_name)
+            elif operation == 'download':
+                succeeded = workload.download(conn, filename)
+            else:
+                succeeded = workload.list(conn)
+            if succeeded:
+                latencies.record(time.perf_counter() - start)
+                ok += 1
+            else:
+                errors += 1
+        if conn is not None:
+            conn.close()
+        with lock:
+            counts[0] += ok
+            counts[1] += errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok, errors = counts
+    result = dict(requests=ok, errors=errors, elapsed=elapsed,
+                  requests_per_second=ok / elapsed,
+                  mb_per_second=ok * size / elapsed / 1024 / 1024)
+    result.update(latencies.summary())
+    return result
+
+
+def run_cell(workload, operation, concurrency, path, args):
+    if args.warmup > 0:
+        run_load(workload, operation, concurrency, args.warmup, path)
+    repeats = [run_load(workload, operation, concurrency, args.duration, path) for _ in range(args.repeats)]
+    cell = dict(repeats=repeats, errors=sum(r['errors'] for r in repeats))
+    for key in ['requests_per_second', 'mb_per_second', 'latency_p50', 'latency_p99']:
+        cell[key] = summarize([r[key] for r in repeats])
+    return cell
+
+
+def make_test_files(directory, sizes):
+    paths = {}
+    for size in sizes:
+        path = os.path.join(directory, f"bench_{size}KB.bin")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size * 1024))
+        paths[size] = path
+    return paths
+
+
+def prepare(workload, path):
+    conn = workload.connection()
+    uploaded = workload.upload(conn, path, os.path.basename(path))
+    if conn is not None:
+        conn.close()
+    if not uploaded:
+        raise RuntimeError(f"uploading {path} for the download test failed")
+
+
+def run_server_matrix(server, pool_size, test_files, args):
+    cells = []
+    with ServerProcess(server, pool_size) as process:
+        for concurrency in args.concurrency:
+            workload_class = FileWorkload if server.startswith('ets-') else HttpWorkload
+            workload = workload_class(process.port, concurrency, args.keep_alive)
+            try:
+                for operation in args.operations:
+                    # LIST tidak bergantung pada ukuran file
+                    for size in (args.file_sizes if operation != 'list' else [None]):
+                        path = test_files.get(size)
+                        if operation == 'download':
+                            prepare(workload, path)
+                        cell = dict(server=server, server_pool_size=pool_size, concurrency=concurrency,
+                                    file_size_kb=size, operation=operation, keep_alive=args.keep_alive)
+                        cell.update(run_cell(workload, operation, concurrency, path, args))
+                        rate = cell['requests_per_second']
+                        print(f"{server:>12} {str(pool_size):>4} {concurrency:>4} {str(size):>7} {operation:>8} "
+                              f"{rate['mean']:>9.1f} {rate['ci95'] or 0:>8.1f} {cell['latency_p99']['mean'] * 1000:>9.2f} "
+                              f"{cell['errors']:>6}", flush=True)
+                        cells.append(cell)
+            finally:
+                workload.close()
+    return cells
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark otomatis server task-ets dan task-4')
+    parser.add_argument('--servers', nargs='+', choices=SERVER_TYPES, default=SERVER_TYPES)
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 4],
+                        help='Ukuran pool/worker server (http-thread tidak punya pool)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='Jumlah thread client')
+    parser.add_argument('--file-sizes', type=int, nargs='+', default=[64, 1024], help='Ukuran file dalam KB')
+    parser.add_argument('--operations', nargs='+', choices=OPERATION_TYPES, default=OPERATION_TYPES)
+    parser.add_argument('--warmup', type=float, default=1, help='Detik pemanasan per sel (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=3, help='Detik per pengulangan (default: %(default)s)')
+    parser.add_argument('--repeats', type=int, default=5, help='Pengulangan per sel (default: %(default)s)')
+    parser.add_argument('--keep-alive', action='store_true',
+                        help='Pakai ulang koneksi; server thread-per-koneksi melayani paling banyak pool-size client')
+    parser.add_argument('--output', default=None, help='File JSON hasil (default: benchmark_results_<waktu>.json)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = args.output or f"benchmark_results_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    meta = dict(started=time.strftime('%Y-%m-%dT%H:%M:%S%z'), python=platform.python_version(),
+                platform=platform.platform(), cpu_count=os.cpu_count(), args=vars(args))
+
+    directory = tempfile.mkdtemp(prefix='bench-files-')
+    results = []
+    try:
+        test_files = make_test_files(directory, args.file_sizes)
+        print(f"{'server':>12} {'pool':>4} {'conc':>4} {'KB':>7} {'operasi':>8} {'req/s':>9} {'±95%':>8} {'p99(ms)':>9} {'error':>6}")
+        for server in args.servers:
+            for pool_size in ([None] if server == 'http-thread' else args.pool_sizes):
+                try:
+                    results.extend(run_server_matrix(server, pool_size, test_files, args))
+                except RuntimeError as e:
+                    print(f"{server} pool {pool_size} gagal: {e}")
+                    results.append(dict(server=server, server_pool_size=pool_size, error=str(e)))
+    finally:
+        shutil.rmtree(directory)
+        meta['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        with open(output, 'w') as f:
+            json.dump(dict(meta=meta, results=results), f, indent=2)
+        print(f"hasil disimpan di {output}")
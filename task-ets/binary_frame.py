@@ -0,0 +1,82 @@
+import struct
+
+"""
+* binary_frame berisi format frame biner yang dipakai berdampingan
+dengan protokol teks (JSON + base64)
+
+* setiap frame diawali MAGIC sehingga server dapat membedakan frame biner
+dengan perintah teks pada koneksi yang sama
+
+* format frame:
+  MAGIC (4 byte) | OPCODE (1 byte) | PANJANG NAMA FILE (2 byte) |
+  PANJANG PAYLOAD (8 byte) | NAMA FILE (utf-8) | PAYLOAD (bytes mentah)
+"""
+
+MAGIC = b'FPB1'
+HEADER = struct.Struct('!4sBHQ')
+HEADER_SIZE = HEADER.size
+
+OP_LIST = 1
+OP_GET = 2
+OP_UPLOAD = 3
+OP_DELETE = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+OPCODES = {
+    OP_LIST: 'list',
+    OP_GET: 'get',
+    OP_UPLOAD: 'upload',
+    OP_DELETE: 'delete',
+}
+
+
+class FrameError(Exception):
+    pass
+
+
+def pack_header(opcode, filename='', payload_size=0):
+    name = filename.encode() if isinstance(filename, str) else filename
+    return HEADER.pack(MAGIC, opcode, len(name), payload_size) + name
+
+
+def pack_frame(opcode, filename='', payload=b''):
+    return pack_header(opcode, filename, len(payload)) + payload
+
+
+def is_frame(buffer):
+    prefix = bytes(buffer[:len(MAGIC)])
+    return MAGIC.startswith(prefix) if len(prefix) < len(MAGIC) else prefix == MAGIC
+
+
+def unpack_header(buffer):
+    """
+    mengembalikan (opcode, filename, payload_size, header_length) atau None
+    jika header belum lengkap diterima
+    """
+    if len(buffer) < HEADER_SIZE:
+        return None
+    magic, opcode, name_size, payload_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise FrameError('magic frame tidak valid')
+    header_length = HEADER_SIZE + name_size
+    if len(buffer) < header_length:
+        return None
+    filename = bytes(buffer[HEADER_SIZE:header_length]).decode()
+    return opcode, filename, payload_size, header_length
+
+
+def split_frame(buffer):
+    """
+    mengembalikan ((opcode, filename, payload), sisa_buffer) atau None
+    jika frame belum lengkap diterima
+    """
+    header = unpack_header(buffer)
+    if header is None:
+        return None
+    opcode, filename, payload_size, header_length = header
+    end = header_length + payload_size
+    if len(buffer) < end:
+        return None
+    return (opcode, filename, buffer[header_length:end]), buffer[end:]
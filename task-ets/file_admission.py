@@ -0,0 +1,78 @@
+import threading
+import file_codec
+
+"""
+* AdmissionControl membatasi pekerjaan yang diterima server supaya saat
+beban berlebih latensi naik secara wajar dan server tidak kehabisan
+memori: jumlah koneksi yang sedang dilayani atau menunggu thread pool
+(max_connections), jumlah koneksi per alamat IP client (max_per_client),
+dan jumlah byte request yang sedang ditahan di memori oleh semua koneksi
+(memory_budget). Nilai 0 berarti tidak dibatasi
+
+* koneksi yang ditolak langsung dijawab status BUSY (lihat PROTOKOL.txt)
+lalu ditutup, tanpa masuk antrian executor; retry_after memberi tahu
+client berapa detik sebaiknya menunggu sebelum mencoba lagi
+
+* memori dihitung dari isi buffer penerimaan (request teks seperti
+UPLOAD base64 yang harus diterima utuh); payload stream dan frame biner
+ditulis per chunk sehingga tidak ikut dihitung
+
+* dengan --executor process setiap worker punya AdmissionControl sendiri
+"""
+
+REASONS = ['connections', 'client', 'memory']
+
+
+class AdmissionControl:
+    def __init__(self, max_connections=0, max_per_client=0, memory_budget=0, retry_after=1):
+        self.max_connections = max_connections
+        self.max_per_client = max_per_client
+        self.memory_budget = memory_budget
+        self.retry_after = retry_after
+        self.connections = 0
+        self.per_client = {}
+        self.memory = 0
+        self.lock = threading.Lock()
+
+    def admit(self, client):
+        """
+        alasan penolakan (salah satu REASONS), atau None jika koneksi dari
+        client diterima; koneksi yang diterima harus diakhiri release
+        """
+        with self.lock:
+            if self.max_connections and self.connections >= self.max_connections:
+                return 'connections'
+            count = self.per_client.get(client, 0)
+            if self.max_per_client and count >= self.max_per_client:
+                return 'client'
+            self.connections += 1
+            self.per_client[client] = count + 1
+        return None
+
+    def release(self, client):
+        with self.lock:
+            self.connections -= 1
+            count = self.per_client.pop(client) - 1
+            if count:
+                self.per_client[client] = count
+
+    def reserve(self, size):
+        """
+        menambah size byte ke memori request yang sedang ditahan, False
+        (tanpa menambah) jika anggaran akan terlampaui
+        """
+        with self.lock:
+            if self.memory_budget and size > 0 and self.memory + size > self.memory_budget:
+                return False
+            self.memory += size
+            return True
+
+    def free(self, size):
+        with self.lock:
+            self.memory -= size
+
+    def busy_response(self, reason):
+        message = {'connections': 'terlalu banyak koneksi', 'client': 'terlalu banyak koneksi dari client ini',
+                   'memory': 'anggaran memori request habis'}[reason]
+        return file_codec.dumps(dict(status='BUSY', data=f"server sibuk: {message}",
+                                     retry_after=self.retry_after)) + b"\r\n\r\n"
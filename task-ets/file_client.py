@@ -0,0 +1,667 @@
+import os
+import json
+import socket
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+import itertools
+import concurrent.futures
+from contextlib import contextmanager, asynccontextmanager
+
+import framing
+
+try:
+    import file_compress
+except ImportError:
+    file_compress = None
+
+"""
+* file_client adalah library client untuk protokol file server (lihat
+PROTOKOL.txt), dalam versi sinkron (FileClient) dan asyncio
+(AsyncFileClient), dipakai oleh stress test client dan CLI
+
+* koneksi diambil dari pool berukuran terbatas: jika semua koneksi sedang
+dipakai, request menunggu sampai ada yang dikembalikan. Secara default
+(keep_alive=False) setiap request, termasuk satu pipeline, memakai koneksi
+baru yang langsung ditutup. Dengan keep_alive=True koneksi disimpan di pool
+untuk request berikutnya; pada server dengan executor thread/process setiap
+koneksi yang disimpan menahan satu worker sampai ditutup client atau
+diputus --idle-timeout server, sehingga client lain bisa ikut menunggu
+
+* setiap request diberi @id, respons dengan id berbeda dianggap koneksi
+rusak. Koneksi dari pool yang ternyata sudah ditutup server (gagal saat
+mengirim, atau ditutup sebelum ada byte respons) dicoba ulang sekali
+dengan koneksi baru. Error setelah itu hanya dicoba ulang untuk request
+yang aman diulang (IDEMPOTENT_REQUESTS), sehingga misalnya DELETE yang
+sudah dijalankan server tidak dikirim dua kali
+
+* pipeline mengirim banyak request di satu koneksi tanpa menunggu respons
+satu per satu (paling banyak PIPELINE_WINDOW request di depan respons).
+Koneksinya selalu ditutup setelah pipeline selesai, juga dengan
+keep_alive=True, karena pipeline biasanya dipakai untuk sekumpulan request
+sekali jalan dan koneksi yang disimpan hanya menahan worker server
+
+* upload_file/get_stream/upload_stream membaca dan menulis file per chunk
+sehingga file tidak pernah dimuat utuh ke memori client
+
+* semua method mengembalikan dict result seperti yang dikirim server
+(status OK/ERROR); error jaringan dan timeout juga dikembalikan sebagai
+status ERROR. Jika server menolak karena sibuk, result berstatus BUSY
+beserta retry_after (detik) dan koneksinya tidak dipakai lagi.
+timeout berlaku per request (sinkron: per operasi socket, asyncio: batas
+waktu seluruh request)
+"""
+
+DEFAULT_ADDRESS = ('localhost', 6667)
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 600
+PIPELINE_WINDOW = 32
+IDEMPOTENT_REQUESTS = ('LIST', 'GET', 'HAVE', 'STATS')
+STREAM_CHUNK_SIZE = 64 * 1024
+# kelipatan 3, sehingga base64 setiap chunk bisa langsung disambung
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+ASYNC_READ_LIMIT = 1024 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_CONNECTIONS = 4
+MULTIPART_RETRIES = 2
+
+
+def error(message):
+    return dict(status='ERROR', data=message)
+
+
+def idempotent(command):
+    # opsi "@nama=nilai" di depan request dilewati
+    while command.startswith('@'):
+        command = command.partition(' ')[2]
+    return command.partition(' ')[0].upper() in IDEMPOTENT_REQUESTS
+
+
+class StaleConnection(ConnectionError):
+    """
+    koneksi sudah ditutup server sebelum request diproses: gagal saat
+    mengirim, atau ditutup sebelum ada byte respons
+    """
+
+
+class ServerBusy(ConnectionError):
+    def __init__(self, result):
+        super().__init__(result['data'])
+        self.result = result
+
+
+def decode_data(result, field):
+    """
+    isi field base64 dalam bytes, didekompresi jika result memuat
+    data_encoding
+    """
+    data = base64.b64decode(result[field])
+    if 'data_encoding' in result:
+        if file_compress is None:
+            raise ValueError(f"encoding tidak didukung: {result['data_encoding']}")
+        data = file_compress.decompress(data, result['data_encoding'])
+    return data
+
+
+def decode_result(result):
+    if result.get('status') != 'OK':
+        return result
+    if 'data_file' in result:
+        result['data_file'] = decode_data(result, 'data_file')
+    elif 'data_encoding' in result:
+        result['data'] = json.loads(decode_data(result, 'data'))
+    return result
+
+
+def with_options(command, encoding=None):
+    return command if encoding is None else f"@encoding={encoding} {command}"
+
+
+def file_sha256(f, offset, size):
+    digest = hashlib.sha256()
+    f.seek(offset)
+    while size > 0 and (chunk := f.read(min(STREAM_CHUNK_SIZE, size))):
+        digest.update(chunk)
+        size -= len(chunk)
+    return digest.hexdigest()
+
+
+class Connection:
+    def __init__(self, address, timeout=DEFAULT_TIMEOUT):
+        self.sock = socket.create_connection(address, timeout=timeout)
+        # request kecil yang di-pipeline tidak perlu menunggu algoritma Nagle
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = framing.RecvBuffer()
+        self.used = False
+        self.reusable = True
+        self.responded = False
+
+    def send(self, data):
+        try:
+            self.sock.sendall(data)
+        except socket.timeout:
+            raise
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    def sendfile(self, f, offset=0, count=None):
+        try:
+            self.sock.sendfile(f, offset, count)
+        except socket.timeout:
+            raise
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    def read_response(self):
+        response = self.buffer.read_until(self.sock)
+        if response is None:
+            if not self.responded and not len(self.buffer):
+                raise StaleConnection('Connection closed by server')
+            raise ConnectionError('Connection closed by server')
+        self.responded = True
+        return json.loads(response)
+
+    def read_exact(self, size):
+        return self.buffer.read_exact(self.sock, size)
+
+    def close(self):
+        self.sock.close()
+
+
+class ConnectionPool:
+    def __init__(self, address=DEFAULT_ADDRESS, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.address = address
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        meminjam satu koneksi; koneksi ditutup (tidak dikembalikan ke pool)
+        jika terjadi exception di dalam blok with
+        """
+        timeout = timeout or self.timeout
+        if not self.slots.acquire(timeout=timeout):
+            raise socket.timeout('Timed out waiting for a pooled connection')
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = Connection(self.address, timeout)
+            conn.sock.settimeout(timeout)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            conn.used = True
+            if self.keep_alive and conn.reusable:
+                with self.lock:
+                    self.idle.append(conn)
+            else:
+                conn.close()
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class FileClient:
+    def __init__(self, address=DEFAULT_ADDRESS, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.pool = ConnectionPool(address, pool_size, timeout, keep_alive)
+        self.request_ids = itertools.count()
+
+    def __getstate__(self):
+        # socket di pool tidak bisa dipindah ke proses lain, proses tujuan
+        # membuat pool sendiri
+        state = self.__dict__.copy()
+        del state['pool']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pool = ConnectionPool(self.address, self.pool_size, self.timeout, self.keep_alive)
+
+    def close(self):
+        self.pool.close()
+
+    def next_id(self):
+        return str(next(self.request_ids))
+
+    def exchange(self, func, timeout=None, retry=False):
+        """
+        menjalankan func(conn) dengan koneksi dari pool dan mengembalikan
+        hasilnya; error jaringan menjadi result status ERROR. Dengan
+        retry=True error pada koneksi dari pool selalu dicoba ulang sekali,
+        selain itu hanya jika koneksi ternyata sudah ditutup server
+        """
+        for attempt in range(2):
+            reused = False
+            try:
+                with self.pool.connection(timeout) as conn:
+                    reused = conn.used
+                    conn.responded = False
+                    return func(conn)
+            except socket.timeout:
+                return error('Socket timeout')
+            except ServerBusy as e:
+                return e.result
+            except ConnectionRefusedError:
+                return error('Connection refused')
+            except StaleConnection as e:
+                if reused and attempt == 0:
+                    continue
+                return error(str(e))
+            except (ConnectionError, OSError) as e:
+                if reused and attempt == 0 and retry:
+                    continue
+                return error(str(e))
+            except Exception as e:
+                return error(str(e))
+
+    def read_response(self, conn, request_id):
+        result = conn.read_response()
+        if result.get('status') == 'BUSY':
+            # dikirim tanpa id, server menutup koneksi setelahnya
+            raise ServerBusy(result)
+        if result.get('id') != request_id:
+            raise ConnectionError(f"Response id {result.get('id')} does not match request {request_id}")
+        del result['id']
+        return result
+
+    def request(self, command, timeout=None):
+        request_id = self.next_id()
+
+        def send(conn):
+            conn.send(f"@id={request_id} {command}\r\n\r\n".encode())
+            return self.read_response(conn, request_id)
+        return self.exchange(send, timeout, idempotent(command))
+
+    def pipeline(self, commands, timeout=None):
+        """
+        mengirim semua commands di satu koneksi, mengembalikan list result
+        dengan urutan yang sama
+        """
+        ids = [self.next_id() for _ in commands]
+
+        def send(conn):
+            results = []
+            sent = 0
+            while len(results) < len(commands):
+                window = min(len(results) + PIPELINE_WINDOW, len(commands))
+                if sent < window:
+                    conn.send(b"".join(f"@id={ids[i]} {commands[i]}\r\n\r\n".encode() for i in range(sent, window)))
+                    sent = window
+                results.append(self.read_response(conn, ids[len(results)]))
+            conn.reusable = False
+            return results
+
+        results = self.exchange(send, timeout, all(idempotent(command) for command in commands))
+        return results if isinstance(results, list) else [results] * len(commands)
+
+    def list(self, *params, encoding=None, timeout=None):
+        return decode_result(self.request(with_options(' '.join(('LIST',) + params), encoding), timeout))
+
+    def get(self, filename, encoding=None, timeout=None):
+        """
+        GET dengan base64; data_file pada result sudah berupa bytes
+        """
+        return decode_result(self.request(with_options(f"GET {filename}", encoding), timeout))
+
+    def delete(self, filename, timeout=None):
+        return self.request(f"DELETE {filename}", timeout)
+
+    def have(self, digest, filename=None, timeout=None):
+        return self.request(f"HAVE {digest} {filename or ''}".strip(), timeout)
+
+    def batch(self, commands, timeout=None):
+        result = self.request(f"BATCH {json.dumps(commands)}", timeout)
+        if result['status'] == 'OK':
+            result['data'] = [decode_result(item) for item in result['data']]
+        return result
+
+    def upload(self, filename, data, timeout=None):
+        return self.request(f"UPLOAD {filename} {base64.b64encode(data).decode()}", timeout)
+
+    def upload_file(self, path, filename=None, timeout=None):
+        """
+        UPLOAD biasa (base64) yang di-encode dan dikirim per chunk dari
+        file, berlaku untuk semua versi server
+        """
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+
+        def send(conn):
+            conn.send(f"@id={request_id} UPLOAD {filename} ".encode())
+            with open(path, 'rb') as f:
+                while chunk := f.read(BASE64_CHUNK_SIZE):
+                    conn.send(base64.b64encode(chunk))
+            conn.send(framing.DELIMITER)
+            return self.read_response(conn, request_id)
+        return self.exchange(send, timeout)
+
+    def get_stream(self, filename, path, timeout=None):
+        """
+        GET_STREAM, isi file langsung ditulis ke path per chunk
+        """
+        request_id = self.next_id()
+
+        def send(conn):
+            conn.send(f"@id={request_id} GET_STREAM {filename}\r\n\r\n".encode())
+            result = self.read_response(conn, request_id)
+            if result['status'] == 'OK':
+                with open(path, 'wb') as f:
+                    for chunk in conn.read_exact(result['data_size']):
+                        f.write(chunk)
+            return result
+        return self.exchange(send, timeout)
+
+    def upload_stream(self, path, filename=None, timeout=None):
+        """
+        UPLOAD_STREAM, isi file dikirim dengan sendfile tanpa base64
+        """
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+
+        def send(conn):
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                conn.send(f"@id={request_id} UPLOAD_STREAM {filename} {size}\r\n\r\n".encode())
+                conn.sendfile(f, 0, size)
+            return self.read_response(conn, request_id)
+        return self.exchange(send, timeout)
+
+    def upload_multipart(self, path, filename=None, connections=MULTIPART_CONNECTIONS, part_size=DEFAULT_PART_SIZE, timeout=None):
+        """
+        upload multipart: part dikirim paralel lewat beberapa koneksi dari
+        pool, part yang gagal dikirim ulang berdasarkan UPLOAD_STATUS
+        """
+        filename = filename or os.path.basename(path)
+        size = os.path.getsize(path)
+        result = self.request(f"UPLOAD_INIT {filename} {size} {part_size}", timeout)
+        if result['status'] != 'OK':
+            return result
+        upload_id = result['data_upload_id']
+        part_size = result['data_part_size']
+        missing = list(range(result['data_parts']))
+
+        for attempt in range(MULTIPART_RETRIES + 1):
+            workers = min(connections, len(missing))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                shares = [missing[i::workers] for i in range(workers)]
+                for share, sent in zip(shares, pool.map(lambda share: self.send_parts(path, upload_id, share, part_size, size, timeout), shares)):
+                    if sent['status'] != 'OK':
+                        logging.warning(f"Parts {share[:5]}... failed: {sent['data']}")
+
+            status = self.request(f"UPLOAD_STATUS {upload_id}", timeout)
+            if status['status'] != 'OK':
+                return status
+            missing = status['data_missing']
+            if not missing:
+                return self.request(f"UPLOAD_COMPLETE {upload_id}", timeout)
+            logging.warning(f"Upload {upload_id}: {len(missing)} parts missing, retrying")
+
+        self.request(f"UPLOAD_ABORT {upload_id}", timeout)
+        return error(f"Parts still missing after {MULTIPART_RETRIES} retries: {missing}")
+
+    def send_parts(self, path, upload_id, numbers, part_size, size, timeout=None):
+        """
+        mengirim beberapa part berturut-turut di satu koneksi; checksum
+        dihitung dari file lalu isi part dikirim dengan sendfile
+        """
+        def send(conn):
+            with open(path, 'rb') as f:
+                for number in numbers:
+                    offset = number * part_size
+                    count = min(part_size, size - offset)
+                    digest = file_sha256(f, offset, count)
+                    request_id = self.next_id()
+                    conn.send(f"@id={request_id} UPLOAD_PART {upload_id} {number} {count} {digest}\r\n\r\n".encode())
+                    conn.sendfile(f, offset, count)
+                    result = self.read_response(conn, request_id)
+                    if result['status'] != 'OK':
+                        logging.warning(f"Part {number} rejected: {result['data']}")
+            return dict(status='OK', data=numbers)
+        return self.exchange(send, timeout)
+
+
+class AsyncConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.used = False
+        self.reusable = True
+        self.responded = False
+
+    @classmethod
+    async def open(cls, address):
+        reader, writer = await asyncio.open_connection(*address, limit=ASYNC_READ_LIMIT)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    async def send(self, data):
+        try:
+            self.writer.write(data)
+            await self.writer.drain()
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    async def sendfile(self, f, offset=0, count=None):
+        try:
+            await asyncio.get_running_loop().sendfile(self.writer.transport, f, offset, count)
+        except OSError as e:
+            if self.responded:
+                raise
+            raise StaleConnection(str(e)) from e
+
+    async def read_response(self):
+        try:
+            response = await self.reader.readuntil(framing.DELIMITER)
+        except asyncio.IncompleteReadError as e:
+            if not self.responded and not e.partial:
+                raise StaleConnection('Connection closed by server')
+            raise ConnectionError('Connection closed by server')
+        self.responded = True
+        return json.loads(response[:-len(framing.DELIMITER)])
+
+    async def read_exact(self, size):
+        remaining = size
+        while remaining > 0:
+            data = await self.reader.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not data:
+                raise ConnectionError('Connection closed in the middle of a stream')
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    def __init__(self, address=DEFAULT_ADDRESS, size=DEFAULT_POOL_SIZE, keep_alive=False):
+        self.address = address
+        self.keep_alive = keep_alive
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else await AsyncConnection.open(self.address)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            conn.used = True
+            if self.keep_alive and conn.reusable:
+                self.idle.append(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class AsyncFileClient:
+    """
+    versi asyncio dari FileClient dengan method yang sama (di-await),
+    kecuali upload_multipart; timeout berlaku untuk seluruh request
+    termasuk menunggu koneksi dari pool
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.timeout = timeout
+        self.pool = AsyncConnectionPool(address, pool_size, keep_alive)
+        self.request_ids = itertools.count()
+
+    async def close(self):
+        self.pool.close()
+
+    def next_id(self):
+        return str(next(self.request_ids))
+
+    async def exchange(self, func, timeout=None, retry=False):
+        for attempt in range(2):
+            reused = False
+
+            async def attempt_exchange():
+                nonlocal reused
+                async with self.pool.connection() as conn:
+                    reused = conn.used
+                    conn.responded = False
+                    return await func(conn)
+            try:
+                return await asyncio.wait_for(attempt_exchange(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                return error('Socket timeout')
+            except ServerBusy as e:
+                return e.result
+            except ConnectionRefusedError:
+                return error('Connection refused')
+            except StaleConnection as e:
+                if reused and attempt == 0:
+                    continue
+                return error(str(e))
+            except (ConnectionError, OSError) as e:
+                if reused and attempt == 0 and retry:
+                    continue
+                return error(str(e))
+            except Exception as e:
+                return error(str(e))
+
+    async def read_response(self, conn, request_id):
+        result = await conn.read_response()
+        if result.get('status') == 'BUSY':
+            raise ServerBusy(result)
+        if result.get('id') != request_id:
+            raise ConnectionError(f"Response id {result.get('id')} does not match request {request_id}")
+        del result['id']
+        return result
+
+    async def request(self, command, timeout=None):
+        request_id = self.next_id()
+
+        async def send(conn):
+            await conn.send(f"@id={request_id} {command}\r\n\r\n".encode())
+            return await self.read_response(conn, request_id)
+        return await self.exchange(send, timeout, idempotent(command))
+
+    async def pipeline(self, commands, timeout=None):
+        ids = [self.next_id() for _ in commands]
+
+        async def send(conn):
+            results = []
+            sent = 0
+            while len(results) < len(commands):
+                window = min(len(results) + PIPELINE_WINDOW, len(commands))
+                if sent < window:
+                    await conn.send(b"".join(f"@id={ids[i]} {commands[i]}\r\n\r\n".encode() for i in range(sent, window)))
+                    sent = window
+                results.append(await self.read_response(conn, ids[len(results)]))
+            conn.reusable = False
+            return results
+
+        results = await self.exchange(send, timeout, all(idempotent(command) for command in commands))
+        return results if isinstance(results, list) else [results] * len(commands)
+
+    async def list(self, *params, encoding=None, timeout=None):
+        return decode_result(await self.request(with_options(' '.join(('LIST',) + params), encoding), timeout))
+
+    async def get(self, filename, encoding=None, timeout=None):
+        return decode_result(await self.request(with_options(f"GET {filename}", encoding), timeout))
+
+    async def delete(self, filename, timeout=None):
+        return await self.request(f"DELETE {filename}", timeout)
+
+    async def have(self, digest, filename=None, timeout=None):
+        return await self.request(f"HAVE {digest} {filename or ''}".strip(), timeout)
+
+    async def batch(self, commands, timeout=None):
+        result = await self.request(f"BATCH {json.dumps(commands)}", timeout)
+        if result['status'] == 'OK':
+            result['data'] = [decode_result(item) for item in result['data']]
+        return result
+
+    async def upload(self, filename, data, timeout=None):
+        return await self.request(f"UPLOAD {filename} {base64.b64encode(data).decode()}", timeout)
+
+    async def upload_file(self, path, filename=None, timeout=None):
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+        loop = asyncio.get_running_loop()
+
+        async def send(conn):
+            await conn.send(f"@id={request_id} UPLOAD {filename} ".encode())
+            with open(path, 'rb') as f:
+                while chunk := await loop.run_in_executor(None, f.read, BASE64_CHUNK_SIZE):
+                    await conn.send(base64.b64encode(chunk))
+            await conn.send(framing.DELIMITER)
+            return await self.read_response(conn, request_id)
+        return await self.exchange(send, timeout)
+
+    async def get_stream(self, filename, path, timeout=None):
+        request_id = self.next_id()
+        loop = asyncio.get_running_loop()
+
+        async def send(conn):
+            await conn.send(f"@id={request_id} GET_STREAM {filename}\r\n\r\n".encode())
+            result = await self.read_response(conn, request_id)
+            if result['status'] == 'OK':
+                with open(path, 'wb') as f:
+                    async for chunk in conn.read_exact(result['data_size']):
+                        await loop.run_in_executor(None, f.write, chunk)
+            return result
+        return await self.exchange(send, timeout)
+
+    async def upload_stream(self, path, filename=None, timeout=None):
+        filename = filename or os.path.basename(path)
+        request_id = self.next_id()
+
+        async def send(conn):
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                await conn.send(f"@id={request_id} UPLOAD_STREAM {filename} {size}\r\n\r\n".encode())
+                await conn.sendfile(f, 0, size)
+            return await self.read_response(conn, request_id)
+        return await self.exchange(send, timeout)
@@ -0,0 +1,32 @@
+"""
+* file_codec memilih encoder JSON tercepat yang terpasang:
+orjson, lalu ujson, dan terakhir json bawaan python
+
+* dumps selalu mengembalikan bytes dan loads menerima bytes/str,
+sehingga pemanggil tidak perlu encode/decode tambahan
+"""
+
+try:
+    import orjson
+
+    NAME = 'orjson'
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    def loads(data):
+        return orjson.loads(data)
+
+except ImportError:
+    try:
+        import ujson as json
+        NAME = 'ujson'
+    except ImportError:
+        import json
+        NAME = 'json'
+
+    def dumps(obj):
+        return json.dumps(obj).encode()
+
+    def loads(data):
+        return json.loads(data)
@@ -0,0 +1,45 @@
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+* file_compress berisi kompresi opsional untuk respons LIST dan GET
+pada protokol teks (lihat opsi @encoding di PROTOKOL.txt)
+
+* gzip selalu tersedia, zstd hanya jika paket zstandard terpasang
+
+* file yang sudah terkompresi (jpg, png, pdf, arsip) dan file yang
+terlalu kecil tidak dikompresi karena hanya membuang CPU
+"""
+
+ENCODINGS = ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+SKIP_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.pdf', '.gz', '.zip', '.zst'}
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compressible(filename, size):
+    ext = os.path.splitext(filename)[1].lower()
+    return ext not in SKIP_EXTENSIONS and size >= MIN_SIZE
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd' and zstandard is not None:
+        # ZstdCompressor tidak thread-safe, jadi dibuat per pemanggilan
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"encoding tidak didukung: {encoding}")
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"encoding tidak didukung: {encoding}")
@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import bisect
+import fnmatch
+import threading
+
+"""
+* class DirectoryIndex menyimpan daftar file di memori (nama terurut,
+ukuran, mtime) sehingga LIST tidak perlu glob/listdir setiap request
+
+* index diperbarui langsung oleh upload/delete (put/remove); perubahan
+dari proses lain dideteksi dengan polling: mtime direktori yang berubah
+atau rescan berkala setiap RESCAN_INTERVAL detik (pengganti inotify
+yang tidak tersedia di pustaka standar)
+
+* setiap perubahan dicatat dengan nomor urut, dan cursor berbentuk
+"epoch-nomor". Query dengan since=cursor hanya mengembalikan perubahan
+setelah cursor tersebut. Epoch berbeda untuk setiap instance (misalnya
+worker proses lain atau server yang di-restart), sehingga cursor asing
+atau yang sudah terlalu lama menghasilkan reset dan client harus
+mengambil daftar penuh
+"""
+
+POLL_INTERVAL = 1.0
+RESCAN_INTERVAL = 10.0
+MAX_CHANGES = 10000
+
+
+def default_include(name):
+    # sama dengan glob('*.*'): mengandung titik dan bukan file tersembunyi
+    return '.' in name and not name.startswith('.')
+
+
+class DirectoryIndex:
+    def __init__(self, path='.', include=default_include):
+        self.path = path
+        self.include = include
+        self.epoch = uuid.uuid4().hex[:8]
+        self.names = []
+        self.entries = {}
+        self.changes = []
+        self.seq = 0
+        self.dir_mtime = None
+        self.polled = 0
+        self.scanned = 0
+        self.lock = threading.Lock()
+        self.rescan()
+
+    def cursor(self):
+        return f"{self.epoch}-{self.seq}"
+
+    def put(self, name):
+        if not self.include(name):
+            return
+        try:
+            st = os.stat(os.path.join(self.path, name))
+        except OSError:
+            self.remove(name)
+            return
+        with self.lock:
+            self._put(name, st.st_size, st.st_mtime)
+
+    def remove(self, name):
+        with self.lock:
+            self._remove(name)
+
+    def rescan(self):
+        # mtime direktori diambil sebelum scan agar perubahan selama scan
+        # tetap terdeteksi pada poll berikutnya
+        dir_mtime = os.stat(self.path).st_mtime_ns
+        found = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if self.include(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    found[entry.name] = (st.st_size, st.st_mtime)
+        with self.lock:
+            for name in [n for n in self.entries if n not in found]:
+                self._remove(name)
+            for name, (size, mtime) in found.items():
+                if self.entries.get(name) != (size, mtime):
+                    self._put(name, size, mtime)
+            self.dir_mtime = dir_mtime
+            self.scanned = time.monotonic()
+
+    def poll(self):
+        now = time.monotonic()
+        if now - self.polled < POLL_INTERVAL:
+            return
+        self.polled = now
+        if os.stat(self.path).st_mtime_ns != self.dir_mtime or now - self.scanned >= RESCAN_INTERVAL:
+            self.rescan()
+
+    def query(self, offset=0, limit=None, prefix='', pattern=None, since=None):
+        """
+        tanpa since: dict(files, total, cursor), files berupa
+        (nama, ukuran, mtime) setelah filter prefix/pattern dan paginasi.
+        Dengan since: dict(changes, cursor, reset), changes berupa
+        (nama, 'put'/'delete', ukuran, mtime)
+        """
+        self.poll()
+        with self.lock:
+            if since is not None:
+                return self._changes_since(since, prefix, pattern)
+
+            # nama dengan prefix yang sama berada dalam satu rentang di list terurut
+            start = bisect.bisect_left(self.names, prefix)
+            end = bisect.bisect_right(self.names, prefix + '\U0010ffff') if prefix else len(self.names)
+            if pattern is None:
+                matches = self.names
+                total = end - start
+                offset += start
+                stop = end if limit is None else min(end, offset + limit)
+            else:
+                matches = [name for name in self.names[start:end] if fnmatch.fnmatchcase(name, pattern)]
+                total = len(matches)
+                stop = total if limit is None else offset + limit
+            page = matches[offset:stop]
+            files = [(name,) + self.entries[name] for name in page]
+            return dict(files=files, total=total, cursor=self.cursor())
+
+    def _changes_since(self, since, prefix, pattern):
+        epoch, _, seq = since.partition('-')
+        oldest = self.changes[0][0] if self.changes else self.seq + 1
+        if epoch != self.epoch or not seq.isdigit() or not oldest - 1 <= int(seq) <= self.seq:
+            return dict(changes=[], cursor=self.cursor(), reset=True)
+
+        # nomor urut di changes berurutan tanpa celah, dan hanya perubahan
+        # terakhir per nama yang dikirim
+        latest = {}
+        for _, name, change in self.changes[int(seq) - oldest + 1:]:
+            latest[name] = change
+        changes = []
+        for name, change in latest.items():
+            if not name.startswith(prefix) or (pattern is not None and not fnmatch.fnmatchcase(name, pattern)):
+                continue
+            size, mtime = self.entries.get(name, (None, None))
+            changes.append((name, change, size, mtime))
+        return dict(changes=changes, cursor=self.cursor(), reset=False)
+
+    def _put(self, name, size, mtime):
+        if name not in self.entries:
+            bisect.insort(self.names, name)
+        self.entries[name] = (size, mtime)
+        self._record(name, 'put')
+
+    def _remove(self, name):
+        if self.entries.pop(name, None) is None:
+            return
+        del self.names[bisect.bisect_left(self.names, name)]
+        self._record(name, 'delete')
+
+    def _record(self, name, change):
+        self.seq += 1
+        self.changes.append((self.seq, name, change))
+        if len(self.changes) > MAX_CHANGES:
+            del self.changes[:len(self.changes) - MAX_CHANGES]
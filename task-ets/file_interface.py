@@ -1,17 +1,51 @@
 import os
 import json
 import base64
-from glob import glob
+
+from file_cache import LRUCache
+from file_index import DirectoryIndex
+from file_store import BlobStore, valid_digest
+from file_multipart import MultipartUploads, DEFAULT_PART_SIZE
+from file_write import write_temp, commit_temp, NameLocks
+
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
 
 
 class FileInterface:
-    def __init__(self):
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, dedup=False, fsync='none'):
         os.chdir('files/')
+        self.cache = LRUCache(cache_bytes)
+        self.index = DirectoryIndex('.')
+        self.store = BlobStore('.', fsync) if dedup else None
+        self.fsync = fsync
+        self.write_locks = NameLocks()
+        self.uploads = MultipartUploads('.', fsync)
 
     def list(self,params=[]):
         try:
-            filelist = glob('*.*')
-            return dict(status='OK',data=filelist)
+            options = {}
+            for param in ' '.join(params).split():
+                name, sep, value = param.partition('=')
+                if not sep:
+                    return dict(status='ERROR', data=f"parameter LIST tidak valid: {param}")
+                options[name.lower()] = value
+            offset = int(options.get('offset', 0))
+            limit = int(options['limit']) if 'limit' in options else None
+            if offset < 0 or (limit is not None and limit < 0):
+                return dict(status='ERROR', data='offset/limit tidak boleh negatif')
+            since = options.get('since')
+            hasil = self.index.query(offset, limit, options.get('prefix', ''), options.get('glob'), since)
+
+            if since is not None:
+                changes = [dict(name=name, change=change, size=size, mtime=mtime)
+                           for name, change, size, mtime in hasil['changes']]
+                return dict(status='OK', data=changes, data_cursor=hasil['cursor'], data_reset=hasil['reset'])
+            if options.get('detail') == '1':
+                filelist = [dict(name=name, size=size, mtime=mtime) for name, size, mtime in hasil['files']]
+            else:
+                filelist = [name for name, _, _ in hasil['files']]
+            return dict(status='OK', data=filelist, data_total=hasil['total'], data_cursor=hasil['cursor'])
         except Exception as e:
             return dict(status='ERROR',data=str(e))
 
@@ -20,8 +54,7 @@ class FileInterface:
             filename = params[0]
             if (filename == ''):
                 return None
-            fp = open(f"{filename}",'rb')
-            isifile = base64.b64encode(fp.read()).decode()
+            isifile = base64.b64encode(self.read_file(filename)).decode()
             return dict(status='OK',data_namafile=filename,data_file=isifile)
         except Exception as e:
             return dict(status='ERROR',data=str(e))
@@ -32,18 +65,169 @@ class FileInterface:
             filecontent = params[1]
             
             filedata = base64.b64decode(filecontent)
-            with open(filename, 'wb') as f:
-                f.write(filedata)
+            self._write_file(filename, [filedata])
+            return dict(status='OK', data=f"Uploaded {filename} successfully")
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def get_stream(self, params=[]):
+        try:
+            filename = params[0]
+            if (filename == ''):
+                return dict(status='ERROR', data='nama file kosong')
+            key = self.cache_key(filename, 'raw')
+            isifile = self.cache.get(key)
+            if isifile is None and key[2] <= self.cache.max_entry_bytes:
+                isifile = self.read_file(filename)
+            if isifile is not None:
+                return dict(status='OK', data_namafile=filename, data_size=len(isifile), data_stream=[isifile])
+
+            fp = open(filename, 'rb')
+            size = os.fstat(fp.fileno()).st_size
+            return dict(status='OK', data_namafile=filename, data_size=size, data_stream=self._read_chunks(fp))
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_stream(self, params=[]):
+        try:
+            filename = params[0]
+            chunks = params[1]
+            self._write_file(filename, chunks)
+            return dict(status='OK', data=f"Uploaded {filename} successfully")
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def have(self, params=[]):
+        """
+        HAVE hash [nama]: memeriksa apakah isi dengan hash SHA-256 tersebut
+        sudah tersimpan; jika ada dan nama diberikan, nama langsung
+        ditautkan ke isi tersebut sehingga client tidak perlu upload
+        """
+        try:
+            digest = params[0].lower()
+            filename = params[1] if len(params) > 1 else None
+            if not valid_digest(digest):
+                return dict(status='ERROR', data=f"hash tidak valid: {digest}")
+            if self.store is None or not self.store.has(digest):
+                return dict(status='OK', data_have=False, data=f"{digest} belum tersimpan")
+            if filename is None:
+                return dict(status='OK', data_have=True, data=f"{digest} sudah tersimpan")
+            self.store.link(filename, digest)
+            self._written(filename)
+            return dict(status='OK', data_have=True, data=f"Uploaded {filename} successfully")
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_init(self, params=[]):
+        """
+        UPLOAD_INIT nama ukuran [ukuran_part]: memulai upload multipart
+        """
+        try:
+            params = ' '.join(params).split()
+            filename = params[0]
+            size = int(params[1])
+            part_size = int(params[2]) if len(params) > 2 else DEFAULT_PART_SIZE
+            upload = self.uploads.create(filename, size, part_size)
+            return dict(status='OK', data_upload_id=upload['id'], data_part_size=upload['part_size'],
+                        data_parts=upload['parts'], data_expires=upload['expires'])
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_part(self, params=[]):
+        """
+        params: [id, nomor part, ukuran, sha256 atau None, chunks]
+        """
+        try:
+            upload_id, number, size, checksum, chunks = params
+            digest = self.uploads.write_part(upload_id, number, size, chunks, checksum)
+            return dict(status='OK', data_part=number, data_sha256=digest)
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_status(self, params=[]):
+        try:
+            upload = self.uploads.status(params[0])
+            return dict(status='OK', data_namafile=upload['name'], data_size=upload['size'],
+                        data_part_size=upload['part_size'], data_parts=upload['parts'],
+                        data_missing=self.uploads.missing(params[0]))
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_complete(self, params=[]):
+        try:
+            upload_id = params[0]
+            filename, chunks = self.uploads.assemble(upload_id)
+            self._write_file(filename, chunks)
+            self.uploads.remove(upload_id)
             return dict(status='OK', data=f"Uploaded {filename} successfully")
         except Exception as e:
             return dict(status='ERROR', data=str(e))
 
+    def upload_abort(self, params=[]):
+        try:
+            self.uploads.status(params[0])
+            self.uploads.remove(params[0])
+            return dict(status='OK', data=f"Upload {params[0]} dibatalkan")
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def _write_file(self, filename, chunks):
+        """
+        isi ditulis ke file sementara lalu di-rename (lihat file_write).
+        Penerimaan data berjalan paralel, hanya commit ke nama yang sama
+        yang diproses satu per satu agar cache dan index mengikuti urutan
+        rename
+        """
+        if self.store is not None:
+            self.store.store(filename, chunks)
+            with self.write_locks.hold(filename):
+                self._written(filename)
+            return
+
+        temp_path = write_temp(os.path.dirname(filename), chunks, self.fsync)
+        with self.write_locks.hold(filename):
+            commit_temp(temp_path, filename, self.fsync)
+            self._written(filename)
+
+    def _written(self, filename):
+        self.cache.invalidate(os.path.abspath(filename))
+        self.index.put(filename)
+
+    def cache_key(self, filename, variant):
+        """
+        key cache untuk isi file saat ini, OSError jika file tidak ada
+        """
+        st = os.stat(filename)
+        return (os.path.abspath(filename), st.st_mtime_ns, st.st_size, variant)
+
+    def read_file(self, filename):
+        """
+        isi file utuh dalam bytes, diambil dari cache jika tersedia
+        """
+        key = self.cache_key(filename, 'raw')
+        isifile = self.cache.get(key)
+        if isifile is None:
+            with open(filename, 'rb') as f:
+                isifile = f.read()
+            self.cache.put(key, isifile)
+        return isifile
+
+    def _read_chunks(self, fp):
+        with fp:
+            while chunk := fp.read(STREAM_CHUNK_SIZE):
+                yield chunk
+
     def delete(self, params=[]):
         try:
             filename = params[0]
             if not os.path.exists(filename):
                 return dict(status='ERROR', data='File not found')
-            os.remove(filename)
+            if self.store is not None:
+                self.store.remove(filename)
+            else:
+                os.remove(filename)
+            self.cache.invalidate(os.path.abspath(filename))
+            self.index.remove(filename)
             return dict(status='OK', data=f"Deleted {filename} successfully")
         except Exception as e:
             return dict(status='ERROR', data=str(e))
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+"""
+* file_logging menyiapkan logging yang tidak memblokir request: logger
+hanya memasukkan record ke antrian berukuran terbatas (QueueHandler),
+format dan penulisan ke stderr/file dilakukan thread QueueListener. Jika
+antrian penuh, record dibuang (dihitung di dropped) daripada menahan
+request
+
+* argumen string/bytes yang panjang dipotong menjadi max_field karakter
+sebelum masuk antrian, sehingga isi UPLOAD base64 berukuran 100 MB tidak
+pernah diformat, disimpan di antrian, atau ditulis ke log
+
+* log akses (satu baris per request, logger ACCESS_LOGGER) dapat
+di-sampling: hanya sebagian request yang dicatat, record WARNING ke atas
+selalu dicatat
+
+* format text (satu baris) atau json (satu objek per baris, termasuk
+field extra seperti command, bytes_in, bytes_out, duration)
+
+* setelah fork (worker --executor process), proses anak membuat antrian
+dan thread listener sendiri; panggil stop_logging sebelum proses berhenti
+agar record yang masih di antrian tetap ditulis
+"""
+
+ACCESS_LOGGER = 'fileserver.access'
+LOG_LEVELS = ['debug', 'info', 'warning', 'error']
+LOG_FORMATS = ['text', 'json']
+MAX_FIELD = 200
+QUEUE_SIZE = 10000
+TEXT_FORMAT = '%(asctime)s - %(process)d - %(levelname)s - %(name)s - %(message)s'
+RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+listener = None
+
+
+def clip(value, limit=MAX_FIELD):
+    if isinstance(value, (str, bytes, bytearray)) and len(value) > limit:
+        return f"{value[:limit]!s}...(+{len(value) - limit})"
+    return value
+
+
+class TruncateFilter(logging.Filter):
+    def __init__(self, limit=MAX_FIELD):
+        super().__init__()
+        self.limit = limit
+
+    def filter(self, record):
+        if isinstance(record.args, tuple):
+            record.args = tuple(clip(arg, self.limit) for arg in record.args)
+        elif not record.args:
+            record.msg = clip(record.msg, self.limit)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = dict(time=self.formatTime(record), level=record.levelname, logger=record.name,
+                    pid=record.process, message=record.getMessage())
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_FIELDS)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    def __init__(self, queue_size=QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # pesan diformat oleh thread listener, di sini hanya traceback yang
+        # harus diubah jadi teks selagi masih ada
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level='info', log_file=None, log_format='text', access_sample=1.0, max_field=MAX_FIELD):
+    """
+    memasang pipeline logging pada root logger dan menjalankan listener
+    """
+    global listener
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    outputs = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        outputs.append(logging.FileHandler(log_file))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    handler = NonBlockingHandler()
+    handler.addFilter(TruncateFilter(max_field))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    logging.getLogger(ACCESS_LOGGER).addFilter(SampleFilter(access_sample))
+
+    listener = logging.handlers.QueueListener(handler.queue, *outputs)
+    listener.start()
+    atexit.register(stop_logging)
+    return listener
+
+
+def stop_logging():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def restart_after_fork():
+    global listener
+    if listener is None:
+        return
+    # thread listener milik proses induk tidak ikut ter-fork
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingHandler):
+            handler.queue = queue.Queue(QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(handler.queue, *listener.handlers)
+            listener.start()
+
+
+os.register_at_fork(after_in_child=restart_after_fork)
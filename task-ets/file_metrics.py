@@ -0,0 +1,174 @@
+import os
+import time
+import bisect
+import threading
+
+"""
+* class Metrics mengumpulkan counter, gauge dan histogram milik server
+untuk request STATS (JSON) dan format teks Prometheus (render)
+
+* metrik yang dikenal beserta jenis dan keterangannya ada di METRICS;
+label (misalnya command) dikirim sebagai keyword argument dan nilainya
+harus berasal dari himpunan yang terbatas
+
+* histogram memakai batas bucket tetap (BUCKETS) seperti histogram
+Prometheus, sehingga observe hanya berupa bisect dan penambahan di bawah
+satu lock; cukup murah untuk selalu aktif
+
+* gauge/counter yang nilainya sudah dihitung di tempat lain (misalnya
+statistik cache) didaftarkan sebagai fungsi dengan register dan baru
+dibaca saat snapshot/render
+
+* setiap proses punya Metrics sendiri: pada --executor process angka yang
+dilaporkan adalah milik worker yang melayani koneksi tersebut (field pid)
+"""
+
+PREFIX = 'fileserver_'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS = {
+    'connections_total': ('counter', 'Connections accepted'),
+    'active_connections': ('gauge', 'Connections being served'),
+    'pool_queue_depth': ('gauge', 'Accepted connections or requests waiting for a pool thread'),
+    'rejected_total': ('counter', 'Connections or requests answered BUSY, by reason'),
+    'request_memory_bytes': ('gauge', 'Request bytes held in memory by all connections'),
+    'blocked_workers': ('gauge', 'Connections waiting on their client, by phase; each holds a worker '
+                                 'except with the asyncio executor'),
+    'timeouts_total': ('counter', 'Connections closed because a deadline expired, by phase'),
+    'first_byte_seconds': ('histogram', 'Time from accept until the first request byte is read'),
+    'request_seconds': ('histogram', 'Time to serve one request including sending the response, by command'),
+    'bytes_received_total': ('counter', 'Request bytes received'),
+    'bytes_sent_total': ('counter', 'Response bytes sent'),
+    'cache_hits_total': ('counter', 'File cache hits'),
+    'cache_misses_total': ('counter', 'File cache misses'),
+    'cache_evictions_total': ('counter', 'File cache evictions'),
+    'cache_bytes': ('gauge', 'Bytes held by the file cache'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        [(batas atas, jumlah observasi <= batas)], batas terakhir +Inf
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def label_string(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class Metrics:
+    def __init__(self, prefix=PREFIX, metrics=METRICS):
+        self.prefix = prefix
+        self.metrics = metrics
+        self.values = {}
+        self.histograms = {}
+        self.callbacks = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def dec(self, name, value=1, **labels):
+        self.inc(name, -value, **labels)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register(self, name, func, label=None):
+        """
+        nilai metrik name diambil dari func() setiap kali dibaca; dengan
+        label, func() mengembalikan dict {nilai label: nilai metrik}
+        """
+        self.callbacks[name] = (func, label)
+
+    def collect(self):
+        """
+        {nama: [(label, nilai atau Histogram)]} dari semua metrik
+        """
+        collected = {}
+        with self.lock:
+            for (name, labels), value in self.values.items():
+                collected.setdefault(name, []).append((labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+                collected.setdefault(name, []).append((labels, copy))
+        for name, (func, label) in self.callbacks.items():
+            try:
+                value = func()
+            except Exception:
+                continue
+            if label is None:
+                collected[name] = [((), value)]
+            else:
+                collected[name] = [(((label, key),), count) for key, count in value.items()]
+        return collected
+
+    def snapshot(self):
+        """
+        isi metrik dalam bentuk dict untuk respons STATS; histogram
+        diringkas menjadi count, sum dan bucket kumulatif
+        """
+        data = dict(pid=os.getpid(), uptime=time.time() - self.started)
+        for name, samples in sorted(self.collect().items()):
+            for labels, value in samples:
+                if isinstance(value, Histogram):
+                    value = dict(count=value.count, sum=value.sum,
+                                 buckets={format_bound(bound): count for bound, count in value.cumulative()})
+                data[name + label_string(labels)] = value
+        return data
+
+    def render(self):
+        """
+        semua metrik dalam format teks Prometheus (text/plain; version=0.0.4)
+        """
+        lines = []
+        for name, samples in sorted(self.collect().items()):
+            kind, text = self.metrics.get(name, ('untyped', name))
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(samples, key=lambda sample: sample[0]):
+                if not isinstance(value, Histogram):
+                    lines.append(f"{full_name}{label_string(labels)} {value}")
+                    continue
+                for bound, count in value.cumulative():
+                    lines.append(f"{full_name}_bucket{label_string(labels + (('le', format_bound(bound)),))} {count}")
+                lines.append(f"{full_name}_sum{label_string(labels)} {value.sum}")
+                lines.append(f"{full_name}_count{label_string(labels)} {value.count}")
+        lines.append(f"# HELP {self.prefix}uptime_seconds Seconds since the metrics were created")
+        lines.append(f"# TYPE {self.prefix}uptime_seconds gauge")
+        lines.append(f"{self.prefix}uptime_seconds {time.time() - self.started}")
+        return '\n'.join(lines) + '\n'
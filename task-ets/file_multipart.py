@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+from file_write import write_temp, commit_temp, atomic_write
+
+"""
+* class MultipartUploads menyimpan upload multipart: file besar dipecah
+menjadi beberapa part yang dapat dikirim secara paralel lewat beberapa
+koneksi, lalu disusun kembali oleh server saat UPLOAD_COMPLETE
+
+* setiap upload adalah direktori UPLOAD_DIR/<id> berisi meta.json (nama,
+ukuran, ukuran part) dan file <nomor>.part untuk setiap part yang sudah
+diterima. Karena seluruh state ada di disk, part dari satu upload boleh
+diterima oleh worker proses yang berbeda
+
+* part ditulis ke file sementara lalu di-rename (lihat file_write), jadi
+part yang terputus di tengah jalan tidak pernah terlihat sebagai part
+yang sudah diterima dan cukup dikirim ulang. Checksum SHA-256 dari client
+(opsional) dicocokkan sebelum part disimpan
+
+* upload yang tidak menerima part baru selama EXPIRY detik dianggap
+ditinggalkan dan dihapus; pemeriksaan dilakukan paling sering setiap
+SWEEP_INTERVAL detik saat ada request multipart
+"""
+
+UPLOAD_DIR = '.multipart'
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_PARTS = 10000
+READ_CHUNK_SIZE = 1024 * 1024
+EXPIRY = 3600
+SWEEP_INTERVAL = 60
+UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class MultipartUploads:
+    def __init__(self, directory='.', fsync='none', expiry=EXPIRY):
+        self.root = os.path.join(directory, UPLOAD_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.fsync = fsync
+        self.expiry = expiry
+        self.swept = 0
+
+    def create(self, name, size, part_size=DEFAULT_PART_SIZE):
+        if size < 0 or part_size <= 0:
+            raise ValueError('ukuran tidak valid')
+        parts = max(1, -(-size // part_size))
+        if parts > MAX_PARTS:
+            raise ValueError(f"jumlah part lebih dari {MAX_PARTS}, perbesar ukuran part")
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.root, upload_id)
+        os.mkdir(path)
+        meta = dict(name=name, size=size, part_size=part_size, parts=parts)
+        atomic_write(os.path.join(path, 'meta.json'), [json.dumps(meta).encode()], self.fsync)
+        return dict(meta, id=upload_id, expires=self.expiry)
+
+    def status(self, upload_id):
+        """
+        meta upload ditambah received: {nomor part: ukuran}
+        """
+        self.sweep()
+        meta = self._meta(upload_id)
+        received = {}
+        with os.scandir(self._path(upload_id)) as it:
+            for entry in it:
+                number, _, ext = entry.name.partition('.')
+                if ext == 'part' and number.isdigit():
+                    received[int(number)] = entry.stat().st_size
+        return dict(meta, id=upload_id, received=received)
+
+    def part_size(self, meta, number):
+        if not 0 <= number < meta['parts']:
+            raise ValueError(f"nomor part harus 0 sampai {meta['parts'] - 1}")
+        return min(meta['part_size'], meta['size'] - number * meta['part_size'])
+
+    def write_part(self, upload_id, number, size, chunks, checksum=None):
+        """
+        menyimpan part dari chunks, mengembalikan hash SHA-256 isinya.
+        Part dengan nomor yang sama yang dikirim ulang menggantikan part lama
+        """
+        meta = self._meta(upload_id)
+        expected = self.part_size(meta, number)
+        if size != expected:
+            raise ValueError(f"ukuran part {number} harus {expected} byte")
+
+        digest = hashlib.sha256()
+        path = self._path(upload_id)
+        temp_path = write_temp(path, chunks, self.fsync, digest.update)
+        if checksum is not None and checksum.lower() != digest.hexdigest():
+            os.remove(temp_path)
+            raise ValueError(f"checksum part {number} tidak cocok")
+        commit_temp(temp_path, os.path.join(path, f"{number}.part"), self.fsync)
+        return digest.hexdigest()
+
+    def missing(self, upload_id):
+        info = self.status(upload_id)
+        return [n for n in range(info['parts']) if info['received'].get(n) != self.part_size(info, n)]
+
+    def assemble(self, upload_id):
+        """
+        (nama file, iterable chunk isi file) dari part-part yang berurutan,
+        ValueError jika masih ada part yang belum diterima
+        """
+        missing = self.missing(upload_id)
+        if missing:
+            raise ValueError(f"part belum lengkap: {missing[:20]}")
+        meta = self._meta(upload_id)
+        return meta['name'], self._read_parts(upload_id, meta['parts'])
+
+    def remove(self, upload_id):
+        shutil.rmtree(self._path(upload_id), ignore_errors=True)
+
+    def sweep(self):
+        now = time.monotonic()
+        if now - self.swept < SWEEP_INTERVAL:
+            return
+        self.swept = now
+        # mtime direktori berubah setiap ada part yang di-rename ke dalamnya
+        deadline = time.time() - self.expiry
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_dir() and entry.stat().st_mtime < deadline:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _path(self, upload_id):
+        if not UPLOAD_ID.fullmatch(upload_id):
+            raise ValueError(f"upload id tidak valid: {upload_id}")
+        return os.path.join(self.root, upload_id)
+
+    def _meta(self, upload_id):
+        try:
+            with open(os.path.join(self._path(upload_id), 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"upload {upload_id} tidak ditemukan atau sudah kedaluwarsa")
+
+    def _read_parts(self, upload_id, parts):
+        path = self._path(upload_id)
+        for number in range(parts):
+            with open(os.path.join(path, f"{number}.part"), 'rb') as f:
+                while chunk := f.read(READ_CHUNK_SIZE):
+                    yield chunk
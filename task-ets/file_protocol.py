@@ -1,8 +1,12 @@
-import json
+import base64
 import logging
 import shlex
 
-from file_interface import FileInterface
+import binary_frame
+import file_codec
+import file_compress
+from file_interface import FileInterface, DEFAULT_CACHE_BYTES
+from file_metrics import Metrics
 
 """
 * class FileProtocol bertugas untuk memproses 
@@ -14,27 +18,268 @@ pada akhirnya akan diproses dalam bentuk string
 
 * class FileProtocol akan memproses data yang masuk dalam bentuk
 string
+
+* selain string, FileProtocol juga memproses frame biner (lihat
+binary_frame.py) yang membawa isi file dalam bentuk bytes mentah
+tanpa base64
+
+* hasil dapat diambil sebagai list buffer bytes (proses_buffers) yang
+langsung dikirim dengan sendmsg tanpa digabung terlebih dahulu
+
+* request boleh diawali opsi @nama=nilai, misalnya "@encoding=gzip LIST",
+untuk meminta data LIST/GET dikirim dalam bentuk terkompresi, atau
+"@id=7 GET a.txt" agar respons memuat id yang sama. Dengan id, client
+dapat mengirim beberapa request sekaligus di satu koneksi (pipelining)
+dan mencocokkan respons yang datang berurutan
+
+* BATCH menjalankan banyak request LIST/GET/DELETE/HAVE dalam satu
+round trip, hasilnya berupa list respons dengan urutan yang sama
+
+* STATS mengembalikan metrik server (lihat file_metrics.py) yang diisi
+oleh file_server selama melayani koneksi
 """
 
+BATCH_REQUESTS = ('list', 'get', 'delete', 'have')
+MAX_BATCH = 1000
+REQUEST_NAMES = ('list', 'get', 'upload', 'delete', 'have', 'batch', 'stats', 'get_stream', 'upload_stream',
+                 'upload_init', 'upload_part', 'upload_status', 'upload_complete', 'upload_abort')
+# nama request selalu ada di awal, UPLOAD base64 yang besar tidak perlu disalin
+REQUEST_NAME_SCAN = 256
 
 
 class FileProtocol:
-    def __init__(self):
-        self.file = FileInterface()
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, dedup=False, fsync='none'):
+        self.file = FileInterface(cache_bytes, dedup, fsync)
+        self.metrics = Metrics()
+        for name, field in [('cache_hits_total', 'hits'), ('cache_misses_total', 'misses'),
+                            ('cache_evictions_total', 'evictions'), ('cache_bytes', 'bytes')]:
+            self.metrics.register(name, lambda field=field: self.file.cache.stats()[field])
+
     def proses_string(self,string_datamasuk=''):
-        logging.warning(f"string diproses: {string_datamasuk}")
-        c = string_datamasuk.strip().split(" ", 2)
+        return b"".join(self.proses_buffers(string_datamasuk)).decode()
+
+    def proses_buffers(self, string_datamasuk=''):
+        logging.debug("string diproses: %s", string_datamasuk)
+        options, string_datamasuk = self.parse_options(string_datamasuk)
+        if string_datamasuk.split(" ", 1)[0].lower() == 'batch':
+            buffers = self._batch_buffers(string_datamasuk[len('batch'):])
+        else:
+            buffers = self._request_buffers(options, string_datamasuk)
+        return self.tag(buffers, options.get('id'))
+
+    def _request_buffers(self, options, string_datamasuk):
+        encoding = options.get('encoding', '').lower() or None
+        if encoding is not None and encoding not in file_compress.ENCODINGS:
+            return [file_codec.dumps(dict(status='ERROR', data=f"encoding tidak didukung: {encoding}"))]
+
+        c = string_datamasuk.split(" ", 2)
         try:
             c_request = c[0].strip().lower()
-            logging.warning(f"memproses request: {c_request}")
+            logging.debug("memproses request: %s", c_request)
             params = [x for x in c[1:]]
+            if c_request == 'get' and params:
+                return self._get_buffers(params[0], encoding)
+            if c_request == 'stats':
+                return self._stats_buffers(params)
             cl = getattr(self.file,c_request)(params)
+            if c_request == 'list' and encoding is not None and cl['status'] == 'OK':
+                cl = self._compress_list(cl, encoding)
 
-            logging.warning("\n")
-            return json.dumps(cl)
+            return [file_codec.dumps(cl)]
         except Exception:
-            return json.dumps(dict(status='ERROR',data='request tidak dikenali'))
+            return [file_codec.dumps(dict(status='ERROR',data='request tidak dikenali'))]
+
+    def _stats_buffers(self, params):
+        """
+        STATS: metrik dalam bentuk JSON, STATS prometheus: teks format
+        Prometheus di field data
+        """
+        if params and params[0].strip().lower() == 'prometheus':
+            return [file_codec.dumps(dict(status='OK', data=self.metrics.render()))]
+        return [file_codec.dumps(dict(status='OK', data=self.metrics.snapshot()))]
+
+    def request_name(self, string_datamasuk=''):
+        """
+        nama request untuk label metrik; nama yang tidak dikenal menjadi
+        other agar jumlah label tetap terbatas
+        """
+        _, string_datamasuk = self.parse_options(string_datamasuk[:REQUEST_NAME_SCAN])
+        name = string_datamasuk.split(" ", 1)[0].lower()
+        return name if name in REQUEST_NAMES else 'other'
+
+    def parse_options(self, string_datamasuk=''):
+        """
+        memisahkan opsi @nama=nilai di awal request, mengembalikan
+        (dict opsi, sisa request)
+        """
+        options = {}
+        rest = string_datamasuk.strip()
+        while rest.startswith('@'):
+            option, _, rest = rest.partition(' ')
+            name, _, value = option[1:].partition('=')
+            options[name.lower()] = value
+            rest = rest.lstrip()
+        return options, rest
+
+    def tag(self, buffers, request_id=None):
+        """
+        menambahkan field id di awal objek JSON respons tanpa menyalin
+        buffer lainnya
+        """
+        if request_id is None:
+            return buffers
+        return [b'{"id": ' + file_codec.dumps(request_id) + b', ', memoryview(buffers[0])[1:]] + buffers[1:]
+
+    def _batch_buffers(self, string_params):
+        """
+        BATCH ["GET a.txt", "DELETE b.txt", ...]: respons setiap request
+        digabung sebagai list di field data, buffer GET dari cache dipakai
+        apa adanya
+        """
+        try:
+            commands = file_codec.loads(string_params)
+        except ValueError:
+            commands = None
+        if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+            return [file_codec.dumps(dict(status='ERROR', data='parameter BATCH harus list JSON berisi request'))]
+        if len(commands) > MAX_BATCH:
+            return [file_codec.dumps(dict(status='ERROR', data=f"BATCH maksimal {MAX_BATCH} request"))]
+
+        buffers = [b'{"status": "OK", "data": [']
+        for i, command in enumerate(commands):
+            options, command = self.parse_options(command)
+            if command.split(" ", 1)[0].lower() in BATCH_REQUESTS:
+                result = self._request_buffers(options, command)
+            else:
+                result = [file_codec.dumps(dict(status='ERROR', data=f"request tidak didukung dalam BATCH: {command[:50]}"))]
+            if i:
+                buffers.append(b', ')
+            buffers.extend(self.tag(result, options.get('id')))
+        buffers.append(b']}')
+        return buffers
+
+    def _compress_list(self, cl, encoding):
+        daftar = file_codec.dumps(cl['data'])
+        if len(daftar) < file_compress.MIN_SIZE:
+            return cl
+        packed = file_compress.compress(daftar, encoding)
+        return dict(cl, data_encoding=encoding, data=base64.b64encode(packed).decode())
+
+    def _get_buffers(self, filename, encoding=None):
+        """
+        respons GET disusun dari potongan header JSON, isi file base64, dan
+        penutup JSON tanpa menyalin base64 ke dalam satu string besar.
+        Potongan tersebut disimpan di cache sehingga file yang sama tidak
+        perlu di-encode ulang untuk setiap request
+        """
+        try:
+            if encoding is not None:
+                buffers = self._encoded_buffers(filename, encoding)
+                if buffers:
+                    return list(buffers)
+            key = self.file.cache_key(filename, 'json')
+            buffers = self.file.cache.get(key)
+            if buffers is None:
+                isifile = base64.b64encode(self.file.read_file(filename))
+                header = b'{"status": "OK", "data_namafile": ' + file_codec.dumps(filename) + b', "data_file": "'
+                buffers = (header, isifile, b'"}')
+                self.file.cache.put(key, buffers, sum(len(b) for b in buffers))
+            return list(buffers)
+        except Exception as e:
+            return [file_codec.dumps(dict(status='ERROR', data=str(e)))]
+
+    def _encoded_buffers(self, filename, encoding):
+        """
+        seperti _get_buffers tetapi isi file dikompresi dulu sebelum base64.
+        Tuple kosong berarti file tidak layak dikompresi (jenisnya sudah
+        terkompresi atau hasilnya tidak lebih kecil); hasil ini ikut
+        di-cache agar file yang sama tidak dicoba dikompresi berulang kali
+        """
+        key = self.file.cache_key(filename, 'json-' + encoding)
+        buffers = self.file.cache.get(key)
+        if buffers is None:
+            buffers = ()
+            if file_compress.compressible(filename, key[2]):
+                isifile = self.file.read_file(filename)
+                packed = file_compress.compress(isifile, encoding)
+                if len(packed) < len(isifile):
+                    header = (b'{"status": "OK", "data_namafile": ' + file_codec.dumps(filename)
+                              + b', "data_encoding": ' + file_codec.dumps(encoding) + b', "data_file": "')
+                    buffers = (header, base64.b64encode(packed), b'"}')
+            self.file.cache.put(key, buffers, sum(len(b) for b in buffers))
+        return buffers
+
+    def proses_frame(self, opcode, filename='', payload=()):
+        """
+        payload berupa iterable chunk bytes, mengembalikan
+        (status, nama file, ukuran payload, iterable chunk payload)
+        untuk dikirim kembali sebagai frame biner
+        """
+        c_request = binary_frame.OPCODES.get(opcode)
+        logging.debug("memproses frame: %s %s", c_request, filename)
+        if c_request == 'list':
+            cl = self.file.list()
+        elif c_request == 'get':
+            cl = self.file.get_stream([filename])
+        elif c_request == 'upload':
+            cl = self.file.upload_stream([filename, payload])
+        elif c_request == 'delete':
+            cl = self.file.delete([filename])
+        else:
+            cl = dict(status='ERROR', data='request tidak dikenali')
+
+        if cl['status'] != 'OK':
+            return self._frame_result(binary_frame.STATUS_ERROR, filename, str(cl['data']).encode())
+        if c_request == 'get':
+            return binary_frame.STATUS_OK, cl['data_namafile'], cl['data_size'], cl['data_stream']
+        if c_request == 'list':
+            return self._frame_result(binary_frame.STATUS_OK, filename, file_codec.dumps(cl['data']))
+        return self._frame_result(binary_frame.STATUS_OK, filename, str(cl['data']).encode())
+
+    def _frame_result(self, status, filename, data):
+        return status, filename, len(data), [data]
+
+    def stream_request(self, string_datamasuk=''):
+        """
+        mengembalikan (request, nama file, ukuran, id request) jika string
+        adalah request GET_STREAM / UPLOAD_STREAM, selain itu None. Untuk
+        UPLOAD_PART, nama file diganti [id, nomor part, sha256 atau None].
+        ValueError jika parameter request stream tidak valid
+        """
+        options, string_datamasuk = self.parse_options(string_datamasuk)
+        request_id = options.get('id')
+        c = string_datamasuk.split(" ")
+        c_request = c[0].strip().lower()
+        if c_request == 'get_stream':
+            filename, = c[1:]
+            return c_request, filename, 0, request_id
+        if c_request == 'upload_stream':
+            filename, size = c[1:]
+            return c_request, filename, int(size), request_id
+        if c_request == 'upload_part':
+            upload_id, number, size, *checksum = c[1:]
+            if len(checksum) > 1:
+                raise ValueError(string_datamasuk)
+            return c_request, [upload_id, int(number), checksum[0] if checksum else None], int(size), request_id
+        return None
+
+    def proses_get_stream(self, filename):
+        """
+        mengembalikan (header JSON dalam bytes, iterable chunk isi file)
+        """
+        logging.debug("memproses request: get_stream %s", filename)
+        cl = self.file.get_stream([filename])
+        chunks = cl.pop('data_stream', [])
+        return file_codec.dumps(cl), chunks
+
+    def proses_upload_stream(self, filename, chunks):
+        logging.debug("memproses request: upload_stream %s", filename)
+        return file_codec.dumps(self.file.upload_stream([filename, chunks]))
 
+    def proses_upload_part(self, part, size, chunks):
+        logging.debug("memproses request: upload_part %s %s", part[0], part[1])
+        upload_id, number, checksum = part
+        return file_codec.dumps(self.file.upload_part([upload_id, number, size, checksum, chunks]))
 
 if __name__=='__main__':
     #contoh pemakaian
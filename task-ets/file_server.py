@@ -1,80 +1,585 @@
-from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from socket import socket, timeout, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SOMAXCONN
+import socket as socket_module
 import logging
+import file_logging
 from file_protocol import FileProtocol
+from file_interface import STREAM_CHUNK_SIZE, DEFAULT_CACHE_BYTES
+from file_write import FSYNC_POLICIES
+from file_admission import AdmissionControl
+from file_timeouts import ConnectionTimeouts
+import binary_frame
+import framing
 import concurrent.futures
+import asyncio
 import multiprocessing
+import multiprocessing.connection
+import signal
 import argparse
+import time
+import functools
+
+# the stream reader pauses the socket once it holds twice this much, and a
+# longer text command is taken out of it in pieces of this size
+ASYNC_READ_LIMIT = 64 * 1024
+WORKER_POLL_INTERVAL = 1.0
+WORKER_SHUTDOWN_TIMEOUT = 30
+
+access_log = logging.getLogger(file_logging.ACCESS_LOGGER)
+
+def buffers_size(buffers):
+  return sum(len(buffer) for buffer in buffers)
+
+def abort_transport(loop, transport):
+  # called from the timer wheel thread
+  try:
+      loop.call_soon_threadsafe(transport.abort)
+  except RuntimeError:
+      pass
   
 class ServerPool:
-  def __init__(self, host='0.0.0.0', port=6667, pool_size=1, executor_type='thread'):
-    self.protocol = FileProtocol()
+  def __init__(self, host='0.0.0.0', port=6667, pool_size=1, executor_type='thread', reuse_port=False, cache_bytes=DEFAULT_CACHE_BYTES,
+               dedup=False, fsync='none', max_connections=0, max_per_client=0, memory_budget=0, retry_after=1,
+               timeouts=None):
+    self.protocol = FileProtocol(cache_bytes, dedup, fsync)
+    self.admission = AdmissionControl(max_connections, max_per_client, memory_budget, retry_after)
+    self.protocol.metrics.register('request_memory_bytes', lambda: self.admission.memory)
+    self.timeouts = timeouts or ConnectionTimeouts()
+    self.protocol.metrics.register('blocked_workers', self.timeouts.blocked, label='phase')
+    self.protocol.metrics.register('timeouts_total', self.timeouts.expired_counts, label='phase')
     self.pool_size = pool_size
     self.executor_type = executor_type
+    self.reuse_port = reuse_port
+    self.stopping = False
     self.socket = self.create_socket(host, port)
 
   def create_socket(self, host, port):
       sock = socket(AF_INET, SOCK_STREAM)
       sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
-      if self.executor_type == 'thread':
-        sock.settimeout(1800)
+      if self.reuse_port:
+        sock.setsockopt(SOL_SOCKET, socket_module.SO_REUSEPORT, 1)
       sock.bind((host, port))
       return sock
   
-  def handle_client(self, conn, addr):
-      logging.warning(f"Handling connection from {addr}")
-      buffer = ""
+  def handle_client(self, conn, addr, accepted=None):
+      logging.debug("Handling connection from %s", addr)
+      accepted = accepted or time.perf_counter()
+      self.open_connection()
+      buffer = framing.RecvBuffer()
+      first_byte = True
+      # request bytes of this connection counted in the memory budget
+      held = 0
+      # deadlines are enforced by the timer wheel shutting the socket down
+      conn = self.timeouts.wrap(conn)
+      deadline = conn.deadline
       try:
-          while data := conn.recv(128 * 1024 * 1024):
-              buffer += data.decode()
-              while "\r\n\r\n" in buffer:
-                  command, buffer = buffer.split("\r\n\r\n", 1)
-                  response = self.protocol.proses_string(command) + "\r\n\r\n"
-                  conn.sendall(response.encode())
+          while buffer.recv_into(conn):
+              if deadline.phase == 'idle':
+                  deadline.start('command', new_request=True)
+              if first_byte:
+                  self.protocol.metrics.observe('first_byte_seconds', time.perf_counter() - accepted)
+                  first_byte = False
+              if not self.admission.reserve(len(buffer) - held):
+                  conn.sendall(self.rejection('memory'))
+                  break
+              held = len(buffer)
+              served = False
+              while len(buffer):
+                  if binary_frame.is_frame(buffer.view()):
+                      header = binary_frame.unpack_header(buffer.view())
+                      if header is None:
+                          break
+                      opcode, filename, payload_size, header_length = header
+                      buffer.consume(header_length)
+                      self.handle_frame(conn, opcode, filename, payload_size, buffer)
+                  elif (command := buffer.split()) is not None:
+                      self.handle_command(conn, command.decode(), buffer)
+                  else:
+                      break
+                  served = True
+              self.admission.free(held - len(buffer))
+              held = len(buffer)
+              # an unfinished request keeps its command deadline running
+              if served:
+                  if len(buffer):
+                      deadline.start('command', new_request=True)
+                  else:
+                      deadline.start('idle')
       except Exception as e:
-          logging.warning(f"Connection error from {addr}: {str(e)}")
+          if deadline.expired is None:
+              logging.warning("Connection error from %s: %s", addr, e)
       finally:
+          deadline.close()
+          if deadline.expired is not None:
+              logging.debug("Connection from %s timed out in phase %s", addr, deadline.expired)
           conn.close()
-          logging.warning(f"Closed connection from {addr}")
+          self.admission.free(held)
+          self.admission.release(addr[0])
+          self.protocol.metrics.dec('active_connections')
+          logging.debug("Closed connection from %s", addr)
+
+  def admit(self, conn, addr):
+      """
+      admission check for a connection that was just accepted; a rejected
+      connection is answered BUSY and closed without blocking the caller.
+      An admitted one must end in admission.release (handle_client does)
+      """
+      reason = self.admission.admit(addr[0])
+      if reason is None:
+          return True
+      try:
+          conn.send(self.rejection(reason), socket_module.MSG_DONTWAIT)
+      except OSError:
+          pass
+      conn.close()
+      return False
+
+  def rejection(self, reason):
+      self.protocol.metrics.inc('rejected_total', reason=reason)
+      logging.debug("Rejected request: %s", reason)
+      return self.admission.busy_response(reason)
+
+  def open_connection(self):
+      self.protocol.metrics.inc('connections_total')
+      self.protocol.metrics.inc('active_connections')
+
+  def record_request(self, name, started, received, sent):
+      metrics = self.protocol.metrics
+      metrics.observe('request_seconds', time.perf_counter() - started, command=name)
+      metrics.inc('bytes_received_total', received)
+      metrics.inc('bytes_sent_total', sent)
+      duration = time.perf_counter() - started
+      access_log.info("%s in=%d out=%d %.3fms", name, received, sent, duration * 1000,
+                      extra=dict(command=name, bytes_in=received, bytes_out=sent, duration=duration))
+
+  def handle_command(self, conn, command, buffer):
+      started = time.perf_counter()
+      received, sent = self.serve_command(conn, command, buffer)
+      self.record_request(self.protocol.request_name(command), started, len(command) + 4 + received, sent)
+
+  def serve_command(self, conn, command, buffer):
+      """
+      answers one text command, returns (stream payload bytes received,
+      response bytes sent)
+      """
+      try:
+          stream = self.protocol.stream_request(command)
+      except ValueError:
+          conn.sendall(b'{"status": "ERROR", "data": "request tidak dikenali"}\r\n\r\n')
+          raise
+
+      if stream is None:
+          buffers = self.protocol.proses_buffers(command)
+          conn.deadline.start('response')
+          return 0, self.send_buffers(conn, buffers + [b"\r\n\r\n"])
+
+      c_request, filename, size, request_id = stream
+      if c_request == 'get_stream':
+          response, chunks = self.protocol.proses_get_stream(filename)
+          conn.deadline.start('response')
+          sent = self.send_buffers(conn, self.protocol.tag([response], request_id) + [b"\r\n\r\n"])
+          for chunk in chunks:
+              conn.sendall(chunk)
+              sent += len(chunk)
+          return 0, sent
+
+      conn.deadline.start('body')
+      chunks = buffer.read_exact(conn, size)
+      if c_request == 'upload_part':
+          response = self.protocol.proses_upload_part(filename, size, chunks)
+      else:
+          response = self.protocol.proses_upload_stream(filename, chunks)
+      for _ in chunks:
+          pass
+      conn.deadline.start('response')
+      return size, self.send_buffers(conn, self.protocol.tag([response], request_id) + [b"\r\n\r\n"])
+
+  def handle_frame(self, conn, opcode, filename, payload_size, buffer):
+      started = time.perf_counter()
+      conn.deadline.start('body')
+      chunks = buffer.read_exact(conn, payload_size)
+      status, name, size, result = self.protocol.proses_frame(opcode, filename, chunks)
+      for _ in chunks:
+          pass
+      header = binary_frame.pack_header(status, name, size)
+      conn.deadline.start('response')
+      conn.sendall(header)
+      for chunk in result:
+          conn.sendall(chunk)
+      self.record_frame(opcode, filename, payload_size, started, len(header) + size)
+
+  def record_frame(self, opcode, filename, payload_size, started, sent):
+      received = binary_frame.HEADER_SIZE + len(filename.encode()) + payload_size
+      self.record_request('frame_' + binary_frame.OPCODES.get(opcode, 'other'), started, received, sent)
+
+  def send_buffers(self, conn, buffers):
+      """
+      writes the response pieces with sendmsg (writev) instead of joining
+      them into one more copy of a possibly multi-MB response; returns
+      the number of bytes sent
+      """
+      total = buffers_size(buffers)
+      if not hasattr(conn, 'sendmsg'):
+          for buffer in buffers:
+              conn.sendall(buffer)
+          return total
+
+      views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+      while views:
+          sent = conn.sendmsg(views)
+          while sent:
+              if sent < len(views[0]):
+                  views[0] = views[0][sent:]
+                  break
+              sent -= len(views.pop(0))
+      return total
+
+  async def handle_client_async(self, reader, writer):
+      addr = writer.get_extra_info('peername')
+      if (reason := self.admission.admit(addr[0])) is not None:
+          writer.write(self.rejection(reason))
+          writer.close()
+          return
+      logging.debug("Handling connection from %s", addr)
+      accepted = time.perf_counter()
+      self.open_connection()
+      first_byte = True
+      deadline = self.timeouts.watch(functools.partial(abort_transport, asyncio.get_running_loop(), writer.transport))
+      try:
+          while True:
+              deadline.start('idle')
+              try:
+                  # only a frame can start with the first magic byte, so a text
+                  # command never has part of its delimiter read ahead here
+                  prefix = await reader.readexactly(1)
+                  # a slow command ties up no worker here, but still holds a
+                  # connection and its buffer, so it gets the same limit
+                  deadline.start('command', new_request=True)
+                  deadline.progress(1)
+                  if first_byte:
+                      self.protocol.metrics.observe('first_byte_seconds', time.perf_counter() - accepted)
+                      first_byte = False
+                  if prefix == binary_frame.MAGIC[:1]:
+                      prefix += await reader.readexactly(len(binary_frame.MAGIC) - 1)
+              except asyncio.IncompleteReadError:
+                  break
+
+              if prefix == binary_frame.MAGIC:
+                  header = prefix + await reader.readexactly(binary_frame.HEADER_SIZE - len(prefix))
+                  opcode, name_size, payload_size = binary_frame.HEADER.unpack(header)[1:]
+                  filename = (await reader.readexactly(name_size)).decode()
+                  await self.handle_frame_async(reader, writer, opcode, filename, payload_size, deadline)
+              else:
+                  command = await self.read_command_async(reader, prefix, deadline)
+                  if command is None:
+                      writer.write(self.rejection('memory'))
+                      break
+                  try:
+                      await self.handle_command_async(reader, writer, command[:-4].decode(), deadline)
+                  finally:
+                      self.admission.free(len(command))
+              await writer.drain()
+      except Exception as e:
+          if deadline.expired is None:
+              logging.warning("Connection error from %s: %s", addr, e)
+      finally:
+          deadline.close()
+          if deadline.expired is not None:
+              logging.debug("Connection from %s timed out in phase %s", addr, deadline.expired)
+          writer.close()
+          self.admission.release(addr[0])
+          self.protocol.metrics.dec('active_connections')
+          logging.debug("Closed connection from %s", addr)
+
+  async def read_command_async(self, reader, prefix, deadline):
+      """
+      reads a text command up to its delimiter in pieces of at most
+      ASYNC_READ_LIMIT bytes, reserving the memory budget for every piece
+      before taking the next one and counting it as progress of the command
+      deadline. Returns None, with nothing left reserved, when the budget is
+      exhausted
+      """
+      command = bytearray(prefix)
+      if not self.admission.reserve(len(command)):
+          return None
+      try:
+          while not command.endswith(b"\r\n\r\n"):
+              try:
+                  piece = await reader.readuntil(b"\r\n\r\n")
+              except asyncio.LimitOverrunError as e:
+                  piece = await reader.readexactly(e.consumed)
+              if not self.admission.reserve(len(piece)):
+                  self.admission.free(len(command))
+                  return None
+              command += piece
+              deadline.progress(len(piece))
+      except BaseException:
+          self.admission.free(len(command))
+          raise
+      return command
+
+  async def handle_command_async(self, reader, writer, command, deadline):
+      started = time.perf_counter()
+      received, sent = await self.serve_command_async(reader, writer, command, deadline)
+      self.record_request(self.protocol.request_name(command), started, len(command) + 4 + received, sent)
+
+  async def serve_command_async(self, reader, writer, command, deadline):
+      loop = asyncio.get_running_loop()
+      try:
+          stream = self.protocol.stream_request(command)
+      except ValueError:
+          writer.write(b'{"status": "ERROR", "data": "request tidak dikenali"}\r\n\r\n')
+          await writer.drain()
+          raise
+
+      if stream is None:
+          buffers = await loop.run_in_executor(self.io_executor, self.protocol.proses_buffers, command)
+          writer.writelines(buffers + [b"\r\n\r\n"])
+          # the transport sends it while the connection drains, the
+          # response phase gets the allowance for the whole size
+          deadline.start('response')
+          deadline.progress(buffers_size(buffers) + 4)
+          return 0, buffers_size(buffers) + 4
+
+      c_request, filename, size, request_id = stream
+      if c_request == 'get_stream':
+          response, chunks = await loop.run_in_executor(self.io_executor, self.protocol.proses_get_stream, filename)
+          buffers = self.protocol.tag([response], request_id) + [b"\r\n\r\n"]
+          deadline.start('response')
+          writer.writelines(buffers)
+          return 0, buffers_size(buffers) + await self.write_chunks_async(writer, chunks, deadline)
+
+      deadline.start('body')
+      chunks = self.receive_chunks_async(reader, loop, size, deadline)
+      if c_request == 'upload_part':
+          response = await loop.run_in_executor(self.io_executor, self.consume_chunks, self.protocol.proses_upload_part, filename, size, chunks)
+      else:
+          response = await loop.run_in_executor(self.io_executor, self.consume_chunks, self.protocol.proses_upload_stream, filename, chunks)
+      buffers = self.protocol.tag([response], request_id) + [b"\r\n\r\n"]
+      deadline.start('response')
+      writer.writelines(buffers)
+      return size, buffers_size(buffers)
+
+  async def handle_frame_async(self, reader, writer, opcode, filename, payload_size, deadline):
+      started = time.perf_counter()
+      loop = asyncio.get_running_loop()
+      deadline.start('body')
+      chunks = self.receive_chunks_async(reader, loop, payload_size, deadline)
+      status, name, size, result = await loop.run_in_executor(self.io_executor, self.consume_chunks, self.protocol.proses_frame, opcode, filename, chunks)
+      header = binary_frame.pack_header(status, name, size)
+      deadline.start('response')
+      writer.write(header)
+      await self.write_chunks_async(writer, result, deadline)
+      self.record_frame(opcode, filename, payload_size, started, len(header) + size)
+
+  async def write_chunks_async(self, writer, chunks, deadline):
+      loop = asyncio.get_running_loop()
+      chunks = iter(chunks)
+      sent = 0
+      while (chunk := await loop.run_in_executor(self.io_executor, next, chunks, None)) is not None:
+          writer.write(chunk)
+          sent += len(chunk)
+          await writer.drain()
+          deadline.progress(len(chunk))
+      return sent
+
+  def consume_chunks(self, proses, *args):
+      """
+      runs a protocol call on a worker thread and drains whatever part of
+      the request body it did not read, keeping the stream in sync
+      """
+      chunks = args[-1]
+      result = proses(*args)
+      for _ in chunks:
+          pass
+      return result
+
+  def receive_chunks_async(self, reader, loop, size, deadline):
+      """
+      same as RecvBuffer.read_exact, but iterated from a worker thread: every read
+      is scheduled on the event loop, so file writes never block the loop
+      """
+      remaining = size
+      while remaining > 0:
+          read = reader.read(min(STREAM_CHUNK_SIZE, remaining))
+          data = asyncio.run_coroutine_threadsafe(read, loop).result()
+          if not data:
+              raise ConnectionError("connection closed in the middle of a stream")
+          remaining -= len(data)
+          deadline.progress(len(data))
+          yield data
+
+  async def run_async_server(self):
+      self.io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+      self.protocol.metrics.register('pool_queue_depth', self.io_executor._work_queue.qsize)
+      server = await asyncio.start_server(self.handle_client_async, sock=self.socket, backlog=SOMAXCONN, limit=ASYNC_READ_LIMIT)
+      try:
+          async with server:
+              await server.serve_forever()
+      finally:
+          self.io_executor.shutdown(wait=False)
+
+  def run_worker(self):
+      """
+      accept loop of one pre-forked worker. The worker ignores SIGINT and
+      stops on SIGTERM after finishing the connection it is serving
+      """
+      signal.signal(signal.SIGINT, signal.SIG_IGN)
+      signal.signal(signal.SIGTERM, self.request_stop)
+
+      if self.reuse_port:
+          # each worker gets its own listening socket, the kernel
+          # load-balances new connections between them
+          address = self.socket.getsockname()
+          self.socket.close()
+          self.socket = self.create_socket(*address)
+          self.socket.listen(SOMAXCONN)
+      self.socket.settimeout(WORKER_POLL_INTERVAL)
+
+      while not self.stopping:
+          try:
+              conn, addr = self.socket.accept()
+          except timeout:
+              continue
+          if self.admit(conn, addr):
+              self.handle_client(conn, addr)
+      self.socket.close()
+      # the worker exits without running atexit, flush queued log records now
+      file_logging.stop_logging()
+
+  def request_stop(self, signum=None, frame=None):
+      self.stopping = True
+
+  def spawn_worker(self, context):
+      worker = context.Process(target=self.run_worker, daemon=True)
+      worker.start()
+      logging.info("Worker %d started", worker.pid)
+      return worker
+
+  def run_process_server(self):
+      # fork keeps the inherited listening socket and FileProtocol state
+      # without pickling anything
+      context = multiprocessing.get_context('fork')
+      if not self.reuse_port:
+          self.socket.listen(SOMAXCONN)
+
+      signal.signal(signal.SIGTERM, self.request_stop)
+      workers = [self.spawn_worker(context) for _ in range(self.pool_size)]
+      try:
+          while not self.stopping:
+              multiprocessing.connection.wait([w.sentinel for w in workers], timeout=WORKER_POLL_INTERVAL)
+              for i, worker in enumerate(workers):
+                  if not worker.is_alive() and not self.stopping:
+                      logging.warning("Worker %d exited with code %s, respawning", worker.pid, worker.exitcode)
+                      workers[i] = self.spawn_worker(context)
+      except KeyboardInterrupt:
+          pass
+      finally:
+          logging.info("Server shutdown initiated")
+          self.socket.close()
+          for worker in workers:
+              worker.terminate()
+          for worker in workers:
+              worker.join(WORKER_SHUTDOWN_TIMEOUT)
+              if worker.is_alive():
+                  worker.kill()
 
   def run_server(self): 
-    logging.warning(f"Server started on port {self.socket.getsockname()[1]} with {self.pool_size} pool size")
+    logging.info("Server started on port %d with %d pool size", self.socket.getsockname()[1], self.pool_size)
     
-    listen_count = 5 if self.executor_type == 'thread' else 1
-    self.socket.listen(listen_count)
+    if self.executor_type == 'asyncio':
+        try:
+            asyncio.run(self.run_async_server())
+        except KeyboardInterrupt:
+            logging.info("Server shutdown initiated")
+        finally:
+            self.socket.close()
+        return
+
+    if self.executor_type == 'process':
+        self.run_process_server()
+        return
+
+    self.socket.listen(5)
  
-    executor_class = concurrent.futures.ThreadPoolExecutor if self.executor_type == 'thread' else concurrent.futures.ProcessPoolExecutor
-    
-    with executor_class(max_workers=self.pool_size) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+        # accepted connections wait here for a free thread
+        self.protocol.metrics.register('pool_queue_depth', executor._work_queue.qsize)
         try:
             while True:
                 conn, addr = self.socket.accept()
-                executor.submit(self.handle_client, conn, addr)
+                # rejecting here keeps the executor queue bounded by max_connections
+                if self.admit(conn, addr):
+                    executor.submit(self.handle_client, conn, addr, time.perf_counter())
         except KeyboardInterrupt:
-            logging.warning("Server shutdown initiated")
+            logging.info("Server shutdown initiated")
         finally:
             self.socket.close()
 
-def setup_logging():
-    logging.basicConfig(
-        level=logging.WARNING,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
+def setup_logging(args):
+    file_logging.setup_logging(args.log_level, args.log_file, args.log_format, args.access_log_sample,
+                               args.log_max_field)
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Threaded File Server')
     parser.add_argument('--port', type=int, default=6667)
     parser.add_argument('--pool-size', type=int, default=1)
-    parser.add_argument('--executor', choices=['thread', 'process'], default='thread', 
-                        help='Executor type (default: thread)')
+    parser.add_argument('--executor', choices=['thread', 'process', 'asyncio'], default='thread', 
+                        help='Executor type (default: thread); with asyncio, --pool-size is the file I/O thread count, '
+                             'with process, --pool-size pre-forked worker processes accept connections themselves')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='With --executor process, give every worker its own SO_REUSEPORT listening socket')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help='Hot-file cache budget in MB, 0 disables it (default: %(default)s)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Store uploads as content-addressed SHA-256 blobs shared by identical files')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='none',
+                        help='Durability of uploads: none, fsync the file, or the file and its directory (default: none)')
+    parser.add_argument('--max-connections', type=int, default=1024,
+                        help='Connections served or waiting for a pool thread (per worker with process); '
+                             'more are answered BUSY, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--max-per-client', type=int, default=0,
+                        help='Connections from one client IP, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--memory-budget', type=int, default=1024,
+                        help='MB of request data held in memory by all connections; a request that would exceed it '
+                             'is answered BUSY, 0 means no limit (default: %(default)s)')
+    parser.add_argument('--retry-after', type=int, default=1,
+                        help='Seconds a client should wait after BUSY (default: %(default)s)')
+    parser.add_argument('--idle-timeout', type=float, default=60,
+                        help='Seconds a connection may wait between requests (default: %(default)s)')
+    parser.add_argument('--command-timeout', type=float, default=30,
+                        help='Seconds to receive a text command or frame header (default: %(default)s)')
+    parser.add_argument('--body-timeout', type=float, default=30,
+                        help='Seconds to receive a stream or frame payload (default: %(default)s)')
+    parser.add_argument('--response-timeout', type=float, default=30,
+                        help='Seconds to send a response (default: %(default)s)')
+    parser.add_argument('--request-timeout', type=float, default=3600,
+                        help='Seconds for a whole request, from its first byte to the end of the response '
+                             '(default: %(default)s)')
+    parser.add_argument('--min-rate', type=int, default=16384,
+                        help='Bytes per second a transfer must keep up: every byte moved extends the phase '
+                             'deadline by 1/min-rate seconds (default: %(default)s). 0 in any timeout or '
+                             'here disables it')
+    parser.add_argument('--log-level', choices=file_logging.LOG_LEVELS, default='info',
+                        help='Minimum log level; per-connection and per-request detail is debug (default: %(default)s)')
+    parser.add_argument('--log-file', default=None, help='Also write the log to this file')
+    parser.add_argument('--log-format', choices=file_logging.LOG_FORMATS, default='text',
+                        help='text lines or one JSON object per line (default: %(default)s)')
+    parser.add_argument('--access-log-sample', type=float, default=0.01,
+                        help='Fraction of requests written to the access log, 0 disables it (default: %(default)s)')
+    parser.add_argument('--log-max-field', type=int, default=file_logging.MAX_FIELD,
+                        help='Longer logged values are truncated to this many characters (default: %(default)s)')
     return parser.parse_args()
 
 def main():
     args = parse_args()
+    setup_logging(args)
     
-    if args.executor == 'process':
-      multiprocessing.freeze_support()
-    
-    server = ServerPool(port=args.port, pool_size=args.pool_size, executor_type=args.executor)
+    server = ServerPool(port=args.port, pool_size=args.pool_size, executor_type=args.executor, reuse_port=args.reuse_port,
+                        cache_bytes=args.cache_size * 1024 * 1024, dedup=args.dedup,
+                        fsync=args.fsync, max_connections=args.max_connections, max_per_client=args.max_per_client,
+                        memory_budget=args.memory_budget * 1024 * 1024, retry_after=args.retry_after,
+                        timeouts=ConnectionTimeouts(args.idle_timeout, args.command_timeout, args.body_timeout,
+                                                    args.response_timeout, args.request_timeout, args.min_rate))
     server.run_server()
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from file_write import write_temp, fsync_dir
+
+"""
+* class BlobStore adalah backend penyimpanan opsional yang menyimpan isi
+file berdasarkan hash SHA-256 (content-addressed), sehingga file dengan
+isi yang sama hanya disimpan satu kali di disk
+
+* blob disimpan di BLOB_DIR/<2 karakter awal hash>/<hash>, sedangkan nama
+file di direktori server adalah hard link ke blob tersebut. Dengan begitu
+GET, cache, dan index tetap membaca file biasa tanpa perubahan
+
+* manifest (nama -> hash) disimpan di BLOB_DIR/manifest.json. Jumlah
+referensi sebuah blob adalah jumlah hard link-nya (st_nlink), sehingga
+blob dihapus saat nama terakhir yang memakainya dihapus
+
+* perubahan manifest dilindungi flock pada file lock, sehingga aman
+dipakai bersama oleh beberapa worker proses
+
+* kebijakan fsync sama dengan file_write (none/file/dir)
+"""
+
+BLOB_DIR = '.blobs'
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def valid_digest(digest):
+    return DIGEST_RE.fullmatch(digest) is not None
+
+
+class BlobStore:
+    def __init__(self, directory='.', fsync='none'):
+        self.directory = directory
+        self.fsync = fsync
+        self.root = os.path.join(directory, BLOB_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.lock_path = os.path.join(self.root, 'manifest.lock')
+        self.manifest = {}
+        self.manifest_mtime = None
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        # digest dipakai sebagai path, jadi selain hex akan keluar dari root
+        if not valid_digest(digest):
+            raise ValueError(f"hash tidak valid: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return valid_digest(digest) and os.path.exists(self.blob_path(digest))
+
+    def digest_of(self, name):
+        with self._locked():
+            return self.manifest.get(name)
+
+    def store(self, name, chunks):
+        """
+        menulis chunks ke file sementara sambil menghitung hash, lalu
+        menautkan nama ke blob. Jika blob dengan hash yang sama sudah ada,
+        file sementara dibuang. Mengembalikan hash isi file
+        """
+        digest = hashlib.sha256()
+        temp_path = write_temp(self.root, chunks, self.fsync, digest.update)
+        try:
+            self.adopt(temp_path, digest.hexdigest(), name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return digest.hexdigest()
+
+    def adopt(self, temp_path, digest, name):
+        """
+        menjadikan temp_path (berisi data dengan hash digest) sebagai blob,
+        atau membuangnya jika blob sudah ada, lalu menautkan nama
+        """
+        with self._locked():
+            path = self.blob_path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                if self.fsync == 'dir':
+                    fsync_dir(os.path.dirname(path))
+            self._link(name, digest)
+
+    def link(self, name, digest):
+        """
+        menautkan nama ke blob yang sudah ada, False jika blob tidak ada
+        """
+        with self._locked():
+            if not self.has(digest):
+                return False
+            self._link(name, digest)
+            return True
+
+    def remove(self, name):
+        with self._locked():
+            os.remove(os.path.join(self.directory, name))
+            digest = self.manifest.pop(name, None)
+            if digest is not None:
+                self._save()
+                self._release(digest)
+
+    def _link(self, name, digest):
+        # link ke nama sementara lalu rename, sehingga nama lama diganti
+        # dalam satu langkah dan pembaca tidak pernah melihat file setengah jadi
+        # (rename antar dua link ke inode yang sama tidak melakukan apa-apa,
+        # jadi kasus nama yang sudah menunjuk ke blob ini dilewati)
+        target = os.path.join(self.directory, name)
+        blob = self.blob_path(digest)
+        if not (os.path.exists(target) and os.path.samefile(target, blob)):
+            temp_link = os.path.join(self.root, f".link-{os.getpid()}-{threading.get_ident()}")
+            os.link(blob, temp_link)
+            os.replace(temp_link, target)
+        if self.fsync == 'dir':
+            fsync_dir(self.directory)
+        old = self.manifest.get(name)
+        self.manifest[name] = digest
+        self._save()
+        if old is not None and old != digest:
+            self._release(old)
+
+    def _release(self, digest):
+        # manifest lama bisa berisi hash tidak valid; jangan sentuh path-nya
+        if not valid_digest(digest):
+            return
+        path = self.blob_path(digest)
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                # direktori prefix yang kosong ikut dihapus; gagal berarti
+                # masih ada blob lain di dalamnya
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _locked(self):
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        # manifest dibaca ulang hanya jika diubah oleh proses lain
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.manifest_mtime:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self.manifest_mtime = mtime
+
+    def _save(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+        self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
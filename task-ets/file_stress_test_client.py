@@ -1,21 +1,36 @@
-import socket
-import json
-import base64
 import logging
 import os
 import time
+import random
+import threading
+import itertools
 import concurrent.futures
 import argparse
 import statistics
 import csv
 import psutil
 
+import binary_frame
+import file_compress
+from file_store import file_digest
+from file_client import FileClient
+from histogram import LatencyHistogram
+
 DEFAULT_SERVER_ADDRESS = ('localhost', 6667)
 DEFAULT_CHUNK_SIZE = 128 * 1024 * 1024
 MEMORY_THRESHOLD = 0.9
 RESULT_DIRECTORIES = ['test_files', 'downloads']
 OPERATION_TYPES = ['upload', 'download', 'list']
 EXECUTOR_TYPES = ['thread', 'process']
+PROTOCOL_TYPES = ['text', 'binary', 'stream', 'multipart']
+SERVER_EXECUTOR_TYPES = ['thread', 'process', 'asyncio']
+COMPRESSION_TYPES = ['none'] + file_compress.ENCODINGS
+DEFAULT_UPLOAD_CONNECTIONS = 4
+DEFAULT_PART_SIZE_MB = 8
+CONNECTION_TIMEOUT = 600
+ARRIVAL_TYPES = ['constant', 'poisson']
+DEFAULT_TEST_DURATION = 30
+DEFAULT_MAX_IN_FLIGHT = 256
 
 def configure_logging(debug=False):
     logging.basicConfig(
@@ -27,6 +42,9 @@ def configure_logging(debug=False):
         ]
     )
 
+def encoding(compression):
+    return None if compression == 'none' else compression
+
 def ensure_directories_exist():
     for directory in RESULT_DIRECTORIES:
         os.makedirs(directory, exist_ok=True)
@@ -53,65 +71,89 @@ def generate_test_file(file_size_mb, directory='test_files'):
     return filepath
 
 class FileServerClient:
-    def __init__(self, server_address=DEFAULT_SERVER_ADDRESS):
+    def __init__(self, server_address=DEFAULT_SERVER_ADDRESS, server_executor='thread', dedup=False,
+                 upload_connections=DEFAULT_UPLOAD_CONNECTIONS, part_size_mb=DEFAULT_PART_SIZE_MB, persistent=False,
+                 pool_size=1, test_duration=DEFAULT_TEST_DURATION, arrival='constant', max_in_flight=DEFAULT_MAX_IN_FLIGHT):
         self.server_address = server_address
+        self.server_executor = server_executor
+        self.dedup = dedup
+        self.upload_connections = upload_connections
+        self.part_size = part_size_mb * 1024 * 1024
+        self.persistent = persistent
+        self.test_duration = test_duration
+        self.arrival = arrival
+        self.max_in_flight = max_in_flight
+        # without --persistent every request opens and closes its own connection
+        self.client = FileClient(server_address, pool_size, CONNECTION_TIMEOUT, keep_alive=persistent)
+        self.digests = {}
         self.reset_counters()
         ensure_directories_exist()
 
+    def close(self):
+        self.client.close()
+
     def reset_counters(self):
         self.results = {op: [] for op in OPERATION_TYPES}
         self.success_count = {op: 0 for op in OPERATION_TYPES}
         self.fail_count = {op: 0 for op in OPERATION_TYPES}
 
-    def send_command(self, command_str=""):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(600)
-        
-        try:
-            sock.connect(self.server_address)
-            chunks = [command_str[i:i+65536] for i in range(0, len(command_str), 65536)]
-            for chunk in chunks:
-                sock.sendall(chunk.encode())
-            sock.sendall("\r\n\r\n".encode())
-            
-            data_received = ""
-            while True:
-                data = sock.recv(DEFAULT_CHUNK_SIZE)
-                if data:
-                    data_received += data.decode()
-                    if "\r\n\r\n" in data_received:
-                        break
-                else:
-                    break
-            
-            return json.loads(data_received.split("\r\n\r\n")[0])
-        except socket.timeout:
-            return {'status': 'ERROR', 'data': 'Socket timeout'}
-        except ConnectionRefusedError:
-            return {'status': 'ERROR', 'data': 'Connection refused'}
-        except Exception as e:
-            return {'status': 'ERROR', 'data': str(e)}
-        finally:
-            sock.close()
+    def send_frame(self, opcode, filename='', source=None, target=None):
+        """
+        one binary frame over a pooled connection. The upload payload is
+        sent with sendfile from source and a downloaded payload is written
+        to target as it arrives; without target it is returned in data_file
+        """
+        def exchange(conn):
+            size = os.path.getsize(source) if source is not None else 0
+            conn.send(binary_frame.pack_header(opcode, filename, size))
+            if source is not None:
+                with open(source, 'rb') as file:
+                    conn.sendfile(file, 0, size)
+
+            while (header := binary_frame.unpack_header(conn.buffer.view())) is None:
+                if not conn.buffer.recv_into(conn.sock):
+                    raise ConnectionError('Connection closed by server')
+            status, name, payload_size, header_length = header
+            conn.buffer.consume(header_length)
+            if status == binary_frame.STATUS_OK and target is not None:
+                with open(target, 'wb') as file:
+                    for chunk in conn.read_exact(payload_size):
+                        file.write(chunk)
+                return {'status': 'OK', 'data_namafile': name, 'data_size': payload_size}
+
+            payload = b"".join(conn.read_exact(payload_size))
+            if status != binary_frame.STATUS_OK:
+                return {'status': 'ERROR', 'data': payload.decode()}
+            return {'status': 'OK', 'data_namafile': name, 'data_size': payload_size, 'data_file': payload}
+        return self.client.exchange(exchange)
+
+    def send_have(self, file_path, filename):
+        # the server links the name to content it already holds, no bytes sent
+        digest = self.digests.get(file_path) or file_digest(file_path)
+        result = self.client.have(digest, filename)
+        if result['status'] == 'OK' and result['data_have']:
+            return result
+        return None
 
-    def perform_upload(self, file_path, worker_id):
+    def send_upload(self, file_path, filename, file_size, protocol='text'):
+        # every protocol reads the file in chunks, nothing is held in memory whole
+        if protocol == 'binary':
+            return self.send_frame(binary_frame.OP_UPLOAD, filename, source=file_path)
+        if protocol == 'stream':
+            return self.client.upload_stream(file_path, filename)
+        if protocol == 'multipart':
+            return self.client.upload_multipart(file_path, filename, self.upload_connections, self.part_size)
+        return self.client.upload_file(file_path, filename)
+
+    def perform_upload(self, file_path, worker_id, protocol='text'):
         start_time = time.time()
         filename = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
         
         try:
-            encoded_chunks = []
-            with open(file_path, 'rb') as file:
-                while True:
-                    if check_memory_usage():
-                        raise MemoryError("Memory threshold exceeded")
-                    chunk = file.read(DEFAULT_CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    encoded_chunks.append(base64.b64encode(chunk).decode())
-            
-            command_str = f"UPLOAD {filename} {' '.join(encoded_chunks)}"
-            result = self.send_command(command_str)
+            result = self.send_have(file_path, filename) if self.dedup else None
+            if result is None:
+                result = self.send_upload(file_path, filename, file_size, protocol)
             duration = time.time() - start_time
             
             if result['status'] == 'OK':
@@ -125,37 +167,40 @@ class FileServerClient:
             logging.error(f"Worker {worker_id}: UPLOAD exception! {str(e)}")
             return self._create_error_result('upload', worker_id, file_size, start_time, str(e))
 
-    def perform_download(self, filename, worker_id):
+    def perform_download(self, filename, worker_id, protocol='text', compression='none'):
         start_time = time.time()
         
         try:
-            result = self.send_command(f"GET {filename}")
+            download_path = os.path.join('downloads', f"worker{worker_id}_{filename}")
+            if protocol == 'text':
+                result = self.client.get(filename, encoding(compression))
+                if result['status'] == 'OK':
+                    with open(download_path, 'wb') as file:
+                        file.write(result['data_file'])
+                    result['data_size'] = len(result['data_file'])
+            elif protocol == 'binary':
+                result = self.send_frame(binary_frame.OP_GET, filename, target=download_path)
+            else:
+                result = self.client.get_stream(filename, download_path)
             if result['status'] != 'OK':
                 return self._create_error_result('download', worker_id, 0, start_time, result['data'])
             
-            download_path = os.path.join('downloads', f"worker{worker_id}_{filename}")
-            file_content = base64.b64decode(result['data_file'])
-            file_size = len(file_content)
-            
-            with open(download_path, 'wb') as file:
-                for i in range(0, file_size, DEFAULT_CHUNK_SIZE):
-                    if check_memory_usage():
-                        raise MemoryError("Memory threshold exceeded")
-                    file.write(file_content[i:i+DEFAULT_CHUNK_SIZE])
-            
             self.success_count['download'] += 1
             duration = time.time() - start_time
             logging.info(f"Worker {worker_id}: DOWNLOAD successful in {duration:.2f}s")
-            return self._create_result('download', worker_id, file_size, duration, result)
+            return self._create_result('download', worker_id, result['data_size'], duration, result)
         except Exception as e:
             logging.error(f"Worker {worker_id}: DOWNLOAD exception! {str(e)}")
             return self._create_error_result('download', worker_id, 0, start_time, str(e))
 
-    def perform_list(self, worker_id):
+    def perform_list(self, worker_id, protocol='text', compression='none'):
         start_time = time.time()
         
         try:
-            result = self.send_command("LIST")
+            if protocol == 'binary':
+                result = self.send_frame(binary_frame.OP_LIST)
+            else:
+                result = self.client.list(encoding=encoding(compression))
             duration = time.time() - start_time
             
             if result['status'] == 'OK':
@@ -205,7 +250,33 @@ class FileServerClient:
         }
         return result
 
-    def run_stress_test(self, operation, file_size_mb, client_pool_size, executor_type='thread'):
+    def prepare_test_file(self, operation, file_size_mb, protocol='text'):
+        """
+        the file to upload, or the file uploaded once so it can be downloaded;
+        None when that upload fails
+        """
+        test_file = generate_test_file(file_size_mb)
+        if self.dedup and test_file not in self.digests:
+            self.digests[test_file] = file_digest(test_file)
+        if operation == 'download':
+            upload_result = self.perform_upload(test_file, 0, protocol)
+            if upload_result['status'] != 'OK':
+                return None
+        return test_file
+
+    def perform_request(self, operation, test_file, worker_id, protocol='text', compression='none'):
+        if operation == 'upload':
+            return self.perform_upload(test_file, worker_id, protocol)
+        if operation == 'download':
+            return self.perform_download(os.path.basename(test_file), worker_id, protocol, compression)
+        return self.perform_list(worker_id, protocol, compression)
+
+    def timed_request(self, scheduled, operation, test_file, worker_id, protocol='text', compression='none'):
+        result = self.perform_request(operation, test_file, worker_id, protocol, compression)
+        result['latency'] = time.perf_counter() - scheduled
+        return result
+
+    def run_stress_test(self, operation, file_size_mb, client_pool_size, executor_type='thread', protocol='text', compression='none'):
         self.reset_counters()
         
         if operation not in OPERATION_TYPES:
@@ -214,43 +285,111 @@ class FileServerClient:
             
         test_file = None
         if operation in ['upload', 'download']:
-            test_file = generate_test_file(file_size_mb)
-            if operation == 'download':
-                upload_result = self.perform_upload(test_file, 0)
-                if upload_result['status'] != 'OK':
-                    return None
+            test_file = self.prepare_test_file(operation, file_size_mb, protocol)
+            if test_file is None:
+                return None
         
         effective_pool_size = min(client_pool_size, 10) if file_size_mb >= 50 and client_pool_size >= 50 else client_pool_size
         executor_class = concurrent.futures.ThreadPoolExecutor if executor_type == 'thread' else concurrent.futures.ProcessPoolExecutor
         
-        logging.info(f"{operation.upper()} test_file_{file_size_mb}MB starting...")
+        logging.info(f"{operation.upper()} test_file_{file_size_mb}MB ({protocol}, compression {compression}) starting...")
         
         all_results = []
         batch_size = effective_pool_size
+        start_time = time.perf_counter()
         
         with executor_class(max_workers=batch_size) as executor:
             for batch_start in range(0, client_pool_size, batch_size):
                 batch_end = min(batch_start + batch_size, client_pool_size)
-                futures = []
-                
-                for i in range(batch_start, batch_end):
-                    if operation == 'upload':
-                        futures.append(executor.submit(self.perform_upload, test_file, i))
-                    elif operation == 'download':
-                        futures.append(executor.submit(self.perform_download, os.path.basename(test_file), i))
-                    else:
-                        futures.append(executor.submit(self.perform_list, i))
+                futures = [executor.submit(self.perform_request, operation, test_file, i, protocol, compression)
+                           for i in range(batch_start, batch_end)]
                 
                 for future in concurrent.futures.as_completed(futures):
                     all_results.append(future.result())
                     if check_memory_usage():
                         time.sleep(1)
         
-        return self._calculate_statistics(operation, file_size_mb, client_pool_size, executor_type, all_results)
+        stats = self._calculate_statistics(operation, file_size_mb, client_pool_size, executor_type, protocol, all_results)
+        stats['mode'] = 'closed'
+        stats['achieved_rate'] = self._achieved_rate(all_results, time.perf_counter() - start_time)
+        stats['compression'] = compression
+        stats['dedup'] = self.dedup
+        stats['persistent'] = self.persistent
+        return stats
+
+    def run_open_loop_test(self, operation, file_size_mb, rate, protocol='text', compression='none'):
+        """
+        Open-loop load: requests are started at `rate` per second for
+        test_duration seconds whether or not earlier ones have finished, with
+        constant or Poisson (exponential) gaps. A server that cannot keep up
+        shows up as growing latency rather than as a lower request rate.
+        Latency is measured from the scheduled start, so time spent waiting
+        for one of the max_in_flight workers counts as queueing delay.
+        """
+        self.reset_counters()
+
+        if operation not in OPERATION_TYPES:
+            logging.error(f"Invalid operation: {operation}")
+            return
+
+        test_file = None
+        if operation in ['upload', 'download']:
+            test_file = self.prepare_test_file(operation, file_size_mb, protocol)
+            if test_file is None:
+                return None
+
+        logging.info(f"{operation.upper()} test_file_{file_size_mb}MB ({protocol}, compression {compression}) "
+                     f"open loop at {rate}/s ({self.arrival}) for {self.test_duration}s starting...")
+
+        futures = []
+        start_time = time.perf_counter()
+        end_time = start_time + self.test_duration
+        scheduled = start_time
+
+        # a pool thread runs one request at a time, so numbering the threads
+        # gives every request in flight its own download target while only
+        # max_in_flight target files are ever written
+        slot = threading.local()
+        slot_ids = itertools.count()
+
+        def request_in_slot(scheduled):
+            if not hasattr(slot, 'worker_id'):
+                slot.worker_id = next(slot_ids)
+            return self.timed_request(scheduled, operation, test_file, slot.worker_id, protocol, compression)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while scheduled < end_time:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(request_in_slot, scheduled))
+                scheduled += random.expovariate(rate) if self.arrival == 'poisson' else 1 / rate
+        all_results = [future.result() for future in futures]
+
+        stats = self._calculate_statistics(operation, file_size_mb, self.max_in_flight, 'thread', protocol, all_results)
+        stats['mode'] = 'open'
+        stats['arrival'] = self.arrival
+        stats['target_rate'] = rate
+        stats['test_duration'] = self.test_duration
+        stats['sent_count'] = len(all_results)
+        stats['achieved_rate'] = self._achieved_rate(all_results, time.perf_counter() - start_time)
+        stats['compression'] = compression
+        stats['dedup'] = self.dedup
+        stats['persistent'] = self.persistent
+        return stats
+
+    def _achieved_rate(self, results, elapsed):
+        succeeded = sum(1 for r in results if r['status'] == 'OK')
+        return succeeded / elapsed if elapsed > 0 else 0
 
-    def _calculate_statistics(self, operation, file_size_mb, client_pool_size, executor_type, results):
+    def _calculate_statistics(self, operation, file_size_mb, client_pool_size, executor_type, protocol, results):
         durations = [r['duration'] for r in results if r['status'] == 'OK']
         throughputs = [r['throughput'] for r in results if r.get('throughput', 0) > 0]
+        # closed loop has no schedule to lag behind, its latency is the duration
+        latencies = LatencyHistogram()
+        for r in results:
+            if r['status'] == 'OK':
+                latencies.record(r.get('latency', r['duration']))
         
         if not durations:
             return {
@@ -258,6 +397,7 @@ class FileServerClient:
                 'file_size_mb': file_size_mb,
                 'client_pool_size': client_pool_size,
                 'executor_type': executor_type,
+                'protocol': protocol,
                 'success_count': self.success_count[operation],
                 'fail_count': self.fail_count[operation]
             }
@@ -267,6 +407,7 @@ class FileServerClient:
             'file_size_mb': file_size_mb,
             'client_pool_size': client_pool_size,
             'executor_type': executor_type,
+            'protocol': protocol,
             'avg_duration': statistics.mean(durations),
             'median_duration': statistics.median(durations),
             'min_duration': min(durations),
@@ -278,39 +419,56 @@ class FileServerClient:
             'success_count': self.success_count[operation],
             'fail_count': self.fail_count[operation]
         }
+        stats.update(latencies.summary())
         
         logging.info(f"{operation.upper()} test_file_{file_size_mb}MB complete: {stats['success_count']} succeeded, {stats['fail_count']} failed")
         return stats
 
-    def run_all_tests(self, file_sizes, client_pool_sizes, server_pool_sizes, executor_types, operations):
+    def run_all_tests(self, file_sizes, client_pool_sizes, server_pool_sizes, executor_types, operations, protocols=['text'], compressions=['none'], rates=None):
         all_stats = []
         
         for server_pool_size in server_pool_sizes:
             logging.info(f"Server pool size: {server_pool_size}")
-            logging.info("Please restart the server with the appropriate pool size!")
+            logging.info("Please restart the server with the appropriate pool size! (benchmark_servers.py starts the servers itself)")
             input("Press Enter when ready...")
           
             for executor_type in executor_types:
-                for operation in operations:
-                    for file_size in file_sizes:
-                        for client_pool_size in client_pool_sizes:
-                            try:
-                                stats = self.run_stress_test(operation, file_size, client_pool_size, executor_type)
-                                if stats:
-                                    stats['server_pool_size'] = server_pool_size
-                                    all_stats.append(stats)
-                            except Exception as e:
-                                all_stats.append(self._create_error_stats(operation, file_size, client_pool_size, server_pool_size, executor_type, str(e)))
+                for protocol in protocols:
+                    for compression in compressions:
+                        for operation in operations:
+                            # compression only changes LIST/GET responses of the text protocol
+                            if compression != 'none' and (protocol != 'text' or operation == 'upload'):
+                                continue
+                            # multipart only exists for uploads
+                            if protocol == 'multipart' and operation != 'upload':
+                                continue
+                            for file_size in file_sizes:
+                                # open loop: one test per target rate instead of per client pool size
+                                for client_pool_size in rates or client_pool_sizes:
+                                    try:
+                                        if rates:
+                                            stats = self.run_open_loop_test(operation, file_size, client_pool_size, protocol, compression)
+                                        else:
+                                            stats = self.run_stress_test(operation, file_size, client_pool_size, executor_type, protocol, compression)
+                                        if stats:
+                                            stats['server_pool_size'] = server_pool_size
+                                            stats['server_executor'] = self.server_executor
+                                            all_stats.append(stats)
+                                    except Exception as e:
+                                        all_stats.append(self._create_error_stats(operation, file_size, client_pool_size, server_pool_size, executor_type, protocol, compression, str(e)))
         
         self._save_results_to_csv(all_stats)
 
-    def _create_error_stats(self, operation, file_size, client_pool_size, server_pool_size, executor_type, error):
+    def _create_error_stats(self, operation, file_size, client_pool_size, server_pool_size, executor_type, protocol, compression, error):
         return {
             'operation': operation,
             'file_size_mb': file_size,
             'client_pool_size': client_pool_size,
             'server_pool_size': server_pool_size,
+            'server_executor': self.server_executor,
             'executor_type': executor_type,
+            'protocol': protocol,
+            'compression': compression,
             'avg_duration': 0,
             'median_duration': 0,
             'min_duration': 0,
@@ -330,12 +488,14 @@ class FileServerClient:
         
         with open(csv_filename, 'w', newline='') as csvfile:
             fieldnames = [
-                'operation', 'file_size_mb', 'client_pool_size', 'server_pool_size', 'executor_type',
+                'operation', 'file_size_mb', 'client_pool_size', 'server_pool_size', 'server_executor', 'executor_type', 'protocol', 'compression', 'dedup', 'persistent',
+                'mode', 'arrival', 'target_rate', 'test_duration', 'sent_count', 'achieved_rate',
                 'avg_duration', 'median_duration', 'min_duration', 'max_duration',
                 'avg_throughput', 'median_throughput', 'min_throughput', 'max_throughput',
+                'latency_p50', 'latency_p90', 'latency_p99', 'latency_p999', 'latency_max',
                 'success_count', 'fail_count'
             ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
             writer.writeheader()
             writer.writerows(all_stats)
         
@@ -350,6 +510,29 @@ def parse_arguments():
     parser.add_argument('--client-pools', type=int, nargs='+', default=[1, 5, 50])
     parser.add_argument('--server-pools', type=int, nargs='+', default=[1, 5, 50])
     parser.add_argument('--executor', choices=['thread', 'process', 'both'], default='thread')
+    parser.add_argument('--server-executor', choices=SERVER_EXECUTOR_TYPES, default='thread',
+                        help='Executor the server was started with, recorded in the results')
+    parser.add_argument('--protocol', choices=PROTOCOL_TYPES + ['all'], default='text',
+                        help='multipart uploads the file in parts over several parallel connections')
+    parser.add_argument('--upload-connections', type=int, default=DEFAULT_UPLOAD_CONNECTIONS,
+                        help='Parallel connections per multipart upload (default: %(default)s)')
+    parser.add_argument('--part-size', type=int, default=DEFAULT_PART_SIZE_MB,
+                        help='Multipart part size in MB (default: %(default)s)')
+    parser.add_argument('--compression', choices=COMPRESSION_TYPES + ['all'], default='none',
+                        help='Ask for compressed LIST/GET responses (text protocol only)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Send HAVE <sha256> before uploading; needs a server started with --dedup')
+    parser.add_argument('--persistent', action='store_true',
+                        help='Reuse pooled keep-alive connections for text commands instead of one connection each; '
+                             'with the thread and process executors every kept connection holds a server worker')
+    parser.add_argument('--rate', type=float, nargs='+', default=None,
+                        help='Open-loop mode: requests started per second, one test per rate; replaces --client-pools')
+    parser.add_argument('--duration', type=float, default=DEFAULT_TEST_DURATION,
+                        help='Open-loop test length in seconds (default: %(default)s)')
+    parser.add_argument('--arrival', choices=ARRIVAL_TYPES, default='constant',
+                        help='Open-loop gaps between requests: constant or Poisson (default: %(default)s)')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help='Open-loop worker threads; later requests queue and their wait counts as latency (default: %(default)s)')
     parser.add_argument('--debug', action='store_true')
     return parser.parse_args()
   
@@ -361,18 +544,30 @@ def run_single_test(args):
 
 def run_tests(args):
     configure_logging(args.debug)
-    client = FileServerClient((args.host, args.port))
+    concurrency = args.max_in_flight if args.rate else max(args.client_pools)
+    client = FileServerClient((args.host, args.port), args.server_executor, args.dedup,
+                              args.upload_connections, args.part_size, args.persistent,
+                              # every worker may hold upload_connections connections at once
+                              concurrency * max(args.upload_connections, 1),
+                              args.duration, args.arrival, args.max_in_flight)
     
-    executor_types = EXECUTOR_TYPES if args.executor == 'both' else [args.executor]
+    # the open-loop scheduler only runs its requests on threads
+    executor_types = ['thread'] if args.rate else EXECUTOR_TYPES if args.executor == 'both' else [args.executor]
     operations = OPERATION_TYPES if args.operation == 'all' else [args.operation]
+    protocols = PROTOCOL_TYPES if args.protocol == 'all' else [args.protocol]
+    compressions = COMPRESSION_TYPES if args.compression == 'all' else [args.compression]
     
-    if run_single_test(args):
-        stats = client.run_stress_test(operations[0], args.file_sizes[0], args.client_pools[0], executor_types[0])
-        if stats:
-            stats['server_pool_size'] = args.server_pools[0]
-            client._save_results_to_csv([stats])
-    else:
-        client.run_all_tests(args.file_sizes, args.client_pools, args.server_pools, executor_types, operations)
+    try:
+        if not args.rate and run_single_test(args) and len(protocols) == 1 and len(compressions) == 1:
+            stats = client.run_stress_test(operations[0], args.file_sizes[0], args.client_pools[0], executor_types[0], protocols[0], compressions[0])
+            if stats:
+                stats['server_pool_size'] = args.server_pools[0]
+                stats['server_executor'] = args.server_executor
+                client._save_results_to_csv([stats])
+        else:
+            client.run_all_tests(args.file_sizes, args.client_pools, args.server_pools, executor_types, operations, protocols, compressions, args.rate)
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     run_tests(parse_arguments())
\ No newline at end of file
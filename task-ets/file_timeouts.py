@@ -0,0 +1,263 @@
+import os
+import time
+import socket
+import threading
+
+"""
+* ConnectionTimeouts memberi setiap koneksi batas waktu per fase:
+  - idle: menunggu byte pertama request berikutnya (koneksi persistent)
+  - command: menerima perintah teks/header frame sampai lengkap
+  - body: menerima payload stream/frame
+  - response: mengirim respons
+ditambah batas total satu request (dari byte pertama sampai respons
+selesai dikirim). Nilai 0 berarti fase tersebut tidak dibatasi
+
+* kecepatan minimum (min_rate byte/detik): pada setiap fase, setiap byte
+yang berpindah menambah batas waktu sebesar 1/min_rate detik, sehingga
+transfer besar yang lancar tidak terputus, sedangkan client lambat
+(slowloris) diputus setelah batas fase habis
+
+* semua batas waktu dijalankan oleh satu thread TimerWheel per proses,
+bukan satu thread atau settimeout per koneksi. Mengubah fase hanya
+mengubah atribut Deadline; wheel baru disentuh (di bawah lock) jika batas
+waktu baru lebih awal dari yang sudah dijadwalkan. Entri yang ternyata
+sudah diperpanjang dijadwalkan ulang saat slotnya diproses
+
+* saat batas waktu habis, on_expire dipanggil dari thread wheel; untuk
+socket biasa (wrap) socket di-shutdown sehingga recv/send yang sedang
+memblokir worker langsung kembali
+
+* jumlah koneksi yang diputus per fase (expired_counts) dan koneksi yang
+sedang menunggu client per fase (blocked) dilaporkan lewat metrik
+"""
+
+TICK = 0.25
+SLOTS = 512
+PHASES = ['idle', 'command', 'body', 'response']
+SENDALL_CHUNK = 1024 * 1024
+SENDFILE_CHUNK = 1024 * 1024
+
+
+class TimerWheel:
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(time.monotonic() / tick)
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def schedule(self, deadline, at):
+        """
+        menjadwalkan deadline.expire pada waktu monotonic at; dipanggil
+        dengan self.lock sudah dipegang
+        """
+        if self.pid != os.getpid():
+            # thread wheel tidak ikut ter-fork, worker membuat sendiri
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, daemon=True).start()
+        deadline.scheduled = at
+        tick = max(int(at / self.tick), self.current)
+        self.slots[tick % len(self.slots)].append((deadline, at))
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                last = int(now / self.tick)
+                for tick in range(max(self.current, last - len(self.slots) + 1), last + 1):
+                    index = tick % len(self.slots)
+                    keep = []
+                    for deadline, at in self.slots[index]:
+                        if at != deadline.scheduled:
+                            continue
+                        if at > now:
+                            keep.append((deadline, at))
+                        else:
+                            deadline.scheduled = None
+                            due.append(deadline)
+                    self.slots[index] = keep
+                self.current = last
+                expired = [deadline for deadline in due if deadline.check(now)]
+            for deadline in expired:
+                deadline.expire()
+
+
+class Deadline:
+    def __init__(self, timeouts, on_expire):
+        self.timeouts = timeouts
+        self.on_expire = on_expire
+        self.phase = None
+        self.limit = 0
+        self.started = 0
+        self.transferred = 0
+        self.request_deadline = None
+        self.scheduled = None
+        self.expired = None
+        self.closed = False
+
+    def start(self, phase, new_request=False, limit=None):
+        """
+        memulai fase baru; new_request memulai batas total request,
+        fase idle mengakhirinya. limit mengganti batas fase dari konfigurasi
+        """
+        now = time.monotonic()
+        self.phase = phase
+        self.limit = self.timeouts.limits[phase] if limit is None else limit
+        self.started = now
+        self.transferred = 0
+        if new_request:
+            self.request_deadline = now + self.timeouts.request if self.timeouts.request else None
+        elif phase == 'idle':
+            self.request_deadline = None
+        self.timeouts.schedule(self)
+
+    def progress(self, size):
+        self.transferred += size
+
+    def expires(self):
+        expires = None
+        if self.limit:
+            expires = self.started + self.limit
+            if self.timeouts.min_rate:
+                expires += self.transferred / self.timeouts.min_rate
+        if self.request_deadline is not None and (expires is None or self.request_deadline < expires):
+            expires = self.request_deadline
+        return expires
+
+    def check(self, now):
+        """
+        dipanggil wheel saat jadwal tiba: True jika benar-benar habis,
+        selain itu dijadwalkan ulang sesuai batas waktu terbaru
+        """
+        if self.closed or self.expired is not None:
+            return False
+        expires = self.expires()
+        if expires is None:
+            return False
+        if expires > now:
+            self.timeouts.wheel.schedule(self, expires)
+            return False
+        self.expired = self.phase
+        return True
+
+    def expire(self):
+        self.timeouts.timed_out[self.expired] += 1
+        self.on_expire()
+
+    def close(self):
+        self.timeouts.forget(self)
+
+
+class TimedSocket:
+    """
+    socket yang mencatat setiap byte yang diterima/dikirim sebagai progress
+    deadline-nya; atribut lain diteruskan ke socket asli
+    """
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def recv(self, size, *flags):
+        data = self.sock.recv(size, *flags)
+        self.deadline.progress(len(data))
+        return data
+
+    def recv_into(self, buffer, *args):
+        received = self.sock.recv_into(buffer, *args)
+        self.deadline.progress(received)
+        return received
+
+    def send(self, data, *flags):
+        sent = self.sock.send(data, *flags)
+        self.deadline.progress(sent)
+        return sent
+
+    def sendall(self, data, *flags):
+        # per potongan, sehingga body besar dari cache tetap tercatat sebagai
+        # progress selama dikirim
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), SENDALL_CHUNK):
+            piece = view[start:start + SENDALL_CHUNK]
+            self.sock.sendall(piece, *flags)
+            self.deadline.progress(len(piece))
+
+    def sendmsg(self, buffers, *args):
+        sent = self.sock.sendmsg(buffers, *args)
+        self.deadline.progress(sent)
+        return sent
+
+    def sendfile(self, file, offset=0, count=None):
+        # per potongan, sehingga progress client lambat tetap tercatat
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+        total = 0
+        while total < count:
+            sent = self.sock.sendfile(file, offset + total, min(SENDFILE_CHUNK, count - total))
+            if not sent:
+                break
+            total += sent
+            self.deadline.progress(sent)
+        return total
+
+
+def shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ConnectionTimeouts:
+    def __init__(self, idle=60, command=30, body=30, response=30, request=3600, min_rate=16384, tick=TICK):
+        self.limits = dict(idle=idle, command=command, body=body, response=response)
+        self.request = request
+        self.min_rate = min_rate
+        self.wheel = TimerWheel(tick)
+        self.deadlines = set()
+        self.timed_out = dict.fromkeys(PHASES, 0)
+
+    def watch(self, on_expire):
+        """
+        Deadline baru dalam fase idle; harus diakhiri close()
+        """
+        deadline = Deadline(self, on_expire)
+        with self.wheel.lock:
+            self.deadlines.add(deadline)
+        deadline.start('idle')
+        return deadline
+
+    def wrap(self, sock):
+        """
+        TimedSocket untuk sock; saat batas waktu habis sock di-shutdown
+        """
+        return TimedSocket(sock, self.watch(lambda: shutdown(sock)))
+
+    def schedule(self, deadline):
+        expires = deadline.expires()
+        if expires is None or (deadline.scheduled is not None and deadline.scheduled <= expires):
+            return
+        with self.wheel.lock:
+            if not deadline.closed and (deadline.scheduled is None or expires < deadline.scheduled):
+                self.wheel.schedule(deadline, expires)
+
+    def forget(self, deadline):
+        with self.wheel.lock:
+            deadline.closed = True
+            self.deadlines.discard(deadline)
+
+    def expired_counts(self):
+        return dict(self.timed_out)
+
+    def blocked(self):
+        """
+        jumlah koneksi yang sedang menunggu client per fase; pada executor
+        thread/process setiap koneksi ini menahan satu worker
+        """
+        with self.wheel.lock:
+            phases = [deadline.phase for deadline in self.deadlines]
+        return {phase: phases.count(phase) for phase in PHASES}
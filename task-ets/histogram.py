@@ -0,0 +1,82 @@
+import threading
+
+"""
+* LatencyHistogram mencatat latensi dengan bucket log-linear seperti
+HdrHistogram: setiap rentang pangkat dua dibagi menjadi 2^(SUB_BUCKET_BITS-1)
+bucket yang sama lebar, sehingga galat relatif setiap nilai paling besar
+sekitar 2^-(SUB_BUCKET_BITS-1) (0.1% untuk 11 bit) dari mikrodetik sampai
+jam, dengan memori yang hanya sebanding dengan jumlah bucket yang terisi
+
+* nilai dicatat dalam detik dan disimpan sebagai mikrodetik bulat;
+percentile() mengembalikan batas atas bucket (highest equivalent value)
+dalam detik, sehingga p99 tidak pernah dilaporkan lebih kecil dari
+kenyataan
+
+* histogram dari beberapa worker dapat digabung dengan merge()
+"""
+
+SUB_BUCKET_BITS = 11
+UNIT = 1000000
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def bucket_of(value):
+    shift = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+    return shift, value >> shift
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        value = max(int(seconds * UNIT), 0)
+        bucket = bucket_of(value)
+        with self.lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        with self.lock:
+            for bucket, count in other.counts.items():
+                self.counts[bucket] = self.counts.get(bucket, 0) + count
+            self.count += other.count
+            self.total += other.total
+            self.max = max(self.max, other.max)
+            if other.min is not None:
+                self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, percent):
+        """
+        nilai terkecil (detik) yang lebih besar atau sama dengan percent
+        persen dari semua nilai tercatat, 0 jika histogram kosong
+        """
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for shift, sub_bucket in sorted(self.counts):
+            seen += self.counts[(shift, sub_bucket)]
+            if seen >= rank:
+                highest = ((sub_bucket + 1) << shift) - 1
+                return min(highest, self.max) / UNIT
+        return self.max / UNIT
+
+    def mean(self):
+        return self.total / self.count / UNIT if self.count else 0
+
+    def summary(self, prefix='latency'):
+        """
+        dict p50/p90/p99/p99.9/max untuk ditulis ke CSV hasil stress test
+        """
+        stats = {f"{prefix}_p{str(p).replace('.', '')}": self.percentile(p) for p in PERCENTILES}
+        stats[f"{prefix}_max"] = self.max / UNIT
+        return stats
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import socket
+import tempfile
+import unittest
+import subprocess
+
+from file_client import FileClient
+
+"""
+* menjalankan file_server.py di direktori sementara lalu memastikan client
+yang mengirim perintah satu byte demi satu byte (slowloris) diputus
+setelah --command-timeout, pada setiap executor
+"""
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_server.py')
+COMMAND_TIMEOUT = 1
+SLOW_BYTE_INTERVAL = 0.25
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class SlowCommandTest(unittest.TestCase):
+    def start_server(self, executor):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.mkdir(os.path.join(directory.name, 'files'))
+        port = free_port()
+        server = subprocess.Popen([sys.executable, SERVER, '--port', str(port), '--executor', executor,
+                                   '--command-timeout', str(COMMAND_TIMEOUT), '--log-level', 'warning'],
+                                  cwd=directory.name)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+        address = ('localhost', port)
+        for _ in range(50):
+            try:
+                socket.create_connection(address).close()
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+        return address
+
+    def slow_command_seconds(self, address, limit=10):
+        """
+        mengirim "LIST" satu byte setiap SLOW_BYTE_INTERVAL tanpa delimiter,
+        mengembalikan lama koneksi bertahan sebelum diputus server
+        """
+        started = time.monotonic()
+        with socket.create_connection(address) as sock:
+            sock.settimeout(SLOW_BYTE_INTERVAL)
+            payload = b"LIST" + b" " * 1000
+            for byte in payload:
+                try:
+                    sock.sendall(bytes([byte]))
+                    if sock.recv(1024) == b"":
+                        break
+                except socket.timeout:
+                    pass
+                except OSError:
+                    break
+                if time.monotonic() - started > limit:
+                    break
+        return time.monotonic() - started
+
+    def check_executor(self, executor):
+        address = self.start_server(executor)
+        client = FileClient(address)
+        self.assertEqual(client.list()['status'], 'OK')
+        self.assertLess(self.slow_command_seconds(address), COMMAND_TIMEOUT + 3)
+
+    def test_thread(self):
+        self.check_executor('thread')
+
+    def test_asyncio(self):
+        self.check_executor('asyncio')
+
+
+if __name__ == '__main__':
+    unittest.main()